@@ -1,77 +1,521 @@
+import gzip
+import json
 import os
+import posixpath
+import shlex
+import socket
 import subprocess
 import tempfile
-import time
-from typing import Dict, Optional
+import threading
+import zlib
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from .adb_protocol import ADB_SERVER_HOST, ADB_SERVER_PORT, AdbProtocolError, AdbServerClient, abort_on_cancel
+from .adb_shell_session import AdbShellSession
+from .autojs_agent import AutoJsAgent, AutoJsAgentError
+from .capture_pipeline import CancelToken, CapturePipeline
+from .device_tracker import DeviceTracker
+from .partial_dump import DumpScope
+from .push_cache import PushCache
+from .device_events import (
+    DEVICE_EVENT_TAG,
+    DEVICE_TIME_COMMAND,
+    DeviceEventListener,
+    DeviceEventTimeout,
+    logcat_follow_command,
+    open_subprocess_listener,
+    parse_device_time_ms,
+)
+from .screencap import RawFrame, TruncatedFrameError, read_raw_frame
+
+# 这些命令输出小、执行快，走常驻 shell 会话；耗时命令 (dump、screencap 等) 仍单独开连接
+SESSION_SHELL_COMMANDS = frozenset({
+    "am", "chmod", "date", "echo", "getprop", "ls", "md5sum", "mkdir",
+    "pm", "rm", "settings", "stat", "test", "toybox", "uname", "wm",
+})
+# 输出大小取决于文件内容，调用方确认输出很小 (small_output=True) 时才走常驻会话
+SESSION_OPT_IN_COMMANDS = frozenset({"cat"})
+# 含这些 shell 元字符的是复合命令或重定向，后面可能跟着耗时的命令，一律单独开连接
+_SHELL_COMPOUND_TOKENS = (";", "&", "|", ">", "<", "`", "$(", "\n")
+
+
+def can_use_shell_session(args: List[str], small_output: bool = False) -> bool:
+    """命令是否满足常驻 shell 会话 "输出小、执行快" 的约定"""
+    if not args:
+        return False
+    if any(token in arg for arg in args for token in _SHELL_COMPOUND_TOKENS):
+        return False
+    command = os.path.basename(args[0])
+    return command in SESSION_SHELL_COMMANDS or (small_output and command in SESSION_OPT_IN_COMMANDS)
+
+# get_ui_tree.js 通过 logcat 发出的事件: "<类型> <设备端毫秒时间戳> [详情]"
+AUTOJS_EVENT_DONE = "ui_tree_done"
+AUTOJS_EVENT_ERROR = "ui_tree_error"
+# get_ui_tree.js 启动时读取并删除的局部 dump 请求
+AUTOJS_REQUEST_PATH = "/sdcard/autojs_ui_tree_request.json"
+# get_ui_tree.js 与 ui_tree_agent.js 共用的序列化模块
+AUTOJS_DUMP_MODULE = "ui_tree_dump.js"
+
+
+def extract_streamed_xml(output: bytes) -> Optional[bytes]:
+    """从 `uiautomator dump /dev/tty` 的输出中截取 XML，去掉结尾的 "UI hierchary dumped to" 提示"""
+    start = output.find(b"<?xml")
+    if start < 0:
+        start = output.find(b"<hierarchy")
+    end = output.rfind(b"</hierarchy>")
+    if start < 0 or end < start:
+        return None
+    return output[start:end + len(b"</hierarchy>")]
+
+
+def autojs_script_targets(script_name: str, remote_script_path: str) -> List[Tuple[str, str]]:
+    """
+    推送 static 下的 AutoJs 脚本所需的 (本地路径, 设备路径)：脚本本身以及同目录下的
+    ui_tree_dump.js 模块 (脚本通过 require("./ui_tree_dump.js") 引用)；本地不存在的不列出
+    """
+    static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+    remote_dir = posixpath.dirname(remote_script_path)
+    targets = [
+        (os.path.join(static_dir, script_name), remote_script_path),
+        (os.path.join(static_dir, AUTOJS_DUMP_MODULE), posixpath.join(remote_dir, AUTOJS_DUMP_MODULE)),
+    ]
+    return [(local_path, remote_path) for local_path, remote_path in targets if os.path.exists(local_path)]
+
+
+def is_wireless_serial(serial: Optional[str]) -> bool:
+    """adb connect 的 host:port 或无线调试 mDNS 名称 (adb-xxx._adb-tls-connect._tcp)"""
+    return bool(serial) and (":" in serial or serial.startswith("adb-"))
 
 
 class AdbClient:
-    def __init__(self, adb_path: str = "adb") -> None:
+    def __init__(
+        self,
+        adb_path: str = "adb",
+        use_server_protocol: bool = True,
+        server_host: str = ADB_SERVER_HOST,
+        server_port: int = ADB_SERVER_PORT,
+        serial: Optional[str] = None,
+        compress_dumps: Optional[bool] = None,
+    ) -> None:
         self.adb_path = adb_path
+        # 为 None 时与 adb 默认行为一致：只有一台设备时自动选中
+        self.serial = serial
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.toybox_dir = os.path.join(project_root, "toybox")
         self.toybox_remote_path = "/data/local/tmp/toybox"
         self._toybox_ready = False
+        self._toybox_command: Optional[str] = None
+        # 界面树在设备端 gzip 压缩后再传输；None 表示无线连接时自动开启
+        self.compress_dumps = compress_dumps
+        self._gzip_supported: Optional[bool] = None
+        # 直接与 adb server 通信；server 不可达时退回到 adb 子进程
+        self.server: Optional[AdbServerClient] = (
+            AdbServerClient(server_host, server_port, serial=serial) if use_server_protocol else None
+        )
+        self.shell_session: Optional[AdbShellSession] = (
+            AdbShellSession(self.server) if self.server is not None else None
+        )
+        self.pipeline = CapturePipeline()
+        # None 表示尚未探测设备的 uiautomator 能否输出到 stdout
+        self._xml_stream_supported: Optional[bool] = None
+        self._raw_screencap_supported: Optional[bool] = None
+        self._last_autojs_event = 0
+        # AutoJs 模式优先使用设备上的常驻代理 (ui_tree_agent.js)，启动失败后自动关闭
+        self.use_autojs_agent = True
+        self._autojs_agent: Optional[AutoJsAgent] = None
+        self.push_cache = PushCache.shared()
+
+    def _adb_cmd(self, args: List[str]) -> List[str]:
+        if self.serial:
+            return [self.adb_path, "-s", self.serial] + args
+        return [self.adb_path] + args
 
-    def _run(self, args, timeout: int = 30) -> subprocess.CompletedProcess:
+    def _run(
+        self,
+        args,
+        timeout: int = 30,
+        cancel_token: Optional[CancelToken] = None,
+        small_output: bool = False,
+    ) -> subprocess.CompletedProcess:
+        """small_output 为 True 表示调用方确认输出很小，cat 等命令也可以走常驻 shell 会话"""
         if isinstance(args, str):
-            cmd = [self.adb_path] + args.split()
+            args = args.split()
         else:
-            cmd = [self.adb_path] + list(args)
+            args = list(args)
+        if self.server is not None:
+            try:
+                completed = self._run_via_server(args, timeout, cancel_token, small_output)
+            except (ConnectionRefusedError, socket.gaierror):
+                # server 尚未启动时交给 adb 命令行，它会顺带拉起 server
+                completed = None
+            except socket.timeout:
+                raise subprocess.TimeoutExpired(self._adb_cmd(args), timeout) from None
+            if completed is not None:
+                return completed
+        return self._run_subprocess(args, timeout, cancel_token)
+
+    def _run_subprocess(
+        self,
+        args: List[str],
+        timeout: int = 30,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> subprocess.CompletedProcess:
+        cmd = self._adb_cmd(args)
         try:
-            completed = subprocess.run(
+            proc = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                timeout=timeout,
-                check=False,
                 encoding="utf-8",
                 errors="replace",
             )
         except FileNotFoundError:
             raise RuntimeError("未找到 adb，可检查是否已安装并加入 PATH") from None
-        return completed
+        unregister = cancel_token.register(proc.kill) if cancel_token is not None else None
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        finally:
+            if unregister is not None:
+                unregister()
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
 
-    def _ensure_device(self) -> None:
+    def _run_via_server(
+        self,
+        args: List[str],
+        timeout: int,
+        cancel_token: Optional[CancelToken] = None,
+        small_output: bool = False,
+    ) -> Optional[subprocess.CompletedProcess]:
+        """把常用的 adb 子命令翻译为 smart socket 请求，不支持的命令返回 None"""
+        if not args:
+            return None
+        cmd = self._adb_cmd(args)
+        command = args[0]
+        try:
+            if command == "devices" and len(args) == 1:
+                body = self.server.devices()
+                return subprocess.CompletedProcess(cmd, 0, "List of devices attached\n" + body, "")
+            if command == "get-serialno" and len(args) == 1:
+                return subprocess.CompletedProcess(cmd, 0, self.server.get_serialno() + "\n", "")
+            if command == "shell" and len(args) > 1:
+                returncode, out, err = self._server_shell(args[1:], timeout, cancel_token, small_output)
+                return subprocess.CompletedProcess(
+                    cmd,
+                    returncode,
+                    out.decode("utf-8", errors="replace"),
+                    err.decode("utf-8", errors="replace"),
+                )
+            if command == "exec-out" and len(args) > 1:
+                out = self.server.exec_out(" ".join(args[1:]), timeout=timeout, cancel=cancel_token)
+                return subprocess.CompletedProcess(cmd, 0, out.decode("utf-8", errors="replace"), "")
+            if command == "push" and len(args) == 3:
+                if not os.path.isfile(args[1]):
+                    return None
+                size = self.server.push(args[1], args[2], cancel=cancel_token)
+                return subprocess.CompletedProcess(cmd, 0, f"{args[1]}: 1 file pushed. ({size} bytes)\n", "")
+            if command == "pull" and len(args) == 3:
+                size = self.server.pull(args[1], args[2], cancel=cancel_token)
+                return subprocess.CompletedProcess(cmd, 0, f"{args[1]}: 1 file pulled. ({size} bytes)\n", "")
+        except (ConnectionRefusedError, socket.gaierror, socket.timeout):
+            # 由 _run 处理：退回 adb 子进程或转换为 TimeoutExpired
+            raise
+        except (AdbProtocolError, OSError) as e:
+            # 连接被重置等 socket 错误与 adb 命令行一样以非 0 返回码报告，调用方据此给出 RuntimeError
+            return subprocess.CompletedProcess(cmd, 1, "", f"adb: error: {e}\n")
+        return None
+
+    def _server_shell(
+        self,
+        args: List[str],
+        timeout: int,
+        cancel_token: Optional[CancelToken] = None,
+        small_output: bool = False,
+    ) -> Tuple[int, bytes, bytes]:
+        command = " ".join(args)
+        if self.shell_session is not None and can_use_shell_session(args, small_output):
+            try:
+                # 会话被其他线程占用时返回 None，改用新连接而不是排队等待
+                result = self.shell_session.try_run(command, timeout=timeout, cancel=cancel_token)
+            except socket.timeout:
+                raise
+            except (AdbProtocolError, OSError):
+                if cancel_token is not None:
+                    cancel_token.check()
+                # 会话已失效 (设备重连等)，本次改用单独连接，下次调用会重建会话
+                result = None
+            if result is not None:
+                return result
+        return self.server.shell(command, timeout=timeout, cancel=cancel_token)
+
+    def close(self) -> None:
+        """关闭常驻 shell 会话、AutoJs 代理连接和复用的 sync 连接"""
+        if self._autojs_agent is not None:
+            self._autojs_agent.close()
+        if self.shell_session is not None:
+            self.shell_session.close()
+        if self.server is not None:
+            self.server.close()
+
+    def list_devices(self) -> List[Tuple[str, str]]:
+        """返回 adb 已知的所有设备 [(serial, state), ...]"""
         result = self._run(["devices"])
         if result.returncode != 0:
             message = result.stderr.strip() or result.stdout.strip()
             raise RuntimeError(f"adb devices 失败: {message}")
-        lines = [line.strip() for line in result.stdout.splitlines()[1:] if line.strip()]
-        devices = [line for line in lines if line.endswith("device")]
+        devices = []
+        for line in result.stdout.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1]))
+        return devices
+
+    def device_tracker(self) -> Optional[DeviceTracker]:
+        """与同一 adb server 的其他客户端共用的设备跟踪器；未启用 server 协议时为 None"""
+        if self.server is None:
+            return None
+        return DeviceTracker.shared(self.server.host, self.server.port)
+
+    def _ensure_device(self) -> None:
+        tracker = self.device_tracker()
+        if tracker is not None and tracker.wait_ready(1.0):
+            devices = tracker.online_serials()
+        else:
+            # server 尚未启动等情况下用 adb devices，顺带拉起 server，跟踪器随后会自动连上
+            devices = [serial for serial, state in self.list_devices() if state == "device"]
         if not devices:
             raise RuntimeError("未检测到已连接的 Android 设备")
+        if self.serial and self.serial not in devices:
+            raise RuntimeError(f"设备 {self.serial} 未连接或未授权")
 
-    def _capture_screenshot(self, local_path: str) -> None:
-        cmd = [self.adb_path, "exec-out", "screencap", "-p"]
+    def _exec_out(
+        self,
+        command: List[str],
+        sink: Optional[BinaryIO] = None,
+        timeout: int = 30,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> bytes:
+        """以原始字节读取 exec-out 的输出；传入 sink 时直接写入 sink 并返回空串"""
+        if self.server is not None:
+            try:
+                return self.server.exec_out(" ".join(command), sink=sink, timeout=timeout, cancel=cancel_token)
+            except socket.timeout:
+                raise subprocess.TimeoutExpired(self._adb_cmd(["exec-out"] + command), timeout) from None
+            except (ConnectionRefusedError, socket.gaierror):
+                pass
+            except OSError as e:
+                raise AdbProtocolError(f"adb connection lost: {e}") from e
+        cmd = self._adb_cmd(["exec-out"] + command)
         try:
-            with open(local_path, "wb") as file_obj:
-                proc = subprocess.Popen(
-                    cmd,
-                    stdout=file_obj,
-                    stderr=subprocess.PIPE,
-                )
-                _, stderr_data = proc.communicate(timeout=30)
+            proc = subprocess.Popen(
+                cmd,
+                stdout=sink if sink is not None else subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
         except FileNotFoundError:
             raise RuntimeError("未找到 adb，可检查是否已安装并加入 PATH") from None
+        unregister = cancel_token.register(proc.kill) if cancel_token is not None else None
+        try:
+            stdout_data, stderr_data = proc.communicate(timeout=timeout)
         except subprocess.TimeoutExpired:
             proc.kill()
-            raise RuntimeError("获取截图超时")
+            proc.communicate()
+            raise
+        finally:
+            if unregister is not None:
+                unregister()
         if proc.returncode != 0:
             message = stderr_data.decode("utf-8", errors="replace") if stderr_data else ""
-            raise RuntimeError(f"获取截图失败: {message.strip()}")
+            raise AdbProtocolError(message.strip())
+        return stdout_data or b""
+
+    def _capture_screenshot(self, local_path: str, cancel_token: Optional[CancelToken] = None) -> None:
+        try:
+            with open(local_path, "wb") as file_obj:
+                self._exec_out(["screencap", "-p"], sink=file_obj, cancel_token=cancel_token)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError("获取截图超时") from None
+        except AdbProtocolError as e:
+            raise RuntimeError(f"获取截图失败: {e}") from None
+
+    def _capture_screenshot_raw(self, cancel_token: Optional[CancelToken] = None, timeout: int = 30) -> RawFrame:
+        """
+        读取未经 PNG 编码的原始帧 (`screencap` 不带 -p)，省去设备端编码和本地解码。
+        帧格式无法识别时抛出 ValueError，数据被截断时抛出其子类 TruncatedFrameError。
+        """
+        try:
+            if self.server is not None:
+                try:
+                    conn = self.server.open_service("exec:screencap", timeout=timeout)
+                except (ConnectionRefusedError, socket.gaierror):
+                    conn = None
+                if conn is not None:
+                    try:
+                        with abort_on_cancel(conn, cancel_token):
+                            return read_raw_frame(conn.recv_into)
+                    finally:
+                        conn.close()
+            cmd = self._adb_cmd(["exec-out", "screencap"])
+            try:
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except FileNotFoundError:
+                raise RuntimeError("未找到 adb，可检查是否已安装并加入 PATH") from None
+            unregister = cancel_token.register(proc.kill) if cancel_token is not None else None
+            timer = threading.Timer(timeout, proc.kill)
+            timer.start()
+            try:
+                return read_raw_frame(proc.stdout.readinto)
+            finally:
+                timer.cancel()
+                if unregister is not None:
+                    unregister()
+                proc.kill()
+                proc.wait()
+                proc.stdout.close()
+        except socket.timeout:
+            raise RuntimeError("获取截图超时") from None
+        except (AdbProtocolError, OSError) as e:
+            raise RuntimeError(f"获取截图失败: {e}") from None
 
-    def _capture_ui_xml(self, local_path: str) -> None:
-        dump_result = self._run(["shell", "uiautomator", "dump", "/sdcard/window_dump.xml"])
+    def _capture_screenshot_into(
+        self,
+        local_path: str,
+        result: Dict,
+        raw: bool,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> None:
+        """截图阶段：raw 模式下结果放在 "screenshot_frame"，否则写入 PNG 并放在 "screenshot" """
+        if raw and self._raw_screencap_supported is not False:
+            try:
+                result["screenshot_frame"] = self._capture_screenshot_raw(cancel_token)
+                self._raw_screencap_supported = True
+                return
+            except TruncatedFrameError as e:
+                # 偶发的截断只影响本次截图，之后仍使用原始帧
+                if cancel_token is not None:
+                    cancel_token.check()
+                print(f"Warning: raw screencap truncated, fallback to PNG for this capture: {e}")
+            except ValueError as e:
+                if cancel_token is not None:
+                    cancel_token.check()
+                print(f"Warning: raw screencap unsupported, fallback to PNG: {e}")
+                self._raw_screencap_supported = False
+        self._capture_screenshot(local_path, cancel_token)
+        result["screenshot"] = local_path
+
+    def _should_compress(self) -> bool:
+        if self._gzip_supported is False:
+            return False
+        if self.compress_dumps is not None:
+            return self.compress_dumps
+        return is_wireless_serial(self._device_serial())
+
+    def _exec_out_gzip(self, command: str, cancel_token: Optional[CancelToken] = None) -> Optional[bytes]:
+        """
+        在设备端把命令输出经 toybox gzip 压缩后传回并在本地解压，失败时返回 None 由调用方本次不压缩。
+        只有确认设备上没有 gzip 时才记住结果、之后不再尝试；连接中断、输出截断等偶发错误不影响后续采集。
+        """
+        toybox = self.toybox_command()
+        try:
+            data = self._exec_out([f"{command} | {toybox} gzip -c"], cancel_token=cancel_token)
+        except AdbProtocolError:
+            data = b""
+        if data[:2] == b"\x1f\x8b":
+            try:
+                output = gzip.decompress(data)
+                self._gzip_supported = True
+                return output
+            except (OSError, EOFError, zlib.error):
+                pass
+        if cancel_token is not None:
+            cancel_token.check()
+        if self._gzip_supported is None:
+            self._gzip_supported = self._probe_gzip(toybox, cancel_token)
+        return None
+
+    def _probe_gzip(self, toybox: str, cancel_token: Optional[CancelToken] = None) -> Optional[bool]:
+        """
+        执行 gzip --help：shell 报命令不存在 (126/127) 或 toybox 不含 gzip 时返回 False；
+        探测本身失败 (连接中断、设备离线等) 时返回 None，下次再判断
+        """
+        try:
+            result = self._run(["shell", toybox, "gzip", "--help"], timeout=10, cancel_token=cancel_token)
+        except (OSError, subprocess.SubprocessError, AdbProtocolError):
+            return None
+        if result.returncode == 0:
+            return True
+        if result.returncode in (126, 127) or "unknown command" in (result.stdout + result.stderr).lower():
+            return False
+        return None
+
+    def _pull_dump(
+        self,
+        remote_path: str,
+        local_path: str,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> subprocess.CompletedProcess:
+        """拉取设备上的界面树文件；需要压缩时改为 gzip 流式读取，返回 adb pull 风格的结果"""
+        if self._should_compress():
+            data = self._exec_out_gzip(f"cat {shlex.quote(remote_path)}", cancel_token)
+            if data is not None:
+                with open(local_path, "wb") as f:
+                    f.write(data)
+                return subprocess.CompletedProcess(["exec-out", "cat", remote_path], 0, "", "")
+        return self._run(["pull", remote_path, local_path], cancel_token=cancel_token)
+
+    def _capture_ui_xml(self, local_path: str, cancel_token: Optional[CancelToken] = None) -> None:
+        dump_result = self._run(["shell", "uiautomator", "dump", "/sdcard/window_dump.xml"], cancel_token=cancel_token)
         if dump_result.returncode != 0:
             message = dump_result.stderr.strip() or dump_result.stdout.strip()
             raise RuntimeError(f"执行 uiautomator dump 失败: {message}")
-        pull_result = self._run(["pull", "/sdcard/window_dump.xml", local_path])
+        pull_result = self._pull_dump("/sdcard/window_dump.xml", local_path, cancel_token)
         if pull_result.returncode != 0:
             message = pull_result.stderr.strip() or pull_result.stdout.strip()
             raise RuntimeError(f"拉取 window_dump.xml 失败: {message}")
 
-    def _run_autojs_ui_tree_script(self, remote_script_path: str = "/storage/emulated/0/脚本/get_ui_tree.js") -> None:
+    def _stream_ui_xml(self, cancel_token: Optional[CancelToken] = None) -> Optional[bytes]:
+        """
+        让 uiautomator 把界面树直接写到 stdout 并经 exec-out 读回，不落盘到 /sdcard。
+        设备不支持时返回 None，由调用方退回到 dump + pull。
+        """
+        if self._xml_stream_supported is False:
+            return None
+        if self._should_compress():
+            output = self._exec_out_gzip("uiautomator dump /dev/tty", cancel_token)
+            if output is not None:
+                return extract_streamed_xml(output)
+        try:
+            output = self._exec_out(["uiautomator", "dump", "/dev/tty"], cancel_token=cancel_token)
+        except AdbProtocolError:
+            return None
+        return extract_streamed_xml(output)
+
+    def _capture_ui_xml_streaming(self, xml_path: str, result: Dict, cancel_token: Optional[CancelToken] = None) -> None:
+        data = self._stream_ui_xml(cancel_token)
+        if data is not None:
+            self._xml_stream_supported = True
+            result["xml_data"] = data
+            return
+        if cancel_token is not None:
+            cancel_token.check()
+        self._capture_ui_xml(xml_path, cancel_token)
+        # 流式输出失败但落盘方式可用，说明该设备的 uiautomator 不支持写 /dev/tty
+        if self._xml_stream_supported is None:
+            self._xml_stream_supported = False
+        result["xml"] = xml_path
+
+    def _run_autojs_ui_tree_script(
+        self,
+        remote_script_path: str = "/storage/emulated/0/脚本/get_ui_tree.js",
+        cancel_token: Optional[CancelToken] = None,
+    ) -> None:
+        self.run_autojs_script(remote_script_path, cancel_token=cancel_token)
+
+    def run_autojs_script(self, remote_script_path: str, cancel_token: Optional[CancelToken] = None) -> None:
+        """通过 RunIntentActivity 让 AutoJs6 运行设备上的脚本"""
         file_uri = f"file://{remote_script_path}"
         pkg = "org.autojs.autojs6"
         cls = "org.autojs.autojs.external.open.RunIntentActivity"
@@ -86,9 +530,24 @@ class AdbClient:
             "-t",
             "text/javascript",
         ]
-        self._run(cmd)
+        self._run(cmd, cancel_token=cancel_token)
 
-    def capture_snapshot(self, output_dir: Optional[str] = None) -> Dict[str, str]:
+    def capture_snapshot(
+        self,
+        output_dir: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        stream_xml: bool = False,
+        raw_screenshot: bool = False,
+    ) -> Dict:
+        """
+        采集截图和 uiautomator 界面树。
+        stream_xml 为 True 时界面树以字节形式放在 "xml_data" 中，不写临时文件；
+        设备不支持流式输出时自动退回，结果中仍给出 "xml" 文件路径。
+        raw_screenshot 为 True 时截图以 RawFrame 放在 "screenshot_frame" 中，
+        同样在不支持时退回到 "screenshot" PNG 路径。
+        """
+        # 在 pipeline.run 之前失败 (设备不在等) 时不应留着上一次的耗时
+        self.pipeline.last_timings = {}
         if output_dir is None:
             output_dir = tempfile.mkdtemp(prefix="py_uiautomator_")
         else:
@@ -96,16 +555,43 @@ class AdbClient:
         self._ensure_device()
         screenshot_path = os.path.join(output_dir, "screenshot.png")
         xml_path = os.path.join(output_dir, "window_dump.xml")
-        self._capture_screenshot(screenshot_path)
-        self._capture_ui_xml(xml_path)
-        return {"screenshot": screenshot_path, "xml": xml_path}
+        result: Dict = {}
+        if stream_xml:
+            ui_stage = lambda token: self._capture_ui_xml_streaming(xml_path, result, token)
+        else:
+            result["xml"] = xml_path
+            ui_stage = lambda token: self._capture_ui_xml(xml_path, token)
+        # 截图与界面树互不依赖，并行采集；任一阶段失败都会取消另一阶段
+        self.pipeline.run(
+            {
+                "screenshot": lambda token: self._capture_screenshot_into(
+                    screenshot_path, result, raw_screenshot, token
+                ),
+                "ui_xml": ui_stage,
+            },
+            cancel_token,
+        )
+        return result
+
+    @property
+    def last_capture_timings(self) -> Dict[str, float]:
+        """最近一次采集各阶段耗时 (秒)，键为阶段名和 total"""
+        return dict(self.pipeline.last_timings)
 
     def capture_snapshot_via_autojs(
         self,
         output_dir: Optional[str] = None,
         json_remote_path: str = "/sdcard/autojs_ui_tree.json",
         remote_script_path: str = "/storage/emulated/0/脚本/get_ui_tree.js",
-    ) -> Dict[str, str]:
+        cancel_token: Optional[CancelToken] = None,
+        raw_screenshot: bool = False,
+        scope: Optional[DumpScope] = None,
+    ) -> Dict:
+        """
+        通过 AutoJs 脚本采集截图和界面树。scope 不为空时只 dump 指定的子树 / 区域 / 深度，
+        结果中的 "scope" 即该范围，界面树需用 partial_dump.merge_partial 合并进当前树
+        """
+        self.pipeline.last_timings = {}
         if output_dir is None:
             output_dir = tempfile.mkdtemp(prefix="py_uiautomator_")
         else:
@@ -115,66 +601,147 @@ class AdbClient:
         screenshot_path = os.path.join(output_dir, "screenshot.png")
         json_local_path = os.path.join(output_dir, "autojs_ui_tree.json")
 
-        self._capture_screenshot(screenshot_path)
-
-        # 如果本地存在静态 AutoJs 脚本，则自动推送到设备指定路径
-        try:
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            local_script = os.path.join(project_root, "static", "get_ui_tree.js")
-            if os.path.exists(local_script):
-                push_result = self._run(["push", local_script, remote_script_path])
-                if push_result.returncode != 0:
-                    message = push_result.stderr.strip() or push_result.stdout.strip()
-                    raise RuntimeError(
-                        "推送 AutoJs 脚本到设备失败。\n"
-                        f"本地脚本: {local_script}\n"
-                        f"目标路径: {remote_script_path}\n"
-                        f"原始 adb 输出: {message}"
-                    )
-        except Exception as e:
-            # 推送失败时直接抛出，便于用户修复环境
-            raise
+        result: Dict = {"autojs_json": json_local_path}
+        if scope is not None and not scope.is_full:
+            result["scope"] = scope
+        else:
+            scope = None
+        self.pipeline.run(
+            {
+                "screenshot": lambda token: self._capture_screenshot_into(
+                    screenshot_path, result, raw_screenshot, token
+                ),
+                "autojs_json": lambda token: self._capture_autojs_json(
+                    json_local_path, json_remote_path, remote_script_path, token, scope
+                ),
+            },
+            cancel_token,
+        )
 
-        # 先检查 AutoJs 脚本是否存在
-        script_check = self._run(["shell", "ls", remote_script_path])
-        if script_check.returncode != 0:
-            message = script_check.stderr.strip() or script_check.stdout.strip()
-            raise RuntimeError(
-                f"未在设备上找到 AutoJs 脚本: {remote_script_path}\n"
-                f"请确认已将 get_ui_tree.js 推送到该路径，或在代码中修改 remote_script_path。\n"
-                f"原始 adb 输出: {message}"
-            )
+        return result
 
-        # 删除设备上的旧 JSON 文件，防止使用旧数据
-        self._run(["shell", "rm", "-f", json_remote_path])
-        
+    def _capture_autojs_json(
+        self,
+        json_local_path: str,
+        json_remote_path: str,
+        remote_script_path: str,
+        cancel_token: Optional[CancelToken] = None,
+        scope: Optional[DumpScope] = None,
+    ) -> None:
         # 删除本地的旧 JSON 文件
         if os.path.exists(json_local_path):
             os.remove(json_local_path)
 
-        self._run_autojs_ui_tree_script(remote_script_path=remote_script_path)
+        # 优先走常驻代理：树直接从 socket 读回；代理起不来时本客户端改回单次运行脚本
+        if self.use_autojs_agent:
+            try:
+                data = self.autojs_agent().dump(scope, cancel_token)
+            except AutoJsAgentError as e:
+                print(f"Warning: AutoJs agent unavailable, falling back to get_ui_tree.js: {e}")
+                self.use_autojs_agent = False
+            else:
+                with open(json_local_path, "wb") as f:
+                    f.write(data)
+                return
 
-        for _ in range(30):
-            result = self._run(["shell", "ls", json_remote_path])
-            if result.returncode == 0:
-                break
-            time.sleep(0.5)
-        else:
-            raise RuntimeError(
-                "等待 AutoJs 生成 UI 树 JSON 超时。\n"
-                f"请检查 AutoJs 是否已开启无障碍，并确认脚本 {remote_script_path} 能正常在手机上单独运行，"
-                f"且会在 {json_remote_path} 生成 JSON 文件。"
+        self.push_autojs_script("get_ui_tree.js", remote_script_path, cancel_token)
+
+        if scope is not None:
+            payload = json.dumps(scope.to_request(), separators=(",", ":"))
+            request_result = self._run(
+                ["shell", "echo", shlex.quote(payload), ">", AUTOJS_REQUEST_PATH], cancel_token=cancel_token
             )
+            if request_result.returncode != 0:
+                message = request_result.stderr.strip() or request_result.stdout.strip()
+                raise RuntimeError(f"写入局部 dump 请求失败: {message}")
+
+        # 启动脚本前记下设备时间，早于它的事件都是之前运行留下的
+        not_before = self._device_time_ms(cancel_token) or 0
+        # 先订阅完成事件再启动脚本，脚本写完 JSON 后会通过 logcat 通知，无需轮询 ls
+        with self.listen_device_events() as events:
+            self._run_autojs_ui_tree_script(remote_script_path=remote_script_path, cancel_token=cancel_token)
+            try:
+                message = events.wait_for(
+                    lambda item: self._accept_autojs_event(item, not_before),
+                    timeout=15,
+                    cancel_token=cancel_token,
+                )
+            except DeviceEventTimeout:
+                if scope is not None:
+                    # 脚本没有运行，请求文件还在，清掉以免影响下一次完整刷新
+                    self._run(["shell", "rm", "-f", AUTOJS_REQUEST_PATH])
+                raise RuntimeError(
+                    "等待 AutoJs 生成 UI 树 JSON 超时。\n"
+                    f"请检查 AutoJs 是否已开启无障碍，并确认脚本 {remote_script_path} 能正常在手机上单独运行，"
+                    f"且会在 {json_remote_path} 生成 JSON 文件。"
+                ) from None
+        if message.startswith(AUTOJS_EVENT_ERROR):
+            detail = message.split(" ", 2)[2] if message.count(" ") >= 2 else message
+            raise RuntimeError(f"AutoJs 脚本执行失败: {detail}")
 
-        pull_result = self._run(["pull", json_remote_path, json_local_path])
+        pull_result = self._pull_dump(json_remote_path, json_local_path, cancel_token)
         if pull_result.returncode != 0:
             message = pull_result.stderr.strip() or pull_result.stdout.strip()
             raise RuntimeError(f"拉取 AutoJs UI 树 JSON 失败: {message}")
 
-        # 删除设备上的 JSON 文件，防止下次使用旧数据
-        self._run(["shell", "rm", json_remote_path])
+    def push_autojs_script(
+        self, script_name: str, remote_script_path: str, cancel_token: Optional[CancelToken] = None
+    ) -> None:
+        """把 static 下的 AutoJs 脚本连同共用的 ui_tree_dump.js 模块推送到设备指定路径"""
+        for local_script, remote_path in autojs_script_targets(script_name, remote_script_path):
+            push_result = self.push_if_changed(local_script, remote_path, cancel_token)
+            if push_result is not None and push_result.returncode != 0:
+                message = push_result.stderr.strip() or push_result.stdout.strip()
+                # 推送失败时直接抛出，便于用户修复环境
+                raise RuntimeError(
+                    "推送 AutoJs 脚本到设备失败。\n"
+                    f"本地脚本: {local_script}\n"
+                    f"目标路径: {remote_path}\n"
+                    f"原始 adb 输出: {message}"
+                )
+
+    def autojs_agent(self) -> AutoJsAgent:
+        if self._autojs_agent is None:
+            self._autojs_agent = AutoJsAgent(self)
+        return self._autojs_agent
+
+    def _device_time_ms(self, cancel_token: Optional[CancelToken] = None) -> Optional[int]:
+        result = self._run(["shell"] + DEVICE_TIME_COMMAND.split(), cancel_token=cancel_token)
+        if result.returncode != 0:
+            return None
+        return parse_device_time_ms(result.stdout)
+
+    def _accept_autojs_event(self, message: str, not_before: int = 0) -> bool:
+        """
+        只接受本次启动脚本之后 (not_before 为启动前的设备毫秒时间)、且比上一次更新的
+        get_ui_tree.js 事件，过滤 logcat 中残留的旧消息
+        """
+        parts = message.split(" ", 2)
+        if len(parts) < 2 or parts[0] not in (AUTOJS_EVENT_DONE, AUTOJS_EVENT_ERROR):
+            return False
+        try:
+            stamp = int(parts[1])
+        except ValueError:
+            return False
+        if stamp < not_before or stamp <= self._last_autojs_event:
+            return False
+        self._last_autojs_event = stamp
+        return True
 
-        return {"screenshot": screenshot_path, "autojs_json": json_local_path}
+    def listen_device_events(self, tag: str = DEVICE_EVENT_TAG) -> DeviceEventListener:
+        """
+        订阅设备端事件 (logcat 中指定 tag 的消息)，用于替代轮询等待。
+        返回的监听器需要在触发设备端动作之前创建，用完后 close() 或作为 with 语句使用。
+        """
+        command = logcat_follow_command(tag)
+        if self.server is not None:
+            try:
+                conn = self.server.open_service("exec:" + command, timeout=None)
+            except (ConnectionRefusedError, socket.gaierror):
+                conn = None
+            if conn is not None:
+                return DeviceEventListener(conn.read_some, conn.abort)
+        return open_subprocess_listener(self._adb_cmd(["exec-out", command]))
 
     def list_files(self, remote_path: str) -> list:
         """List all files in remote directory recursively using find"""
@@ -207,6 +774,50 @@ class AdbClient:
         result = self._run(["push", local_path, remote_path])
         return result.returncode == 0
 
+    def _device_serial(self) -> Optional[str]:
+        """
+        当前目标设备的序列号，用作推送缓存的键。指定了 serial 时直接返回；
+        未指定时每次向 adb 查询，不缓存，以免自动选中的设备换了之后仍用旧的序列号
+        """
+        if self.serial:
+            return self.serial
+        result = self._run(["get-serialno"])
+        serial = result.stdout.strip() if result.returncode == 0 else ""
+        return serial if serial and serial != "unknown" else None
+
+    def _remote_md5(self, remote_path: str, cancel_token: Optional[CancelToken] = None) -> Optional[str]:
+        result = self._run(["shell", "md5sum", remote_path], cancel_token=cancel_token)
+        if result.returncode != 0:
+            return None
+        parts = result.stdout.split()
+        return parts[0].lower() if parts else None
+
+    def push_if_changed(
+        self,
+        local_path: str,
+        remote_path: str,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> Optional[subprocess.CompletedProcess]:
+        """
+        按内容哈希推送文件：设备上已是相同内容时跳过并返回 None，否则推送并返回 push 结果。
+        是否相同由设备端一次 md5sum 确认；缓存记录与本地内容不同时直接推送。
+        """
+        digest = self.push_cache.local_hash(local_path)
+        serial = self._device_serial()
+        cached = self.push_cache.get(serial, remote_path) if serial else None
+        if cached is None or cached == digest:
+            if self._remote_md5(remote_path, cancel_token) == digest:
+                if serial and cached is None:
+                    self.push_cache.set(serial, remote_path, digest)
+                return None
+        push_result = self._run(["push", local_path, remote_path], cancel_token=cancel_token)
+        if serial:
+            if push_result.returncode == 0:
+                self.push_cache.set(serial, remote_path, digest)
+            else:
+                self.push_cache.forget(serial, remote_path)
+        return push_result
+
     def _detect_abi(self) -> Optional[str]:
         result = self._run(["shell", "getprop", "ro.product.cpu.abi"])
         if result.returncode != 0:
@@ -271,13 +882,39 @@ class AdbClient:
     def _ensure_toybox(self) -> None:
         if getattr(self, "_toybox_ready", False):
             return
-        local_toybox = self._select_toybox_binary()
+        serial = self._device_serial()
+        # 记住每台设备选用的 toybox，重启后无需再次探测 ABI
+        local_toybox = None
+        cached_name = self.push_cache.get_meta(serial, "toybox_binary") if serial else None
+        if cached_name:
+            candidate = os.path.join(self.toybox_dir, cached_name)
+            if os.path.exists(candidate):
+                local_toybox = candidate
+        if not local_toybox:
+            local_toybox = self._select_toybox_binary()
         if not local_toybox:
             return
         remote_path = getattr(self, "toybox_remote_path", "/data/local/tmp/toybox")
-        push_result = self._run(["push", local_toybox, remote_path])
-        if push_result.returncode != 0:
+        cached = self.push_cache.get(serial, remote_path) if serial else None
+        push_result = self.push_if_changed(local_toybox, remote_path)
+        if push_result is not None and push_result.returncode != 0:
             return
-        chmod_result = self._run(["shell", "chmod", "755", remote_path])
-        if chmod_result.returncode == 0:
-            self._toybox_ready = True
+        # 缓存中没有记录时设备上的文件可能是其他工具推送的 (内容相同但没有执行权限)，
+        # 推送过或缓存未命中都补一次 chmod；缓存命中说明之前已由本程序推送并 chmod 过
+        if push_result is not None or cached is None:
+            chmod_result = self._run(["shell", "chmod", "755", remote_path])
+            if chmod_result.returncode != 0:
+                if serial:
+                    self.push_cache.forget(serial, remote_path)
+                return
+        if serial:
+            self.push_cache.set_meta(serial, "toybox_binary", os.path.basename(local_toybox))
+        self._toybox_ready = True
+
+    def toybox_command(self) -> str:
+        """可用的 toybox 路径：优先使用推送的完整版，否则用系统自带的 toybox"""
+        if self._toybox_command is None:
+            self._ensure_toybox()
+            # 结果记下来，本地没有对应 ABI 的 toybox 时不必每次重新探测
+            self._toybox_command = self.toybox_remote_path if self._toybox_ready else "toybox"
+        return self._toybox_command
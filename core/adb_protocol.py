@@ -0,0 +1,449 @@
+import io
+import os
+import socket
+import stat
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+
+# shell v2 协议的包类型
+SHELL_ID_STDIN = 0
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+
+SYNC_DATA_MAX = 64 * 1024
+_LEGACY_RC_MARKER = b"__PYADB_RC__"
+
+
+class AdbProtocolError(RuntimeError):
+    """adb server 返回 FAIL 或协议数据不符合预期"""
+
+
+def encode_request(payload: str) -> bytes:
+    data = payload.encode("utf-8")
+    return b"%04x" % len(data) + data
+
+
+def legacy_shell_command(command: str) -> str:
+    # 旧版 adbd 不返回退出码，也不区分 stdout/stderr，借助结尾标记取回 $?
+    return f"{command} ; echo {_LEGACY_RC_MARKER.decode()}$?"
+
+
+def split_legacy_shell_output(output: bytes) -> Tuple[int, bytes]:
+    """从 legacy_shell_command 的输出中取出 (returncode, 命令本身的输出)；找不到标记时返回码为 255"""
+    output = output.replace(b"\r\n", b"\n")
+    returncode = 255
+    marker_pos = output.rfind(_LEGACY_RC_MARKER)
+    if marker_pos >= 0:
+        tail = output[marker_pos + len(_LEGACY_RC_MARKER):].strip()
+        output = output[:marker_pos]
+        if tail.isdigit():
+            returncode = int(tail)
+    return returncode, output
+
+
+def encode_shell_packet(packet_id: int, data: bytes = b"") -> bytes:
+    return struct.pack("<BI", packet_id, len(data)) + data
+
+
+def encode_sync_request(command: bytes, arg) -> bytes:
+    if isinstance(arg, int):
+        return command + struct.pack("<I", arg)
+    data = arg.encode("utf-8") if isinstance(arg, str) else arg
+    return command + struct.pack("<I", len(data)) + data
+
+
+class AdbConnection:
+    """到 adb server 的一条 smart socket 连接"""
+
+    def __init__(self, host: str, port: int, timeout: Optional[float] = 30) -> None:
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self.sock.settimeout(timeout)
+
+    def send_request(self, payload: str) -> None:
+        self.sock.sendall(encode_request(payload))
+        self.read_status()
+
+    def read_status(self) -> None:
+        status = self.read_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbProtocolError(self.read_hex_block().decode("utf-8", errors="replace"))
+        raise AdbProtocolError(f"unexpected adb status: {status!r}")
+
+    def read_hex_block(self) -> bytes:
+        length = int(self.read_exact(4), 16)
+        return self.read_exact(length)
+
+    def read_exact(self, size: int) -> bytes:
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = self.sock.recv(min(remaining, 256 * 1024))
+            if not chunk:
+                raise AdbProtocolError("adb connection closed unexpectedly")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def read_some(self, size: int = 64 * 1024) -> bytes:
+        return self.sock.recv(size)
+
+    def recv_into(self, view: memoryview) -> int:
+        return self.sock.recv_into(view)
+
+    def read_all(self) -> bytes:
+        chunks = []
+        while True:
+            chunk = self.sock.recv(256 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def sendall(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def abort(self) -> None:
+        """从其他线程打断阻塞中的读写"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+@contextmanager
+def abort_on_cancel(conn: AdbConnection, cancel) -> Iterator[None]:
+    # cancel 为 capture_pipeline.CancelToken 或任何提供 register() 的对象
+    if cancel is None:
+        yield
+        return
+    unregister = cancel.register(conn.abort)
+    try:
+        yield
+    finally:
+        unregister()
+
+
+class AdbServerClient:
+    """
+    直接使用 adb server 的 smart socket 协议 (默认 localhost:5037)，
+    避免每条命令都 fork 一个 adb 进程。sync 连接会被复用。
+    """
+
+    def __init__(
+        self,
+        host: str = ADB_SERVER_HOST,
+        port: int = ADB_SERVER_PORT,
+        serial: Optional[str] = None,
+        timeout: float = 30,
+        max_idle_sync: int = 4,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.serial = serial
+        self.timeout = timeout
+        self.max_idle_sync = max_idle_sync
+        self._features: Optional[List[str]] = None
+        self._sync_pool: List[AdbConnection] = []
+        self._lock = threading.Lock()
+
+    # ---- 基础连接 ----
+
+    def connect(self, timeout: Optional[float] = None) -> AdbConnection:
+        return AdbConnection(self.host, self.port, timeout=self.timeout if timeout is None else timeout)
+
+    def _transport_request(self) -> str:
+        if self.serial:
+            return f"host:transport:{self.serial}"
+        return "host:transport-any"
+
+    def _host_prefix(self) -> str:
+        if self.serial:
+            return f"host-serial:{self.serial}:"
+        return "host:"
+
+    def host_command(self, service: str, timeout: Optional[float] = None) -> str:
+        """执行一次性的 host 服务 (如 host:devices)，返回其数据块"""
+        conn = self.connect(timeout)
+        try:
+            conn.send_request(service)
+            return conn.read_hex_block().decode("utf-8", errors="replace")
+        finally:
+            conn.close()
+
+    def open_service(self, service: str, timeout: Optional[float] = None) -> AdbConnection:
+        """切换到目标设备的 transport 后打开指定服务 (shell:/exec:/sync: 等)"""
+        conn = self.connect(timeout)
+        try:
+            conn.send_request(self._transport_request())
+            conn.send_request(service)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def features(self) -> List[str]:
+        if self._features is None:
+            try:
+                raw = self.host_command(self._host_prefix() + "features")
+            except AdbProtocolError:
+                raw = ""
+            self._features = [item for item in raw.strip().split(",") if item]
+        return self._features
+
+    def supports_shell_v2(self) -> bool:
+        return "shell_v2" in self.features()
+
+    def devices(self) -> str:
+        return self.host_command("host:devices")
+
+    def get_serialno(self) -> str:
+        return self.host_command(self._host_prefix() + "get-serialno").strip()
+
+    # ---- shell / exec ----
+
+    def shell(self, command: str, timeout: Optional[float] = None, cancel=None) -> Tuple[int, bytes, bytes]:
+        """执行 shell 命令，返回 (returncode, stdout, stderr)"""
+        if self.supports_shell_v2():
+            return self._shell_v2(command, timeout, cancel)
+        return self._shell_legacy(command, timeout, cancel)
+
+    def _shell_v2(self, command: str, timeout: Optional[float], cancel) -> Tuple[int, bytes, bytes]:
+        conn = self.open_service("shell,v2,raw:" + command, timeout)
+        stdout_chunks = []
+        stderr_chunks = []
+        returncode = 255
+        try:
+            with abort_on_cancel(conn, cancel):
+                while True:
+                    try:
+                        header = conn.read_exact(5)
+                    except AdbProtocolError:
+                        break
+                    packet_id, length = struct.unpack("<BI", header)
+                    data = conn.read_exact(length) if length else b""
+                    if packet_id == SHELL_ID_STDOUT:
+                        stdout_chunks.append(data)
+                    elif packet_id == SHELL_ID_STDERR:
+                        stderr_chunks.append(data)
+                    elif packet_id == SHELL_ID_EXIT:
+                        returncode = data[0] if data else 0
+                        break
+        finally:
+            conn.close()
+        return returncode, b"".join(stdout_chunks), b"".join(stderr_chunks)
+
+    def _shell_legacy(self, command: str, timeout: Optional[float], cancel) -> Tuple[int, bytes, bytes]:
+        conn = self.open_service("shell:" + legacy_shell_command(command), timeout)
+        try:
+            with abort_on_cancel(conn, cancel):
+                output = conn.read_all()
+        finally:
+            conn.close()
+        returncode, output = split_legacy_shell_output(output)
+        return returncode, output, b""
+
+    def exec_out(
+        self,
+        command: str,
+        sink: Optional[BinaryIO] = None,
+        timeout: Optional[float] = None,
+        cancel=None,
+    ) -> bytes:
+        """exec: 服务输出原始字节；传入 sink 时直接写入，避免在内存中拼接"""
+        conn = self.open_service("exec:" + command, timeout)
+        try:
+            with abort_on_cancel(conn, cancel):
+                if sink is None:
+                    return conn.read_all()
+                while True:
+                    chunk = conn.read_some(256 * 1024)
+                    if not chunk:
+                        break
+                    sink.write(chunk)
+                return b""
+        finally:
+            conn.close()
+
+    # ---- sync: push / pull ----
+
+    def _acquire_sync(self) -> Tuple[AdbConnection, bool]:
+        with self._lock:
+            if self._sync_pool:
+                return self._sync_pool.pop(), True
+        return self.open_service("sync:"), False
+
+    def _release_sync(self, conn: AdbConnection) -> None:
+        with self._lock:
+            if len(self._sync_pool) < self.max_idle_sync:
+                conn.settimeout(self.timeout)
+                self._sync_pool.append(conn)
+                return
+        conn.close()
+
+    def _drop_sync_pool(self) -> None:
+        with self._lock:
+            pool, self._sync_pool = self._sync_pool, []
+        for conn in pool:
+            conn.close()
+
+    def _with_sync(self, action: Callable[[AdbConnection], object], cancel=None):
+        retried = False
+        while True:
+            if retried:
+                conn, reused = self.open_service("sync:"), False
+            else:
+                conn, reused = self._acquire_sync()
+            try:
+                with abort_on_cancel(conn, cancel):
+                    result = action(conn)
+            except (AdbProtocolError, ConnectionResetError, BrokenPipeError) as e:
+                # FAIL 应答后 sync 会话已不可用
+                conn.close()
+                # 池中的连接可能已被 server 关闭 (设备断开、server 重启)：对端关闭表现为读到 EOF，
+                # 或写入时 EPIPE / 读写时 RST。池里其余连接多半同样失效，一并丢弃后换新连接重试一次
+                stale = isinstance(e, OSError) or "closed unexpectedly" in str(e)
+                if reused and stale and not (cancel is not None and cancel.cancelled):
+                    self._drop_sync_pool()
+                    retried = True
+                    continue
+                if isinstance(e, OSError):
+                    raise AdbProtocolError(f"adb connection lost: {e}") from e
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            self._release_sync(conn)
+            return result
+
+    @staticmethod
+    def _sync_stat(conn: AdbConnection, remote_path: str) -> Tuple[int, int, int]:
+        conn.sendall(encode_sync_request(b"STAT", remote_path))
+        reply = conn.read_exact(16)
+        if reply[:4] != b"STAT":
+            raise AdbProtocolError(f"unexpected sync reply: {reply[:4]!r}")
+        mode, size, mtime = struct.unpack("<III", reply[4:])
+        return mode, size, mtime
+
+    def stat(self, remote_path: str) -> Tuple[int, int, int]:
+        """返回远程文件的 (mode, size, mtime)，不存在时 mode 为 0"""
+        return self._with_sync(lambda conn: self._sync_stat(conn, remote_path))
+
+    def push(self, local_path: str, remote_path: str, cancel=None) -> int:
+        """推送单个文件，返回写入的字节数"""
+        local_stat = os.stat(local_path)
+
+        def do_push(conn: AdbConnection) -> int:
+            target = remote_path
+            if target.endswith("/") or stat.S_ISDIR(self._sync_stat(conn, target)[0]):
+                target = target.rstrip("/") + "/" + os.path.basename(local_path)
+            mode = stat.S_IFREG | (local_stat.st_mode & 0o777)
+            conn.sendall(encode_sync_request(b"SEND", f"{target},{mode}"))
+            written = 0
+            with open(local_path, "rb") as file_obj:
+                while True:
+                    chunk = file_obj.read(SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    conn.sendall(encode_sync_request(b"DATA", chunk))
+                    written += len(chunk)
+            conn.sendall(encode_sync_request(b"DONE", int(local_stat.st_mtime)))
+            self._read_sync_result(conn)
+            return written
+
+        return self._with_sync(do_push, cancel)
+
+    def push_bytes(self, data: bytes, remote_path: str, mode: int = 0o644) -> None:
+        def do_push(conn: AdbConnection) -> None:
+            conn.sendall(encode_sync_request(b"SEND", f"{remote_path},{stat.S_IFREG | mode}"))
+            for offset in range(0, len(data), SYNC_DATA_MAX):
+                conn.sendall(encode_sync_request(b"DATA", data[offset:offset + SYNC_DATA_MAX]))
+            conn.sendall(encode_sync_request(b"DONE", int(time.time())))
+            self._read_sync_result(conn)
+
+        self._with_sync(do_push)
+
+    def pull(self, remote_path: str, local_path: str, cancel=None) -> int:
+        """拉取单个文件，返回读取的字节数"""
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path.rstrip("/")))
+        tmp_path = local_path + ".pyadb_part"
+
+        def do_pull(conn: AdbConnection) -> int:
+            with open(tmp_path, "wb") as file_obj:
+                return self._sync_recv(conn, remote_path, file_obj)
+
+        try:
+            received = self._with_sync(do_pull, cancel)
+            os.replace(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return received
+
+    def pull_bytes(self, remote_path: str, cancel=None) -> bytes:
+        def do_pull(conn: AdbConnection) -> bytes:
+            buffer = io.BytesIO()
+            self._sync_recv(conn, remote_path, buffer)
+            return buffer.getvalue()
+
+        return self._with_sync(do_pull, cancel)
+
+    @staticmethod
+    def _sync_recv(conn: AdbConnection, remote_path: str, sink) -> int:
+        conn.sendall(encode_sync_request(b"RECV", remote_path))
+        received = 0
+        while True:
+            header = conn.read_exact(8)
+            command = header[:4]
+            length = struct.unpack("<I", header[4:])[0]
+            if command == b"DATA":
+                chunk = conn.read_exact(length)
+                sink.write(chunk)
+                received += len(chunk)
+            elif command == b"DONE":
+                return received
+            elif command == b"FAIL":
+                raise AdbProtocolError(conn.read_exact(length).decode("utf-8", errors="replace"))
+            else:
+                raise AdbProtocolError(f"unexpected sync reply: {command!r}")
+
+    @staticmethod
+    def _read_sync_result(conn: AdbConnection) -> None:
+        header = conn.read_exact(8)
+        command = header[:4]
+        length = struct.unpack("<I", header[4:])[0]
+        if command == b"OKAY":
+            return
+        if command == b"FAIL":
+            raise AdbProtocolError(conn.read_exact(length).decode("utf-8", errors="replace"))
+        raise AdbProtocolError(f"unexpected sync reply: {command!r}")
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._sync_pool = self._sync_pool, []
+        for conn in pool:
+            try:
+                conn.sendall(encode_sync_request(b"QUIT", 0))
+            except OSError:
+                pass
+            conn.close()
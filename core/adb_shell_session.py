@@ -0,0 +1,135 @@
+import struct
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+
+from .adb_protocol import (
+    SHELL_ID_EXIT,
+    SHELL_ID_STDERR,
+    SHELL_ID_STDIN,
+    SHELL_ID_STDOUT,
+    AdbConnection,
+    AdbProtocolError,
+    AdbServerClient,
+    abort_on_cancel,
+    encode_shell_packet,
+)
+
+
+class AdbShellSession:
+    """
+    设备上常驻的一个 sh 进程，小命令通过 stdin 依次写入，省去每条命令
+    新建 transport 和 shell 服务的开销。每条命令的输出以随机哨兵行结束，
+    哨兵后面带上退出码。
+
+    支持 shell v2 时 stdout/stderr 分开返回；否则退回 exec:sh，stderr 合并进 stdout。
+    会话同一时刻只执行一条命令，忙时 try_run 返回 None，由调用方另开连接。
+    """
+
+    def __init__(self, server: AdbServerClient, idle_timeout: float = 60) -> None:
+        self.server = server
+        # 超过该时长未使用的会话在下次使用前重建，避免设备休眠后拿到失效连接
+        self.idle_timeout = idle_timeout
+        self._conn: Optional[AdbConnection] = None
+        self._shell_v2 = False
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def _open(self) -> None:
+        self._shell_v2 = self.server.supports_shell_v2()
+        service = "shell,v2,raw:sh" if self._shell_v2 else "exec:sh"
+        self._conn = self.server.open_service(service)
+
+    def _write(self, data: bytes) -> None:
+        if self._shell_v2:
+            data = encode_shell_packet(SHELL_ID_STDIN, data)
+        self._conn.sendall(data)
+
+    def _read_packet(self) -> Tuple[int, bytes]:
+        if self._shell_v2:
+            packet_id, length = struct.unpack("<BI", self._conn.read_exact(5))
+            return packet_id, self._conn.read_exact(length) if length else b""
+        chunk = self._conn.read_some()
+        if not chunk:
+            raise AdbProtocolError("adb shell session closed")
+        return SHELL_ID_STDOUT, chunk
+
+    def run(self, command: str, timeout: Optional[float] = None, cancel=None) -> Tuple[int, bytes, bytes]:
+        """执行一条命令，返回 (returncode, stdout, stderr)；出错时会话被关闭，下次调用自动重连"""
+        with self._lock:
+            return self._run_locked(command, timeout, cancel)
+
+    def try_run(self, command: str, timeout: Optional[float] = None, cancel=None) -> Optional[Tuple[int, bytes, bytes]]:
+        """会话正被其他线程占用时立即返回 None"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._run_locked(command, timeout, cancel)
+        finally:
+            self._lock.release()
+
+    def _run_locked(self, command: str, timeout: Optional[float], cancel) -> Tuple[int, bytes, bytes]:
+        if self._conn is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._close_locked()
+        if self._conn is None:
+            self._open()
+        sentinel = f"__PYADB_{uuid.uuid4().hex}__".encode()
+        # 子 shell 隔离 exit/cd，</dev/null 防止命令读走后续命令
+        if self._shell_v2:
+            script = (
+                f"( {command} ) </dev/null; "
+                f"printf '%s%d\\n' {sentinel.decode()} $?; printf '%s\\n' {sentinel.decode()} >&2\n"
+            )
+        else:
+            script = f"( {command} ) </dev/null 2>&1; printf '%s%d\\n' {sentinel.decode()} $?\n"
+        try:
+            self._conn.settimeout(self.server.timeout if timeout is None else timeout)
+            with abort_on_cancel(self._conn, cancel):
+                self._write(script.encode("utf-8"))
+                return self._collect(sentinel)
+        except BaseException:
+            # 输出可能读了一半，会话状态不可信，直接丢弃
+            self._close_locked()
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+    def _collect(self, sentinel: bytes) -> Tuple[int, bytes, bytes]:
+        stdout = bytearray()
+        stderr = bytearray()
+        returncode: Optional[int] = None
+        stderr_done = not self._shell_v2
+        while returncode is None or not stderr_done:
+            packet_id, data = self._read_packet()
+            if packet_id == SHELL_ID_STDOUT and returncode is None:
+                stdout += data
+                pos = stdout.find(sentinel)
+                if pos >= 0:
+                    line_end = stdout.find(b"\n", pos)
+                    if line_end < 0:
+                        continue
+                    returncode = int(stdout[pos + len(sentinel):line_end].strip() or b"255")
+                    del stdout[pos:]
+            elif packet_id == SHELL_ID_STDERR and not stderr_done:
+                stderr += data
+                pos = stderr.find(sentinel + b"\n")
+                if pos >= 0:
+                    stderr_done = True
+                    del stderr[pos:]
+            elif packet_id == SHELL_ID_EXIT:
+                raise AdbProtocolError("adb shell session exited")
+        return returncode, bytes(stdout), bytes(stderr)
+
+    def _close_locked(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
@@ -0,0 +1,444 @@
+import asyncio
+import os
+import shlex
+import stat
+import struct
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .adb_client import AUTOJS_EVENT_DONE, AUTOJS_EVENT_ERROR, autojs_script_targets, extract_streamed_xml
+from .adb_protocol import (
+    ADB_SERVER_HOST,
+    ADB_SERVER_PORT,
+    SHELL_ID_EXIT,
+    SHELL_ID_STDERR,
+    SHELL_ID_STDOUT,
+    SYNC_DATA_MAX,
+    AdbProtocolError,
+    encode_request,
+    encode_sync_request,
+    legacy_shell_command,
+    split_legacy_shell_output,
+)
+from .device_events import (
+    DEVICE_EVENT_TAG,
+    DEVICE_TIME_COMMAND,
+    DeviceEventTimeout,
+    logcat_follow_command,
+    parse_device_time_ms,
+)
+from .push_cache import file_md5
+from .screencap import TruncatedFrameError, parse_raw_frame
+
+Stream = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncAdbClient:
+    """
+    AdbClient 的 asyncio 版本，直接通过 asyncio socket 与 adb server 通信，
+    便于嵌入基于事件循环的设备农场控制程序。GUI 仍然使用同步的 AdbClient。
+
+    每个客户端对同一设备的并发请求数受 max_concurrency 限制；
+    所有方法都支持 asyncio 取消，timeout 参数到期时抛出 asyncio.TimeoutError。
+    """
+
+    def __init__(
+        self,
+        serial: Optional[str] = None,
+        adb_path: str = "adb",
+        host: str = ADB_SERVER_HOST,
+        port: int = ADB_SERVER_PORT,
+        max_concurrency: int = 4,
+        timeout: float = 30,
+    ) -> None:
+        self.serial = serial
+        self.adb_path = adb_path
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.last_capture_timings: Dict[str, float] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._features: Optional[List[str]] = None
+        self._server_started = False
+        self._last_autojs_event = 0
+
+    # ---- 连接与基础协议 ----
+
+    def _limit(self) -> asyncio.Semaphore:
+        # 延迟创建，保证 Semaphore 绑定到实际运行的事件循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _connect(self) -> Stream:
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except ConnectionRefusedError:
+            if self._server_started:
+                raise
+            # adb server 未运行时用 adb 命令行拉起一次
+            self._server_started = True
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    self.adb_path, "start-server",
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+            except FileNotFoundError:
+                raise RuntimeError("未找到 adb，可检查是否已安装并加入 PATH") from None
+            await proc.wait()
+            return await asyncio.open_connection(self.host, self.port)
+
+    @staticmethod
+    async def _request(stream: Stream, payload: str) -> None:
+        reader, writer = stream
+        writer.write(encode_request(payload))
+        await writer.drain()
+        status = await reader.readexactly(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            length = int(await reader.readexactly(4), 16)
+            message = await reader.readexactly(length)
+            raise AdbProtocolError(message.decode("utf-8", errors="replace"))
+        raise AdbProtocolError(f"unexpected adb status: {status!r}")
+
+    @staticmethod
+    async def _close(stream: Stream) -> None:
+        writer = stream[1]
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, asyncio.CancelledError):
+            pass
+
+    async def _host_command(self, service: str) -> str:
+        stream = await self._connect()
+        try:
+            await self._request(stream, service)
+            length = int(await stream[0].readexactly(4), 16)
+            return (await stream[0].readexactly(length)).decode("utf-8", errors="replace")
+        except asyncio.IncompleteReadError:
+            raise AdbProtocolError("adb connection closed unexpectedly") from None
+        finally:
+            await self._close(stream)
+
+    @asynccontextmanager
+    async def _service(self, service: str, limited: bool = True) -> AsyncIterator[Stream]:
+        """打开设备服务；limited 为 False 的长连接 (如 logcat) 不占用并发名额"""
+        if limited:
+            await self._limit().acquire()
+        try:
+            stream = await self._connect()
+            try:
+                transport = f"host:transport:{self.serial}" if self.serial else "host:transport-any"
+                await self._request(stream, transport)
+                await self._request(stream, service)
+                yield stream
+            except asyncio.IncompleteReadError:
+                # server 在传输途中断开，与同步客户端一样报告为 AdbProtocolError
+                raise AdbProtocolError("adb connection closed unexpectedly") from None
+            finally:
+                await self._close(stream)
+        finally:
+            if limited:
+                self._limit().release()
+
+    async def _with_timeout(self, coro: Awaitable, timeout: Optional[float]):
+        return await asyncio.wait_for(coro, self.timeout if timeout is None else timeout)
+
+    async def features(self) -> List[str]:
+        if self._features is None:
+            prefix = f"host-serial:{self.serial}:" if self.serial else "host:"
+            try:
+                raw = await self._host_command(prefix + "features")
+            except AdbProtocolError:
+                raw = ""
+            self._features = [item for item in raw.strip().split(",") if item]
+        return self._features
+
+    async def devices(self) -> List[Tuple[str, str]]:
+        body = await self._host_command("host:devices")
+        result = []
+        for line in body.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                result.append((parts[0], parts[1]))
+        return result
+
+    # ---- shell / exec ----
+
+    async def shell(self, command: str, timeout: Optional[float] = None) -> Tuple[int, str, str]:
+        """执行 shell 命令，返回 (returncode, stdout, stderr)"""
+        return await self._with_timeout(self._shell(command), timeout)
+
+    async def _shell(self, command: str) -> Tuple[int, str, str]:
+        if "shell_v2" not in await self.features():
+            async with self._service("shell:" + legacy_shell_command(command)) as (reader, _):
+                output = await reader.read()
+            returncode, output = split_legacy_shell_output(output)
+            return returncode, output.decode("utf-8", errors="replace"), ""
+        stdout_chunks = []
+        stderr_chunks = []
+        returncode = 255
+        async with self._service("shell,v2,raw:" + command) as (reader, _):
+            while True:
+                try:
+                    packet_id, length = struct.unpack("<BI", await reader.readexactly(5))
+                except asyncio.IncompleteReadError:
+                    break
+                data = await reader.readexactly(length) if length else b""
+                if packet_id == SHELL_ID_STDOUT:
+                    stdout_chunks.append(data)
+                elif packet_id == SHELL_ID_STDERR:
+                    stderr_chunks.append(data)
+                elif packet_id == SHELL_ID_EXIT:
+                    returncode = data[0] if data else 0
+                    break
+        return (
+            returncode,
+            b"".join(stdout_chunks).decode("utf-8", errors="replace"),
+            b"".join(stderr_chunks).decode("utf-8", errors="replace"),
+        )
+
+    async def exec_out(self, command: str, timeout: Optional[float] = None) -> bytes:
+        async def run() -> bytes:
+            async with self._service("exec:" + command) as (reader, _):
+                return await reader.read()
+
+        return await self._with_timeout(run(), timeout)
+
+    # ---- sync: push / pull ----
+
+    @staticmethod
+    async def _read_sync_status(reader: asyncio.StreamReader) -> None:
+        header = await reader.readexactly(8)
+        length = struct.unpack("<I", header[4:])[0]
+        if header[:4] == b"OKAY":
+            return
+        if header[:4] == b"FAIL":
+            raise AdbProtocolError((await reader.readexactly(length)).decode("utf-8", errors="replace"))
+        raise AdbProtocolError(f"unexpected sync reply: {header[:4]!r}")
+
+    async def push_file(self, local_path: str, remote_path: str, timeout: Optional[float] = None) -> bool:
+        """Push file from local to device"""
+        try:
+            await self._with_timeout(self._push(local_path, remote_path), timeout)
+        except (AdbProtocolError, OSError):
+            return False
+        return True
+
+    async def _push(self, local_path: str, remote_path: str) -> None:
+        local_stat = os.stat(local_path)
+        async with self._service("sync:") as (reader, writer):
+            target = remote_path
+            if not target.endswith("/"):
+                writer.write(encode_sync_request(b"STAT", target))
+                reply = await reader.readexactly(16)
+                if stat.S_ISDIR(struct.unpack("<I", reply[4:8])[0]):
+                    target += "/"
+            if target.endswith("/"):
+                target += os.path.basename(local_path)
+            mode = stat.S_IFREG | (local_stat.st_mode & 0o777)
+            writer.write(encode_sync_request(b"SEND", f"{target},{mode}"))
+            with open(local_path, "rb") as file_obj:
+                while True:
+                    chunk = file_obj.read(SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    writer.write(encode_sync_request(b"DATA", chunk))
+                    await writer.drain()
+            writer.write(encode_sync_request(b"DONE", int(local_stat.st_mtime)))
+            await writer.drain()
+            await self._read_sync_status(reader)
+
+    async def pull_file(self, remote_path: str, local_path: str, timeout: Optional[float] = None) -> bool:
+        """Pull file from device to local"""
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        try:
+            data = await self._with_timeout(self._pull_bytes(remote_path), timeout)
+        except (AdbProtocolError, OSError):
+            return False
+        with open(local_path, "wb") as f:
+            f.write(data)
+        return True
+
+    async def _pull_bytes(self, remote_path: str) -> bytes:
+        chunks = []
+        async with self._service("sync:") as (reader, writer):
+            writer.write(encode_sync_request(b"RECV", remote_path))
+            await writer.drain()
+            while True:
+                header = await reader.readexactly(8)
+                length = struct.unpack("<I", header[4:])[0]
+                if header[:4] == b"DATA":
+                    chunks.append(await reader.readexactly(length))
+                elif header[:4] == b"DONE":
+                    break
+                elif header[:4] == b"FAIL":
+                    raise AdbProtocolError((await reader.readexactly(length)).decode("utf-8", errors="replace"))
+                else:
+                    raise AdbProtocolError(f"unexpected sync reply: {header[:4]!r}")
+        return b"".join(chunks)
+
+    async def list_files(self, remote_path: str, timeout: Optional[float] = None) -> list:
+        """List all files in remote directory recursively using find"""
+        returncode, stdout, stderr = await self.shell(f"find {remote_path} -type f", timeout)
+        if returncode != 0:
+            print(f"Warning: list_files failed: {stderr}")
+            return []
+        return [
+            line.strip() for line in stdout.splitlines()
+            if line.strip() and not line.strip().startswith("find:")
+        ]
+
+    # ---- 采集 ----
+
+    async def _run_stages(self, stages: Dict[str, Callable[[], Awaitable[None]]]) -> None:
+        """并发执行各阶段；任一阶段失败时取消其余阶段并抛出该异常"""
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
+        async def timed(name: str, stage: Callable[[], Awaitable[None]]) -> None:
+            stage_start = time.perf_counter()
+            try:
+                await stage()
+            finally:
+                timings[name] = time.perf_counter() - stage_start
+
+        tasks = [asyncio.ensure_future(timed(name, stage)) for name, stage in stages.items()]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in tasks:
+                if task in done and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            timings["total"] = time.perf_counter() - start
+            self.last_capture_timings = timings
+
+    async def _screenshot_stage(self, screenshot_path: str, result: Dict, raw: bool) -> None:
+        if raw:
+            try:
+                result["screenshot_frame"] = parse_raw_frame(await self.exec_out("screencap"))
+                return
+            except TruncatedFrameError as e:
+                print(f"Warning: raw screencap truncated, fallback to PNG for this capture: {e}")
+            except ValueError as e:
+                print(f"Warning: raw screencap unsupported, fallback to PNG: {e}")
+        data = await self.exec_out("screencap -p")
+        with open(screenshot_path, "wb") as f:
+            f.write(data)
+        result["screenshot"] = screenshot_path
+
+    async def _ui_xml_stage(self, xml_path: str, result: Dict, stream_xml: bool) -> None:
+        if stream_xml:
+            data = extract_streamed_xml(await self.exec_out("uiautomator dump /dev/tty"))
+            if data is not None:
+                result["xml_data"] = data
+                return
+        returncode, stdout, stderr = await self.shell("uiautomator dump /sdcard/window_dump.xml")
+        if returncode != 0:
+            raise RuntimeError(f"执行 uiautomator dump 失败: {stderr.strip() or stdout.strip()}")
+        if not await self.pull_file("/sdcard/window_dump.xml", xml_path):
+            raise RuntimeError("拉取 window_dump.xml 失败")
+        result["xml"] = xml_path
+
+    async def capture_snapshot(
+        self,
+        output_dir: Optional[str] = None,
+        stream_xml: bool = False,
+        raw_screenshot: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Dict:
+        """与 AdbClient.capture_snapshot 返回相同结构的字典"""
+        if output_dir is None:
+            output_dir = tempfile.mkdtemp(prefix="py_uiautomator_")
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+        screenshot_path = os.path.join(output_dir, "screenshot.png")
+        xml_path = os.path.join(output_dir, "window_dump.xml")
+        result: Dict = {}
+        await self._with_timeout(
+            self._run_stages({
+                "screenshot": lambda: self._screenshot_stage(screenshot_path, result, raw_screenshot),
+                "ui_xml": lambda: self._ui_xml_stage(xml_path, result, stream_xml),
+            }),
+            timeout,
+        )
+        return result
+
+    async def capture_snapshot_via_autojs(
+        self,
+        output_dir: Optional[str] = None,
+        json_remote_path: str = "/sdcard/autojs_ui_tree.json",
+        remote_script_path: str = "/storage/emulated/0/脚本/get_ui_tree.js",
+        raw_screenshot: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Dict:
+        """与 AdbClient.capture_snapshot_via_autojs 返回相同结构的字典"""
+        if output_dir is None:
+            output_dir = tempfile.mkdtemp(prefix="py_uiautomator_")
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+        screenshot_path = os.path.join(output_dir, "screenshot.png")
+        json_local_path = os.path.join(output_dir, "autojs_ui_tree.json")
+        result: Dict = {"autojs_json": json_local_path}
+        await self._with_timeout(
+            self._run_stages({
+                "screenshot": lambda: self._screenshot_stage(screenshot_path, result, raw_screenshot),
+                "autojs_json": lambda: self._autojs_json_stage(json_local_path, json_remote_path, remote_script_path),
+            }),
+            timeout,
+        )
+        return result
+
+    async def _autojs_json_stage(self, json_local_path: str, json_remote_path: str, remote_script_path: str) -> None:
+        # 脚本 require 的 ui_tree_dump.js 模块与脚本一起按 md5 检查后推送
+        for local_path, remote_path in autojs_script_targets("get_ui_tree.js", remote_script_path):
+            _, remote_md5, _ = await self.shell(f"md5sum {shlex.quote(remote_path)}")
+            if remote_md5.split()[:1] != [file_md5(local_path)]:
+                if not await self.push_file(local_path, remote_path):
+                    raise RuntimeError(f"推送 AutoJs 脚本到设备失败: {remote_path}")
+        if os.path.exists(json_local_path):
+            os.remove(json_local_path)
+
+        # 启动脚本前记下设备时间，早于它的事件都是之前运行留下的
+        returncode, now, _ = await self.shell(DEVICE_TIME_COMMAND)
+        not_before = (parse_device_time_ms(now) if returncode == 0 else None) or 0
+        # 先订阅 logcat 完成事件，再启动脚本
+        async with self._service("exec:" + logcat_follow_command(DEVICE_EVENT_TAG), limited=False) as (reader, _):
+            await self.shell(
+                "am start -n org.autojs.autojs6/org.autojs.autojs.external.open.RunIntentActivity "
+                f"-d file://{remote_script_path} -t text/javascript"
+            )
+            try:
+                message = await asyncio.wait_for(self._wait_autojs_event(reader, not_before), 15)
+            except asyncio.TimeoutError:
+                raise DeviceEventTimeout(
+                    "等待 AutoJs 生成 UI 树 JSON 超时，请检查 AutoJs 是否已开启无障碍"
+                ) from None
+        if message.startswith(AUTOJS_EVENT_ERROR):
+            raise RuntimeError(f"AutoJs 脚本执行失败: {message}")
+        if not await self.pull_file(json_remote_path, json_local_path):
+            raise RuntimeError("拉取 AutoJs UI 树 JSON 失败")
+
+    async def _wait_autojs_event(self, reader: asyncio.StreamReader, not_before: int = 0) -> str:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise RuntimeError("设备事件流已断开 (logcat 退出或设备断开)")
+            parts = line.decode("utf-8", errors="replace").strip().split(" ", 2)
+            if len(parts) < 2 or parts[0] not in (AUTOJS_EVENT_DONE, AUTOJS_EVENT_ERROR) or not parts[1].isdigit():
+                continue
+            stamp = int(parts[1])
+            if stamp >= not_before and stamp > self._last_autojs_event:
+                self._last_autojs_event = stamp
+                return " ".join(parts)
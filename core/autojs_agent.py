@@ -0,0 +1,178 @@
+import json
+import socket
+import threading
+from typing import Dict, Optional
+
+from .adb_protocol import AdbConnection, AdbProtocolError, abort_on_cancel
+from .capture_pipeline import CancelToken, CaptureCancelled
+from .device_events import DeviceEventTimeout
+from .partial_dump import DumpScope
+
+# 与 static/ui_tree_agent.js 保持一致
+AGENT_PORT = 47329
+AGENT_EVENT_READY = "agent_ready"
+AGENT_SCRIPT_NAME = "ui_tree_agent.js"
+
+_MAX_HEADER = 64
+
+
+class AutoJsAgentError(RuntimeError):
+    """代理无法启动或连接；调用方可退回单次运行 get_ui_tree.js 的方式"""
+
+
+class AutoJsAgent:
+    """
+    设备上常驻的 ui_tree_agent.js 的客户端。经 adb server 的 tcp: 服务
+    (即 adb forward 使用的通道) 连到代理的本机端口，保持一条长连接发送请求，
+    控件树直接从 socket 读回，无需 am start、等待脚本、写文件和 pull。
+    连接失败时先 ping 检查代理是否存活，不在则重新推送并启动脚本后重试一次。
+    """
+
+    def __init__(
+        self,
+        adb_client,
+        port: int = AGENT_PORT,
+        remote_script_path: str = "/storage/emulated/0/脚本/" + AGENT_SCRIPT_NAME,
+        start_timeout: float = 20,
+        request_timeout: float = 30,
+    ) -> None:
+        self.adb_client = adb_client
+        self.port = port
+        self.remote_script_path = remote_script_path
+        self.start_timeout = start_timeout
+        self.request_timeout = request_timeout
+        self._conn: Optional[AdbConnection] = None
+        # 没有 adb server 直连时通过 `adb forward tcp:0` 分配的本地端口
+        self._forward_port: Optional[int] = None
+        self._lock = threading.RLock()
+
+    # ---- 连接 ----
+
+    def _connect(self, timeout: float) -> AdbConnection:
+        server = self.adb_client.server
+        if server is not None:
+            try:
+                return server.open_service(f"tcp:{self.port}", timeout=timeout)
+            except (ConnectionRefusedError, socket.gaierror):
+                pass
+        if self._forward_port is None:
+            result = self.adb_client._run(["forward", "tcp:0", f"tcp:{self.port}"])
+            if result.returncode != 0:
+                message = result.stderr.strip() or result.stdout.strip()
+                raise AutoJsAgentError(f"adb forward 失败: {message}")
+            self._forward_port = int(result.stdout.strip())
+        return AdbConnection("127.0.0.1", self._forward_port, timeout=timeout)
+
+    def _drop(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _read_header(self) -> str:
+        header = b""
+        while not header.endswith(b"\n"):
+            if len(header) > _MAX_HEADER:
+                raise AdbProtocolError(f"AutoJs 代理回复格式错误: {header!r}")
+            header += self._conn.read_exact(1)
+        return header.decode("ascii").strip()
+
+    def _request(self, payload: Dict, timeout: float, cancel_token: Optional[CancelToken] = None) -> bytes:
+        """发送一行请求并读取回复；代理侧报错时抛出 RuntimeError，连接问题抛出 OSError / AdbProtocolError"""
+        if self._conn is None:
+            self._conn = self._connect(timeout)
+        conn = self._conn
+        conn.settimeout(timeout)
+        with abort_on_cancel(conn, cancel_token):
+            conn.sendall(json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n")
+            status, _, length = self._read_header().partition(" ")
+            data = conn.read_exact(int(length)) if int(length) else b""
+        if status == "ERR":
+            raise RuntimeError(f"AutoJs 代理执行失败: {data.decode('utf-8', errors='replace')}")
+        if status != "OK":
+            raise AdbProtocolError(f"AutoJs 代理回复格式错误: {status!r}")
+        return data
+
+    # ---- 健康检查与启动 ----
+
+    def ping(self, timeout: float = 2) -> bool:
+        with self._lock:
+            try:
+                return self._request({"cmd": "ping"}, timeout) == b"pong"
+            except (OSError, AdbProtocolError, ValueError, RuntimeError):
+                self._drop()
+                return False
+
+    def start(self, cancel_token: Optional[CancelToken] = None) -> None:
+        """
+        推送并启动代理脚本，等待其在 logcat 中报告就绪且能 ping 通。
+        推送、启动或事件流出错时统一抛出 AutoJsAgentError，调用方据此退回 get_ui_tree.js
+        """
+        with self._lock:
+            self._drop()
+            try:
+                self._launch(cancel_token)
+            except (AutoJsAgentError, CaptureCancelled):
+                raise
+            except DeviceEventTimeout:
+                raise AutoJsAgentError(
+                    "等待 AutoJs 代理启动超时。\n"
+                    f"请确认 AutoJs 已开启无障碍，且脚本 {self.remote_script_path} 能在手机上正常运行。"
+                ) from None
+            except (OSError, AdbProtocolError, RuntimeError) as e:
+                raise AutoJsAgentError(f"启动 AutoJs 代理失败: {e}") from e
+
+    def _launch(self, cancel_token: Optional[CancelToken]) -> None:
+        self.adb_client.push_autojs_script(AGENT_SCRIPT_NAME, self.remote_script_path, cancel_token)
+        with self.adb_client.listen_device_events() as events:
+            self.adb_client.run_autojs_script(self.remote_script_path, cancel_token=cancel_token)
+            # logcat 中可能残留旧的就绪消息，以能否 ping 通为准
+            events.wait_for(
+                lambda message: message.startswith(AGENT_EVENT_READY) and self.ping(),
+                timeout=self.start_timeout,
+                cancel_token=cancel_token,
+            )
+
+    def ensure_running(self, cancel_token: Optional[CancelToken] = None) -> None:
+        with self._lock:
+            if not self.ping():
+                self.start(cancel_token)
+
+    # ---- 请求 ----
+
+    def dump(self, scope: Optional[DumpScope] = None, cancel_token: Optional[CancelToken] = None) -> bytes:
+        """返回紧凑格式的控件树 JSON 字节；代理不在时自动启动，连接断开时重连重试一次"""
+        payload: Dict = {"cmd": "dump"}
+        if scope is not None and not scope.is_full:
+            payload["scope"] = scope.to_request()
+        with self._lock:
+            try:
+                return self._request(payload, self.request_timeout, cancel_token)
+            except (OSError, AdbProtocolError, ValueError):
+                self._drop()
+                if cancel_token is not None:
+                    cancel_token.check()
+            self.ensure_running(cancel_token)
+            try:
+                return self._request(payload, self.request_timeout, cancel_token)
+            except (OSError, AdbProtocolError, ValueError):
+                self._drop()
+                if cancel_token is not None:
+                    cancel_token.check()
+                raise AutoJsAgentError("AutoJs 代理无响应") from None
+
+    def stop(self) -> None:
+        """让设备上的代理退出"""
+        with self._lock:
+            try:
+                self._request({"cmd": "quit"}, 2)
+            except (OSError, AdbProtocolError, ValueError, RuntimeError):
+                pass
+            self._drop()
+
+    def close(self) -> None:
+        """只关闭主机侧连接，设备上的代理继续运行，供下次使用"""
+        with self._lock:
+            self._drop()
+            if self._forward_port is not None:
+                self.adb_client._run(["forward", "--remove", f"tcp:{self._forward_port}"])
+                self._forward_port = None
@@ -1,16 +1,53 @@
 import json
-from typing import Optional, Tuple
-from dataclasses import dataclass
+import os
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
 
-from .uixml_parser import UiNode
+from .json_stream import END_ARRAY, END_MAP, MAP_KEY, START_ARRAY, START_MAP, JsonStreamTokenizer
+from .uixml_parser import FLAG_FIELDS, UiNode, is_true, parse_bounds
+
+# (已解析节点数, 已读取字节数, 文件总字节数)
+ProgressCallback = Callable[[int, int, int], None]
+
+_PROGRESS_EVERY = 2000
+
+# get_ui_tree.js 的紧凑格式：先序扁平整数数组 + 字符串表 + 标志位掩码 + 数字 bounds
+COMPACT_FORMAT = "uitree-compact"
+COMPACT_VERSION = 1
+COMPACT_FIELDS = (
+    "parent", "index", "text", "resource_id", "class_name", "package", "content_desc",
+    "flags", "left", "top", "right", "bottom",
+)
+# JSON.stringify 保持键的插入顺序，format 总是出现在文件开头
+_COMPACT_MARKER = b'"format":"uitree-compact"'
 
 
 class AutoJsTreeParser:
-    def parse_json(self, json_path: str) -> Optional[UiNode]:
+    """
+    解析 get_ui_tree.js 生成的 JSON。紧凑格式 (COMPACT_FORMAT) 直接按扁平数组解码；
+    旧的嵌套格式一般大小时整体 json.load (C 实现，最快) 后用显式栈转换，超过
+    stream_threshold 的文件，或嵌套过深导致 json.load 递归超限时，改用流式分词
+    边读边建节点，内存只与树本身相关。
+    """
+
+    def __init__(self, stream_threshold: int = 64 * 1024 * 1024) -> None:
+        self.stream_threshold = stream_threshold
+
+    def parse_json(self, json_path: str, progress: Optional[ProgressCallback] = None) -> Optional[UiNode]:
         try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return self._parse_node(data, None)
+            total = os.path.getsize(json_path)
+            with open(json_path, "rb") as f:
+                compact = _COMPACT_MARKER in f.read(64)
+            if compact or total <= self.stream_threshold:
+                try:
+                    with open(json_path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except RecursionError:
+                    print("JSON nesting too deep for json.load, falling back to streaming parser")
+                else:
+                    return self.parse_data(data, progress, total)
+            with open(json_path, "rb") as f:
+                return self.parse_stream(f, progress, total)
         except Exception as e:
             print(f"JSON parse error: {e}")
             import traceback
@@ -18,46 +55,143 @@ class AutoJsTreeParser:
             return None
 
     def _parse_bounds(self, bounds_str: str) -> Tuple[int, int, int, int]:
-        import re
-        try:
-            matches = re.findall(r"\[(\d+),(\d+)\]", bounds_str)
-            if len(matches) == 2:
-                x1, y1 = map(int, matches[0])
-                x2, y2 = map(int, matches[1])
-                return (x1, y1, x2 - x1, y2 - y1)
-        except Exception:
-            pass
-        return (0, 0, 0, 0)
-
-    def _parse_node(self, data: dict, parent: Optional[UiNode]) -> UiNode:
-        bounds_str = data.get("bounds") or data.get("bounds_str") or "[0,0][0,0]"
-        rect = self._parse_bounds(bounds_str)
-
-        node = UiNode(
-            index=int(data.get("index", 0)),
-            text=data.get("text", ""),
-            resource_id=data.get("resource_id") or data.get("resource-id", ""),
-            class_name=data.get("class_name") or data.get("class", ""),
-            package=data.get("package", ""),
-            content_desc=data.get("content_desc") or data.get("content-desc", ""),
-            checkable=str(data.get("checkable", "false")),
-            checked=str(data.get("checked", "false")),
-            clickable=str(data.get("clickable", "false")),
-            enabled=str(data.get("enabled", "false")),
-            focusable=str(data.get("focusable", "false")),
-            focused=str(data.get("focused", "false")),
-            scrollable=str(data.get("scrollable", "false")),
-            long_clickable=str(data.get("long_clickable") or data.get("long-clickable", "false")),
-            password=str(data.get("password", "false")),
-            selected=str(data.get("selected", "false")),
-            bounds_str=bounds_str,
-            rect=rect,
-            parent=parent,
-        )
-
-        children_data = data.get("children") or []
-        for child_data in children_data:
-            child_node = self._parse_node(child_data, node)
-            node.children.append(child_node)
-
-        return node
+        return parse_bounds(bounds_str)
+
+    def _fill_node(self, node: UiNode, data: Dict) -> None:
+        node.index = int(data.get("index") or 0)
+        node.text = data.get("text") or ""
+        node.resource_id = sys.intern(data.get("resource_id") or data.get("resource-id") or "")
+        node.class_name = sys.intern(data.get("class_name") or data.get("class") or "")
+        node.package = sys.intern(data.get("package") or "")
+        node.content_desc = data.get("content_desc") or data.get("content-desc") or ""
+        flags = 0
+        for name, attr_name, bit in FLAG_FIELDS:
+            if is_true(data.get(name) or data.get(attr_name)):
+                flags |= bit
+        node.flags = flags
+        node.rect = self._parse_bounds(data.get("bounds") or data.get("bounds_str") or "")
+
+    def parse_data(
+        self,
+        data: Optional[Dict],
+        progress: Optional[ProgressCallback] = None,
+        total_bytes: int = 0,
+    ) -> Optional[UiNode]:
+        """把已加载的 JSON 对象转换为 UiNode 树，显式栈遍历，不受递归深度限制"""
+        if not isinstance(data, dict):
+            return None
+        if data.get("format") == COMPACT_FORMAT:
+            return self.parse_compact(data, progress, total_bytes)
+        root = UiNode()
+        stack = [(data, root)]
+        count = 0
+        while stack:
+            item, node = stack.pop()
+            self._fill_node(node, item)
+            for child_data in item.get("children") or []:
+                # nodeToJson 对取不到的子节点返回 null
+                if isinstance(child_data, dict):
+                    child = UiNode(parent=node)
+                    node.children.append(child)
+                    stack.append((child_data, child))
+            count += 1
+            if progress is not None and count % _PROGRESS_EVERY == 0:
+                progress(count, total_bytes, total_bytes)
+        if progress is not None:
+            progress(count, total_bytes, total_bytes)
+        return root
+
+    def parse_compact(
+        self,
+        data: Dict,
+        progress: Optional[ProgressCallback] = None,
+        total_bytes: int = 0,
+    ) -> Optional[UiNode]:
+        """解码紧凑格式：节点已按先序排列，父节点下标总小于子节点，一遍即可连好整棵树"""
+        version = data.get("version", 0)
+        if version > COMPACT_VERSION:
+            raise ValueError(f"不支持的紧凑格式版本: {version}")
+        fields = tuple(data.get("fields") or ())
+        if fields != COMPACT_FIELDS:
+            raise ValueError(f"紧凑格式字段不匹配: {fields}")
+        strings = data["strings"]
+        values = data["nodes"]
+        width = len(COMPACT_FIELDS)
+        if len(values) % width:
+            raise ValueError("紧凑格式节点数组长度不是字段数的整数倍")
+        nodes: List[UiNode] = []
+        # 按列切片后 zip，每个节点得到一个元组，避免逐个下标取值
+        rows = zip(*(values[column::width] for column in range(width)))
+        for parent_index, index, text, res_id, class_id, package, desc, flags, left, top, right, bottom in rows:
+            parent = nodes[parent_index] if parent_index >= 0 else None
+            node = UiNode(
+                index=index,
+                text=strings[text],
+                resource_id=strings[res_id],
+                class_name=strings[class_id],
+                package=strings[package],
+                content_desc=strings[desc],
+                flags=flags,
+                rect=(left, top, right - left, bottom - top),
+                parent=parent,
+            )
+            if parent is not None:
+                parent.children.append(node)
+            nodes.append(node)
+            if progress is not None and len(nodes) % _PROGRESS_EVERY == 0:
+                progress(len(nodes), total_bytes, total_bytes)
+        if progress is not None:
+            progress(len(nodes), total_bytes, total_bytes)
+        return nodes[0] if nodes else None
+
+    def parse_stream(self, stream, progress: Optional[ProgressCallback] = None, total_bytes: int = 0) -> Optional[UiNode]:
+        """流式解析：节点在对象开始时创建并挂到父节点上，字段在对象结束时填入"""
+        tokens = JsonStreamTokenizer(stream)
+        root: Optional[UiNode] = None
+        # 与 JSON 容器一一对应："node" 为节点对象，"children" 为子节点数组
+        contexts: List[str] = []
+        frames: List[Tuple[UiNode, Dict]] = []
+        key = None
+        skip_depth = 0
+        count = 0
+        for event, value in tokens:
+            if skip_depth:
+                # 跳过节点中与界面树无关的嵌套值
+                if event in (START_MAP, START_ARRAY):
+                    skip_depth += 1
+                elif event in (END_MAP, END_ARRAY):
+                    skip_depth -= 1
+                continue
+            if event == MAP_KEY:
+                key = value
+            elif event == START_MAP:
+                if contexts and contexts[-1] != "children":
+                    skip_depth = 1
+                    continue
+                parent = frames[-1][0] if frames else None
+                node = UiNode(parent=parent)
+                if parent is not None:
+                    parent.children.append(node)
+                else:
+                    root = node
+                frames.append((node, {}))
+                contexts.append("node")
+            elif event == END_MAP:
+                contexts.pop()
+                node, fields = frames.pop()
+                self._fill_node(node, fields)
+                count += 1
+                if progress is not None and count % _PROGRESS_EVERY == 0:
+                    progress(count, tokens.bytes_read, total_bytes)
+            elif event == START_ARRAY:
+                if contexts and contexts[-1] == "node" and key == "children":
+                    contexts.append("children")
+                else:
+                    skip_depth = 1
+            elif event == END_ARRAY:
+                contexts.pop()
+            elif contexts and contexts[-1] == "node":
+                frames[-1][1][key] = value
+        if progress is not None:
+            progress(count, tokens.bytes_read, total_bytes)
+        return root
@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+class CaptureCancelled(RuntimeError):
+    """采集被取消 (另一阶段失败或调用方主动取消)"""
+
+
+class CancelToken:
+    """
+    在多个采集阶段之间共享的取消标记。
+    阶段可以注册关闭回调 (socket、子进程)，取消时会立即调用以打断阻塞中的 I/O。
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._closers: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            try:
+                closer()
+            except Exception:
+                pass
+
+    def register(self, closer: Callable[[], None]) -> Callable[[], None]:
+        """注册取消回调，返回用于注销的函数；已取消时回调会被立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._closers.append(closer)
+
+                def unregister() -> None:
+                    with self._lock:
+                        if closer in self._closers:
+                            self._closers.remove(closer)
+
+                return unregister
+        closer()
+        return lambda: None
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise CaptureCancelled("采集已取消")
+
+    def wait(self, timeout: float) -> bool:
+        """可被取消打断的 sleep，返回 True 表示已取消"""
+        return self._event.wait(timeout)
+
+
+class CapturePipeline:
+    """并行执行截图与界面树采集等阶段，记录每个阶段的耗时"""
+
+    def __init__(self) -> None:
+        self.last_timings: Dict[str, float] = {}
+
+    def run(
+        self,
+        stages: Dict[str, Callable[[CancelToken], None]],
+        cancel_token: Optional[CancelToken] = None,
+    ) -> Dict[str, float]:
+        token = cancel_token or CancelToken()
+        timings: Dict[str, float] = {}
+        errors: List[BaseException] = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+
+        def run_stage(name: str, stage: Callable[[CancelToken], None]) -> None:
+            stage_start = time.perf_counter()
+            try:
+                token.check()
+                stage(token)
+                token.check()
+            except BaseException as e:
+                with lock:
+                    # 只记录第一个真正失败的阶段，其余阶段的异常是被连带取消造成的
+                    if not token.cancelled:
+                        errors.append(e)
+                token.cancel()
+            finally:
+                timings[name] = time.perf_counter() - stage_start
+
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="capture") as executor:
+            for name, stage in stages.items():
+                executor.submit(run_stage, name, stage)
+
+        timings["total"] = time.perf_counter() - start
+        self.last_timings = timings
+        if errors:
+            raise errors[0]
+        token.check()
+        return timings
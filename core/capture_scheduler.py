@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .adb_client import AdbClient
+from .capture_pipeline import CancelToken
+
+SOURCE_UIAUTOMATOR = "uiautomator"
+SOURCE_AUTOJS = "AutoJs"
+
+
+@dataclass
+class CaptureResult:
+    """某台设备一次采集的结果；失败时 snapshot 为 None，error 为异常"""
+    serial: str
+    round_index: int
+    snapshot: Optional[Dict] = None
+    error: Optional[BaseException] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class CaptureScheduler:
+    """
+    多设备并行采集：每台设备一个工作线程，按轮次依次采集；
+    全局并发上限防止 USB hub 带宽被占满，结果按完成顺序从 results() 流出。
+    """
+
+    def __init__(
+        self,
+        serials: List[str],
+        source: str = SOURCE_UIAUTOMATOR,
+        max_concurrency: int = 4,
+        client_factory: Optional[Callable[[str], AdbClient]] = None,
+        **capture_kwargs,
+    ) -> None:
+        self.serials = list(serials)
+        self.source = source
+        self.max_concurrency = max_concurrency
+        self.client_factory = client_factory or (lambda serial: AdbClient(serial=serial))
+        self.capture_kwargs = capture_kwargs
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._active_tokens: List[CancelToken] = []
+
+    @classmethod
+    def for_connected_devices(cls, **kwargs) -> "CaptureScheduler":
+        serials = [serial for serial, state in AdbClient().list_devices() if state == "device"]
+        return cls(serials, **kwargs)
+
+    def _capture(self, client: AdbClient, token: CancelToken) -> Dict:
+        kwargs = dict(self.capture_kwargs)
+        if kwargs.get("output_dir"):
+            # 每台设备单独子目录，避免并行采集互相覆盖 screen.png / ui.xml
+            kwargs["output_dir"] = os.path.join(kwargs["output_dir"], client.serial.replace(":", "_"))
+        if self.source == SOURCE_AUTOJS:
+            return client.capture_snapshot_via_autojs(cancel_token=token, **kwargs)
+        return client.capture_snapshot(cancel_token=token, **kwargs)
+
+    def _worker(self, serial: str, rounds: int, interval: float, results: "queue.Queue") -> None:
+        started_at = time.time()
+        try:
+            client = self.client_factory(serial)
+        except Exception as e:
+            # 设备已断开或序列号无效：仍给出一条失败结果，消费方不会漏掉这台设备
+            results.put(CaptureResult(serial, 0, error=e, started_at=started_at, finished_at=time.time()))
+            return
+        try:
+            for round_index in range(rounds):
+                if round_index and self._stop.wait(interval):
+                    break
+                with self._slots:
+                    if self._stop.is_set():
+                        break
+                    token = CancelToken()
+                    with self._lock:
+                        self._active_tokens.append(token)
+                    result = CaptureResult(serial, round_index, started_at=time.time())
+                    try:
+                        result.snapshot = self._capture(client, token)
+                    except Exception as e:
+                        result.error = e
+                    finally:
+                        with self._lock:
+                            self._active_tokens.remove(token)
+                    result.finished_at = time.time()
+                    result.timings = client.last_capture_timings
+                results.put(result)
+        finally:
+            client.close()
+
+    def results(self, rounds: int = 1, interval: float = 0.0) -> Iterator[CaptureResult]:
+        """启动所有设备的采集并按完成顺序产出结果；提前结束迭代会停止调度"""
+        self._stop.clear()
+        results: "queue.Queue[CaptureResult]" = queue.Queue()
+        workers = [
+            threading.Thread(
+                target=self._worker,
+                args=(serial, rounds, interval, results),
+                name=f"capture-{serial}",
+                daemon=True,
+            )
+            for serial in self.serials
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers) or not results.empty():
+                try:
+                    yield results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+        finally:
+            self.stop()
+            for worker in workers:
+                worker.join()
+
+    def run(self, rounds: int = 1, interval: float = 0.0) -> List[CaptureResult]:
+        return list(self.results(rounds, interval))
+
+    def stop(self) -> None:
+        """停止调度并取消正在进行的采集"""
+        self._stop.set()
+        with self._lock:
+            tokens = list(self._active_tokens)
+        for token in tokens:
+            token.cancel()
@@ -0,0 +1,90 @@
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+from .screencap import RawFrame
+
+# 降采样：每隔若干行取一整行参与哈希，界面变化几乎总会波及多行
+_FRAME_ROW_STEP = 8
+
+
+def frame_digest(frame: RawFrame, row_step: int = _FRAME_ROW_STEP) -> str:
+    """对原始帧降采样后计算摘要，直接在 buffer 上切片，不复制整帧"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{frame.width}x{frame.height}:{frame.pixel_format}".encode())
+    view = memoryview(frame.buffer)
+    stride = frame.stride
+    for row in range(0, frame.height, row_step):
+        start = frame.offset + row * stride
+        digest.update(view[start:start + stride])
+    return digest.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path: str) -> Optional[str]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return bytes_digest(f.read())
+
+
+def snapshot_digests(snapshot: Dict) -> Tuple[Optional[str], Optional[str]]:
+    """返回 (截图摘要, 界面树摘要)，对应数据缺失时为 None"""
+    frame = snapshot.get("screenshot_frame")
+    if frame is not None:
+        screen = frame_digest(frame)
+    else:
+        screen = file_digest(snapshot.get("screenshot"))
+
+    xml_data = snapshot.get("xml_data")
+    if xml_data is not None:
+        tree = bytes_digest(xml_data)
+    else:
+        tree = file_digest(snapshot.get("xml") or snapshot.get("autojs_json"))
+    return screen, tree
+
+
+class ChangeDetector:
+    """
+    记录上一次快照的摘要，判断本次截图 / 界面树是否有变化，
+    实时模式据此跳过重复的解析、建树和绘制。
+    """
+
+    def __init__(self) -> None:
+        self._screen: Optional[str] = None
+        self._tree: Optional[str] = None
+
+    def reset(self) -> None:
+        self._screen = None
+        self._tree = None
+
+    @staticmethod
+    def ensure_digests(snapshot: Dict) -> Tuple[Optional[str], Optional[str]]:
+        """
+        计算摘要并写回 snapshot 的 "screen_digest" / "tree_digest"，供解析缓存复用；
+        已计算过时直接返回。摘要计算较慢，可在后台线程先调用
+        """
+        if "screen_digest" not in snapshot or "tree_digest" not in snapshot:
+            snapshot["screen_digest"], snapshot["tree_digest"] = snapshot_digests(snapshot)
+        return snapshot["screen_digest"], snapshot["tree_digest"]
+
+    def compare(self, snapshot: Dict) -> Tuple[bool, bool]:
+        """返回 (截图是否变化, 界面树是否变化)，不改变记录；摘要缺失视为有变化"""
+        screen, tree = self.ensure_digests(snapshot)
+        return screen is None or screen != self._screen, tree is None or tree != self._tree
+
+    def commit(self, snapshot: Dict) -> None:
+        """
+        把快照记为下一次比较的基准。只应对真正显示出来的快照调用，
+        否则之后相同的画面会被误判为无变化而不显示
+        """
+        self._screen, self._tree = self.ensure_digests(snapshot)
+
+    def update(self, snapshot: Dict) -> Tuple[bool, bool]:
+        """compare 之后立即 commit"""
+        changes = self.compare(snapshot)
+        self.commit(snapshot)
+        return changes
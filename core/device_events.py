@@ -0,0 +1,127 @@
+import queue
+import re
+import subprocess
+import threading
+import time
+from typing import Callable, Optional
+
+from .capture_pipeline import CaptureCancelled
+
+# 设备端脚本通过 android.util.Log 以该 tag 发送事件
+DEVICE_EVENT_TAG = "PyUiViewer"
+
+_CLOSED = object()
+
+
+class DeviceEventTimeout(RuntimeError):
+    """在超时时间内没有收到期望的设备事件"""
+
+
+# 读取设备当前时间：%s%N 为纳秒；toybox 过旧不支持 %N 时只剩秒数 (后面跟着原样的 N / %N)
+DEVICE_TIME_COMMAND = "date +%s%N"
+
+
+def logcat_follow_command(tag: str) -> str:
+    # -T 只输出此刻之后的日志，避免把缓冲区里上一次的事件当成本次结果
+    return f"logcat -v raw -s {tag}:I -T \"$(date +'%m-%d %H:%M:%S').000\""
+
+
+def parse_device_time_ms(output: str) -> Optional[int]:
+    """
+    解析 DEVICE_TIME_COMMAND 的输出为毫秒时间戳，与脚本中 Date.now() 同一时钟。
+    logcat -T 只精确到秒，同一秒内上一次运行残留的事件要靠它过滤；
+    date 不支持 %N 时精度退化为秒，无法解析时返回 None
+    """
+    match = re.match(r"\s*(\d+)", output)
+    if match is None:
+        return None
+    digits = match.group(1)
+    if len(digits) > 10:
+        return int(digits) // 1_000_000
+    return int(digits) * 1000
+
+
+class DeviceEventListener:
+    """
+    订阅设备 logcat 中某个 tag 的消息，供主机阻塞等待设备端完成通知。
+    必须在触发设备端动作之前创建，以免错过事件。
+    """
+
+    def __init__(self, stream_reader: Callable[[], bytes], closer: Callable[[], None]) -> None:
+        self._read = stream_reader
+        self._closer = closer
+        self._lines: "queue.Queue[object]" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._pump, name="device-events", daemon=True)
+        self._thread.start()
+
+    def _pump(self) -> None:
+        pending = b""
+        try:
+            while True:
+                chunk = self._read()
+                if not chunk:
+                    break
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    text = line.decode("utf-8", errors="replace").strip()
+                    if text:
+                        self._lines.put(text)
+        except OSError:
+            pass
+        finally:
+            self._lines.put(_CLOSED)
+
+    def wait_for(
+        self,
+        predicate: Callable[[str], bool],
+        timeout: float,
+        cancel_token=None,
+    ) -> str:
+        """阻塞直到收到满足 predicate 的消息，返回该消息"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if cancel_token is not None:
+                cancel_token.check()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeviceEventTimeout("等待设备事件超时")
+            try:
+                # 分段等待，便于及时响应取消
+                item = self._lines.get(timeout=min(remaining, 0.2))
+            except queue.Empty:
+                continue
+            if item is _CLOSED:
+                if cancel_token is not None and cancel_token.cancelled:
+                    raise CaptureCancelled("采集已取消")
+                raise RuntimeError("设备事件流已断开 (logcat 退出或设备断开)")
+            if predicate(item):
+                return item
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._closer()
+        self._thread.join(timeout=2)
+
+    def __enter__(self) -> "DeviceEventListener":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_subprocess_listener(cmd) -> DeviceEventListener:
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        raise RuntimeError("未找到 adb，可检查是否已安装并加入 PATH") from None
+
+    def close() -> None:
+        proc.kill()
+        proc.wait()
+        proc.stdout.close()
+
+    return DeviceEventListener(lambda: proc.stdout.read1(64 * 1024), close)
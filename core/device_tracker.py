@@ -0,0 +1,186 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .adb_protocol import ADB_SERVER_HOST, ADB_SERVER_PORT, AdbConnection, AdbProtocolError
+
+DEVICE_STATE_ONLINE = "device"
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    serial: str
+    state: str
+    model: str = ""
+    product: str = ""
+    transport_id: str = ""
+
+    @property
+    def online(self) -> bool:
+        return self.state == DEVICE_STATE_ONLINE
+
+
+def parse_device_list(text: str) -> Dict[str, DeviceInfo]:
+    """解析 `adb devices -l` / track-devices-l 的输出"""
+    devices: Dict[str, DeviceInfo] = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) < 2 or line.startswith("List of devices"):
+            continue
+        serial, state = parts[0], parts[1]
+        extras = dict(item.split(":", 1) for item in parts[2:] if ":" in item)
+        devices[serial] = DeviceInfo(
+            serial,
+            state,
+            model=extras.get("model", ""),
+            product=extras.get("product", ""),
+            transport_id=extras.get("transport_id", ""),
+        )
+    return devices
+
+
+DeviceCallback = Callable[[DeviceInfo], None]
+
+
+class DeviceTracker:
+    """
+    订阅 adb server 的 host:track-devices-l，在后台线程维护设备表
+    (serial / state / model)，设备上线、下线时回调。server 推送的是全量列表，
+    与上一次比较得到变化。连接断开后按退避间隔自动重连。
+
+    回调在跟踪线程中执行，GUI 需要自行转到主线程 (如通过 pyqtSignal)。
+    """
+
+    _shared: Dict[Tuple[str, int], "DeviceTracker"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT, retry_interval: float = 1.0) -> None:
+        self.host = host
+        self.port = port
+        self.retry_interval = retry_interval
+        self._devices: Dict[str, DeviceInfo] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # 第一次连接尝试 (无论成败) 结束后置位，避免 server 不可达时每次都等满超时
+        self._attempted = threading.Event()
+        self._stop = threading.Event()
+        self._conn: Optional[AdbConnection] = None
+        self._connected_callbacks: List[DeviceCallback] = []
+        self._disconnected_callbacks: List[DeviceCallback] = []
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def shared(cls, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT) -> "DeviceTracker":
+        """同一 adb server 只建立一条跟踪连接，多个 AdbClient 共用"""
+        with cls._shared_lock:
+            tracker = cls._shared.get((host, port))
+            if tracker is None:
+                tracker = cls(host, port)
+                cls._shared[(host, port)] = tracker
+            tracker.start()
+            return tracker
+
+    def on_connected(self, callback: DeviceCallback) -> None:
+        self._connected_callbacks.append(callback)
+
+    def on_disconnected(self, callback: DeviceCallback) -> None:
+        self._disconnected_callbacks.append(callback)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="adb-track-devices", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            conn.abort()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待收到第一份设备列表；server 不可达或连接失败时返回 False"""
+        self._attempted.wait(timeout)
+        return self._ready.is_set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def devices(self) -> Dict[str, DeviceInfo]:
+        with self._lock:
+            return dict(self._devices)
+
+    def online_serials(self) -> List[str]:
+        with self._lock:
+            return [serial for serial, info in self._devices.items() if info.online]
+
+    def get(self, serial: str) -> Optional[DeviceInfo]:
+        with self._lock:
+            return self._devices.get(serial)
+
+    def _open(self) -> AdbConnection:
+        conn = AdbConnection(self.host, self.port, timeout=5)
+        try:
+            try:
+                conn.send_request("host:track-devices-l")
+            except AdbProtocolError:
+                # 旧版 adb 不支持 -l，退回不带型号的版本
+                conn.close()
+                conn = AdbConnection(self.host, self.port, timeout=5)
+                conn.send_request("host:track-devices")
+        except BaseException:
+            conn.close()
+            raise
+        # 之后是长连接，列表变化时 server 才会推送
+        conn.settimeout(None)
+        return conn
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._conn = self._open()
+                while not self._stop.is_set():
+                    body = self._conn.read_hex_block().decode("utf-8", errors="replace")
+                    self._apply(parse_device_list(body))
+            except (OSError, AdbProtocolError, ValueError):
+                pass
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+            if self._stop.is_set():
+                break
+            # server 退出或不可达：设备状态未知，全部视为下线
+            self._apply({}, ready=False)
+            self._attempted.set()
+            self._stop.wait(self.retry_interval)
+
+    def _apply(self, devices: Dict[str, DeviceInfo], ready: bool = True) -> None:
+        with self._lock:
+            previous = self._devices
+            self._devices = devices
+        if ready:
+            self._ready.set()
+            self._attempted.set()
+        else:
+            self._ready.clear()
+        for serial, info in devices.items():
+            old = previous.get(serial)
+            if info.online and (old is None or not old.online):
+                self._fire(self._connected_callbacks, info)
+        for serial, old in previous.items():
+            info = devices.get(serial)
+            if old.online and (info is None or not info.online):
+                self._fire(self._disconnected_callbacks, info or DeviceInfo(serial, "disconnected", old.model))
+
+    @staticmethod
+    def _fire(callbacks: List[DeviceCallback], info: DeviceInfo) -> None:
+        for callback in list(callbacks):
+            try:
+                callback(info)
+            except Exception as e:
+                print(f"Warning: device callback failed: {e}")
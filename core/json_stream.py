@@ -0,0 +1,204 @@
+import codecs
+import json
+import re
+from json.decoder import scanstring
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+# 事件类型，与 ijson 的命名一致
+START_MAP = "start_map"
+END_MAP = "end_map"
+START_ARRAY = "start_array"
+END_ARRAY = "end_array"
+MAP_KEY = "map_key"
+VALUE = "value"
+
+Event = Tuple[str, object]
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+_LITERALS = {"true": True, "false": False, "null": None}
+# 跳过空白后取一个记号：标点 / 字符串起始引号 / 数字或字面量
+_TOKEN = re.compile(r'[ \t\n\r]*(?:([{}\[\],:])|(")|([^ \t\n\r{}\[\],:"]+))?')
+
+# 分词器在当前位置期望的记号；前两种状态下可以出现一个值
+_EXPECT_VALUE = 0          # 顶层、冒号之后、数组中逗号之后
+_EXPECT_VALUE_OR_END = 1   # "[" 之后
+_EXPECT_KEY = 2            # 对象中逗号之后
+_EXPECT_KEY_OR_END = 3     # "{" 之后
+_EXPECT_COLON = 4          # 键之后
+_EXPECT_COMMA_OR_END = 5   # 容器中一个值之后
+_EXPECTING = {
+    _EXPECT_VALUE: "Expecting value",
+    _EXPECT_VALUE_OR_END: "Expecting value",
+    _EXPECT_KEY: "Expecting property name enclosed in double quotes",
+    _EXPECT_KEY_OR_END: "Expecting property name enclosed in double quotes",
+    _EXPECT_COLON: "Expecting ':' delimiter",
+    _EXPECT_COMMA_OR_END: "Expecting ',' delimiter",
+}
+
+
+class JsonStreamTokenizer:
+    """
+    增量 JSON 分词器：按块读取二进制流，逐个产出 (事件, 值)，不构建整个文档。
+    字符串交给 json.decoder.scanstring (C 实现) 解码；嵌套层数只受内存限制，
+    不会触发递归上限。on_read 在每读入一块后以累计字节数回调。
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        chunk_size: int = 256 * 1024,
+        on_read: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._on_read = on_read
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.bytes_read = 0
+
+    def _fill(self) -> bool:
+        """读入下一块，丢弃已消费的部分；没有更多数据时返回 False"""
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            tail = self._decoder.decode(b"", final=True)
+        else:
+            self.bytes_read += len(chunk)
+            tail = self._decoder.decode(chunk)
+            if self._on_read is not None:
+                self._on_read(self.bytes_read)
+        self._buffer = self._buffer[self._pos:] + tail
+        self._pos = 0
+        return not self._eof or bool(tail)
+
+    def _skip_whitespace(self) -> bool:
+        """跳过空白；返回是否还有非空白字符"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return True
+            if not self._fill():
+                return False
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _read_string(self) -> str:
+        while True:
+            try:
+                value, end = scanstring(self._buffer, self._pos + 1)
+            except json.JSONDecodeError:
+                # 字符串跨越了块边界，读入更多数据后重试
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return value
+
+    def _parse_scalar(self, text: str) -> object:
+        if text in _LITERALS:
+            return _LITERALS[text]
+        match = _NUMBER.fullmatch(text)
+        if not match:
+            raise self._error("Expecting value")
+        if match.group(1) or match.group(2):
+            return float(text)
+        return int(text)
+
+    def __iter__(self) -> Iterator[Event]:
+        # 容器栈：True 表示对象，False 表示数组；state 表示当前位置允许出现的记号，
+        # 与 json.loads 一样拒绝 [1,]、{"a" 1}、{,} 之类的畸形输入。
+        # 热循环里缓冲区和位置用局部变量，只在需要读入新块时同步回 self
+        containers = []
+        state = _EXPECT_VALUE
+        token_match = _TOKEN.match
+        if not self._skip_whitespace():
+            raise self._error("Expecting value")
+        buffer, pos = self._buffer, self._pos
+        while True:
+            match = token_match(buffer, pos)
+            end = match.end()
+            if end >= len(buffer) and not self._eof:
+                # 记号可能被块边界截断 (或只剩空白)，读入更多数据后重新匹配
+                self._pos = pos
+                self._fill()
+                buffer, pos = self._buffer, self._pos
+                continue
+            punct = match.group(1)
+            if punct is not None:
+                if punct == ",":
+                    if state != _EXPECT_COMMA_OR_END:
+                        self._pos = pos
+                        raise self._unexpected(state)
+                    pos = end
+                    state = _EXPECT_KEY if containers[-1] else _EXPECT_VALUE
+                    continue
+                if punct == ":":
+                    if state != _EXPECT_COLON:
+                        self._pos = pos
+                        raise self._unexpected(state)
+                    pos = end
+                    state = _EXPECT_VALUE
+                    continue
+                if punct == "{" or punct == "[":
+                    if state > _EXPECT_VALUE_OR_END:
+                        self._pos = pos
+                        raise self._unexpected(state)
+                    pos = end
+                    if punct == "{":
+                        containers.append(True)
+                        state = _EXPECT_KEY_OR_END
+                        yield START_MAP, None
+                    else:
+                        containers.append(False)
+                        state = _EXPECT_VALUE_OR_END
+                        yield START_ARRAY, None
+                    continue
+                is_map = punct == "}"
+                allowed = _EXPECT_KEY_OR_END if is_map else _EXPECT_VALUE_OR_END
+                if not containers or containers[-1] != is_map or state not in (allowed, _EXPECT_COMMA_OR_END):
+                    self._pos = pos
+                    raise self._unexpected(state) if containers else self._error("Unexpected " + punct)
+                containers.pop()
+                pos = end
+                yield (END_MAP if is_map else END_ARRAY), None
+            elif match.group(2) is not None:
+                if state == _EXPECT_KEY or state == _EXPECT_KEY_OR_END:
+                    self._pos = end - 1
+                    value = self._read_string()
+                    buffer, pos = self._buffer, self._pos
+                    state = _EXPECT_COLON
+                    yield MAP_KEY, value
+                    continue
+                if state > _EXPECT_VALUE_OR_END:
+                    self._pos = pos
+                    raise self._unexpected(state)
+                self._pos = end - 1
+                value = self._read_string()
+                buffer, pos = self._buffer, self._pos
+                yield VALUE, value
+            elif match.group(3) is not None:
+                if state > _EXPECT_VALUE_OR_END:
+                    self._pos = pos
+                    raise self._unexpected(state)
+                self._pos = pos = end
+                yield VALUE, self._parse_scalar(match.group(3))
+            else:
+                self._pos = end
+                raise self._error("Unexpected end of JSON" if end >= len(buffer) else "Expecting value")
+            # 一个完整的值 (标量、字符串或闭合的容器) 结束
+            state = _EXPECT_COMMA_OR_END
+            if not containers:
+                # 顶层值结束后只允许空白
+                self._pos = pos
+                if self._skip_whitespace():
+                    raise self._error("Extra data")
+                return
+
+    def _unexpected(self, state: int) -> json.JSONDecodeError:
+        return self._error(_EXPECTING[state])
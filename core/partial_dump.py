@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .uixml_parser import UiNode
+
+# (left, top, right, bottom)，与 get_ui_tree.js 的 bounds 一致
+Bounds = Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class DumpScope:
+    """
+    局部 dump 的范围，三种条件可以组合：
+    path       从根到子树根的 child index 路径，() 表示整棵树
+    rect       只保留与该矩形相交的节点 (不相交的节点连同子树一起跳过)
+    max_depth  相对子树根的最大深度，0 表示只要子树根本身
+    """
+    path: Tuple[int, ...] = ()
+    rect: Optional[Bounds] = None
+    max_depth: Optional[int] = None
+
+    @property
+    def is_full(self) -> bool:
+        return not self.path and self.rect is None and self.max_depth is None
+
+    @classmethod
+    def for_node(cls, node: UiNode, max_depth: Optional[int] = None) -> "DumpScope":
+        return cls(path=node_path(node), max_depth=max_depth)
+
+    @classmethod
+    def for_rect(cls, rect: Bounds, max_depth: Optional[int] = None) -> "DumpScope":
+        return cls(rect=tuple(rect), max_depth=max_depth)
+
+    def to_request(self) -> Dict:
+        """写给 get_ui_tree.js 的请求内容"""
+        request: Dict = {"path": list(self.path)}
+        if self.rect is not None:
+            request["rect"] = list(self.rect)
+        if self.max_depth is not None:
+            request["max_depth"] = self.max_depth
+        return request
+
+
+def node_path(node: UiNode) -> Tuple[int, ...]:
+    path: List[int] = []
+    while node.parent is not None:
+        path.append(node.index)
+        node = node.parent
+    return tuple(reversed(path))
+
+
+def find_by_path(root: UiNode, path: Tuple[int, ...]) -> Optional[UiNode]:
+    node = root
+    for index in path:
+        # index 是在父节点中的原始位置；null 子节点被跳过时与列表下标不一定相同
+        node = next((child for child in node.children if child.index == index), None)
+        if node is None:
+            return None
+    return node
+
+
+def intersects(rect: Tuple[int, int, int, int], bounds: Bounds) -> bool:
+    """
+    rect 为 (x, y, w, h)，bounds 为 (left, top, right, bottom)。
+    与 static/ui_tree_dump.js 的 intersects 一致，面积为 0 的节点不与任何矩形相交
+    """
+    x, y, w, h = rect
+    left, top, right, bottom = bounds
+    return x < right and left < x + w and y < bottom and top < y + h
+
+
+def _in_rect(node: UiNode, bounds: Bounds) -> bool:
+    # uiautomator 的 <hierarchy> 根没有 bounds，不参与矩形过滤；其余节点与设备端的判断相同
+    if node.parent is None and node.rect == (0, 0, 0, 0):
+        return True
+    return intersects(node.rect, bounds)
+
+
+def _copy_node(node: UiNode, parent: Optional[UiNode]) -> UiNode:
+    return UiNode(
+        index=node.index,
+        text=node.text,
+        resource_id=node.resource_id,
+        class_name=node.class_name,
+        package=node.package,
+        content_desc=node.content_desc,
+        flags=node.flags,
+        rect=node.rect,
+        parent=parent,
+    )
+
+
+def apply_scope(root: UiNode, scope: DumpScope) -> Optional[UiNode]:
+    """
+    在主机端按范围裁剪一棵完整的树 (uiautomator 无法在设备端只 dump 局部)，
+    返回裁剪后的副本；范围内没有节点时返回 None
+    """
+    start = find_by_path(root, scope.path)
+    if start is None or (scope.rect is not None and not _in_rect(start, scope.rect)):
+        return None
+    top = _copy_node(start, None)
+    stack = [(start, top, 0)]
+    while stack:
+        source, copy, depth = stack.pop()
+        if scope.max_depth is not None and depth >= scope.max_depth:
+            continue
+        for child in source.children:
+            if scope.rect is not None and not _in_rect(child, scope.rect):
+                continue
+            child_copy = _copy_node(child, copy)
+            copy.children.append(child_copy)
+            stack.append((child, child_copy, depth + 1))
+    return top
+
+
+def merge_partial(root: UiNode, partial: UiNode, scope: DumpScope) -> UiNode:
+    """
+    把局部 dump 的结果合并进当前树 (原地修改)，返回被更新的子树根。
+    同一父节点下按 index 对应：两边都有的更新属性并继续向下合并；
+    只在新结果中出现的挂上去；只在旧树中出现的，若因范围限制本来就没被 dump
+    (在矩形之外，或超出 max_depth) 则保留，否则视为已从界面上消失并移除。
+    """
+    target = find_by_path(root, scope.path)
+    if target is None:
+        raise ValueError("当前控件树中找不到局部 dump 的根节点，请先完整刷新")
+    stack = [(target, partial, 0)]
+    while stack:
+        old, new, depth = stack.pop()
+        old.text = new.text
+        old.resource_id = new.resource_id
+        old.class_name = new.class_name
+        old.package = new.package
+        old.content_desc = new.content_desc
+        old.flags = new.flags
+        old.rect = new.rect
+        if scope.max_depth is not None and depth >= scope.max_depth:
+            # 没有 dump 这一层以下的节点，保留旧的子节点
+            continue
+        fresh_by_index = {child.index: child for child in new.children}
+        merged: List[UiNode] = []
+        for child in old.children:
+            fresh = fresh_by_index.pop(child.index, None)
+            if fresh is not None:
+                merged.append(child)
+                stack.append((child, fresh, depth + 1))
+            elif scope.rect is not None and not _in_rect(child, scope.rect):
+                merged.append(child)
+        for fresh in fresh_by_index.values():
+            fresh.parent = old
+            merged.append(fresh)
+        merged.sort(key=lambda child: child.index)
+        old.children = merged
+    return target
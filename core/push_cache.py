@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".py_uiautomatorviewer", "push_cache.json")
+
+
+def file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as file_obj:
+        for chunk in iter(lambda: file_obj.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PushCache:
+    """
+    按设备序列号记录推送到设备上的文件及其内容哈希 (md5，与设备端 md5sum 一致)，
+    以及 toybox 选型等探测结果，持久化到用户目录，应用重启后仍然有效。
+    同一文件应只有一个实例 (用 shared() 获取)，否则各实例保存时会互相覆盖对方的记录。
+    """
+
+    _shared: Dict[str, "PushCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._devices: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # 本地文件哈希按 (size, mtime) 缓存，未修改的文件不重复计算
+        self._local_hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._load()
+
+    @classmethod
+    def shared(cls, path: str = DEFAULT_CACHE_PATH) -> "PushCache":
+        """同一缓存文件只加载一次，多个 AdbClient (多设备并行) 共用"""
+        key = os.path.abspath(path)
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls(path)
+                cls._shared[key] = cache
+            return cache
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            self._devices = data.get("devices", {})
+
+    def _save(self) -> None:
+        # 调用方持有 self._lock：序列化期间记录不会被其他线程修改，写文件也不会交错
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"devices": self._devices}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: failed to save push cache: {e}")
+
+    def _device(self, serial: str) -> Dict[str, Dict[str, str]]:
+        return self._devices.setdefault(serial, {"files": {}, "meta": {}})
+
+    def local_hash(self, local_path: str) -> str:
+        st = os.stat(local_path)
+        key = os.path.abspath(local_path)
+        cached = self._local_hashes.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = file_md5(local_path)
+        self._local_hashes[key] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def get(self, serial: str, remote_path: str) -> Optional[str]:
+        with self._lock:
+            return self._devices.get(serial, {}).get("files", {}).get(remote_path)
+
+    def set(self, serial: str, remote_path: str, digest: str) -> None:
+        self.set_many(serial, {remote_path: digest})
+
+    def set_many(self, serial: str, digests: Dict[str, str]) -> None:
+        """批量记录 {remote_path: md5}，有变化时只写一次文件"""
+        with self._lock:
+            files = self._device(serial)["files"]
+            changed = False
+            for remote_path, digest in digests.items():
+                if files.get(remote_path) != digest:
+                    files[remote_path] = digest
+                    changed = True
+            if changed:
+                self._save()
+
+    def forget(self, serial: str, remote_path: str) -> None:
+        with self._lock:
+            files = self._devices.get(serial, {}).get("files", {})
+            if files.pop(remote_path, None) is not None:
+                self._save()
+
+    def get_meta(self, serial: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._devices.get(serial, {}).get("meta", {}).get(key)
+
+    def set_meta(self, serial: str, key: str, value: str) -> None:
+        with self._lock:
+            meta = self._device(serial)["meta"]
+            if meta.get(key) != value:
+                meta[key] = value
+                self._save()
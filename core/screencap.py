@@ -0,0 +1,106 @@
+import struct
+from dataclasses import dataclass
+from typing import Callable
+
+# android.graphics.PixelFormat / HAL_PIXEL_FORMAT 取值
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_RGB_888 = 3
+PIXEL_FORMAT_RGB_565 = 4
+PIXEL_FORMAT_BGRA_8888 = 5
+
+BYTES_PER_PIXEL = {
+    PIXEL_FORMAT_RGBA_8888: 4,
+    PIXEL_FORMAT_RGBX_8888: 4,
+    PIXEL_FORMAT_RGB_888: 3,
+    PIXEL_FORMAT_RGB_565: 2,
+    PIXEL_FORMAT_BGRA_8888: 4,
+}
+
+# Android 8.0 之前头部为 width/height/format 共 12 字节，之后追加 4 字节 dataspace
+_BASE_HEADER_SIZE = 12
+_HEADER_SIZES = (16, 12)
+
+
+class TruncatedFrameError(ValueError):
+    """原始帧数据比头部声明的短：传输被截断或连接中断，不代表设备不支持原始帧"""
+
+
+@dataclass
+class RawFrame:
+    """`screencap` 不带 -p 时输出的原始帧：头部与像素共用一块 buffer"""
+    width: int
+    height: int
+    pixel_format: int
+    buffer: bytearray
+    offset: int
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        return BYTES_PER_PIXEL[self.pixel_format]
+
+    @property
+    def stride(self) -> int:
+        return self.width * self.bytes_per_pixel
+
+    @property
+    def pixels(self) -> memoryview:
+        return memoryview(self.buffer)[self.offset:self.offset + self.stride * self.height]
+
+
+def _read_exact_into(readinto: Callable[[memoryview], int], view: memoryview) -> None:
+    while len(view):
+        count = readinto(view)
+        if not count:
+            raise TruncatedFrameError("screencap 输出不完整")
+        view = view[count:]
+
+
+def read_raw_frame(readinto: Callable[[memoryview], int]) -> RawFrame:
+    """
+    从流中读取原始帧。先读 12 字节通用头部得到尺寸，再一次性分配 buffer
+    把剩余数据直接读进去；最后根据实际长度判断头部是 12 还是 16 字节。
+    头部或像素格式无法识别时抛出 ValueError，数据不足时抛出 TruncatedFrameError。
+    """
+    header = bytearray(_BASE_HEADER_SIZE)
+    _read_exact_into(readinto, memoryview(header))
+    width, height, pixel_format = struct.unpack_from("<III", header)
+    bpp = BYTES_PER_PIXEL.get(pixel_format)
+    if bpp is None or width <= 0 or height <= 0:
+        raise ValueError(f"不支持的 screencap 像素格式: {pixel_format} ({width}x{height})")
+    payload_size = width * height * bpp
+
+    buffer = bytearray(max(_HEADER_SIZES) + payload_size)
+    buffer[:_BASE_HEADER_SIZE] = header
+    view = memoryview(buffer)[_BASE_HEADER_SIZE:]
+    total = _BASE_HEADER_SIZE
+    while len(view):
+        count = readinto(view)
+        if not count:
+            break
+        view = view[count:]
+        total += count
+    else:
+        # buffer 已满仍有数据，说明头部格式不认识
+        if readinto(memoryview(bytearray(1))):
+            raise ValueError("screencap 输出长度与头部不符")
+
+    for header_size in _HEADER_SIZES:
+        if total == header_size + payload_size:
+            return RawFrame(width, height, pixel_format, buffer, header_size)
+    # buffer 按较长的头部分配，走到这里说明数据不足
+    raise TruncatedFrameError(f"screencap 输出不完整: {total} 字节, {width}x{height} 格式 {pixel_format}")
+
+
+def parse_raw_frame(data: bytes) -> RawFrame:
+    """解析已经完整读入内存的原始帧"""
+    view = memoryview(data)
+
+    def readinto(target: memoryview) -> int:
+        nonlocal view
+        count = min(len(target), len(view))
+        target[:count] = view[:count]
+        view = view[count:]
+        return count
+
+    return read_raw_frame(readinto)
@@ -0,0 +1,288 @@
+import json
+import os
+import shlex
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .push_cache import file_md5
+
+_SECTION_MARKER = "__PYADB_MD5__"
+
+
+@dataclass
+class RemoteFileState:
+    size: int
+    mtime: int
+    md5: str = ""
+
+
+@dataclass
+class SyncResult:
+    """按文件记录的同步结果 (拉取或推送)"""
+    transferred: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return len(self.transferred) + len(self.skipped) + len(self.failed)
+
+
+def remote_manifest_command(remote_root: str, toybox: str = "toybox") -> str:
+    """一条 shell 命令列出目录下所有文件的大小、修改时间和 md5"""
+    return (
+        f"cd {shlex.quote(remote_root)} && "
+        f"{toybox} find . -type f -exec {toybox} stat -c '%s %Y %n' {{}} + && "
+        f"echo {_SECTION_MARKER} && "
+        f"{toybox} find . -type f -exec {toybox} md5sum {{}} +"
+    )
+
+
+def parse_remote_manifest(output: str) -> Dict[str, RemoteFileState]:
+    """解析 remote_manifest_command 的输出，键为以 / 分隔的相对路径"""
+    states: Dict[str, RemoteFileState] = {}
+    stat_part, _, md5_part = output.partition(_SECTION_MARKER)
+    for line in stat_part.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        rel_path = _normalize(parts[2])
+        states[rel_path] = RemoteFileState(int(parts[0]), int(parts[1]) if parts[1].isdigit() else 0)
+    for line in md5_part.splitlines():
+        digest, sep, path = line.partition("  ")
+        if not sep:
+            continue
+        state = states.get(_normalize(path))
+        if state is not None:
+            state.md5 = digest.strip().lower()
+    return states
+
+
+def _normalize(path: str) -> str:
+    path = path.rstrip("\r")
+    if path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+class ScriptSync:
+    """
+    增量同步设备脚本目录到本地：设备端一条命令算出所有文件的 size/mtime/md5，
+    与本地清单比对后只并行拉取内容不同的文件。反方向的批量推送同样以清单
+    作为设备端的已知状态，只推送有改动的文件。
+
+    清单记录上次同步时的远程状态以及本地文件的 (size, mtime_ns, md5)，
+    本地文件未改动时无需重新计算哈希。
+    """
+
+    def __init__(
+        self,
+        adb_client,
+        remote_root: str,
+        local_root: str,
+        manifest_path: Optional[str] = None,
+        max_workers: int = 4,
+        archive_threshold: int = 8,
+    ) -> None:
+        self.adb_client = adb_client
+        self.remote_root = remote_root.rstrip("/") + "/"
+        self.local_root = local_root
+        if manifest_path is None:
+            device = os.path.basename(os.path.normpath(local_root))
+            manifest_path = os.path.join(os.path.dirname(os.path.normpath(local_root)), ".sync", device + ".json")
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        # 待推送文件数达到该值时打包为一个 tar 推送后在设备端解包
+        self.archive_threshold = archive_threshold
+        self._manifest: Dict[str, Dict] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        files = data.get("files") if isinstance(data, dict) else None
+        return files if isinstance(files, dict) else {}
+
+    def _save_manifest(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"remote_root": self.remote_root, "files": self._manifest}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            print(f"Warning: failed to save sync manifest: {e}")
+
+    def local_path(self, rel_path: str) -> str:
+        return os.path.join(self.local_root, *rel_path.split("/"))
+
+    def remote_path(self, rel_path: str) -> str:
+        return self.remote_root + rel_path
+
+    def scan_remote(self) -> Dict[str, RemoteFileState]:
+        toybox = self.adb_client.toybox_command()
+        result = self.adb_client._run(["shell", remote_manifest_command(self.remote_root, toybox)], timeout=120)
+        if result.returncode != 0:
+            message = result.stderr.strip() or result.stdout.strip()
+            raise RuntimeError(f"读取设备文件列表失败: {message}")
+        return parse_remote_manifest(result.stdout)
+
+    def _local_md5(self, rel_path: str) -> Optional[str]:
+        path = self.local_path(rel_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = self._manifest.get(rel_path) or {}
+        if entry.get("local_size") == st.st_size and entry.get("local_mtime_ns") == st.st_mtime_ns:
+            return entry.get("md5")
+        return file_md5(path)
+
+    def _record(self, rel_path: str, state: RemoteFileState) -> None:
+        st = os.stat(self.local_path(rel_path))
+        self._manifest[rel_path] = {
+            "size": state.size,
+            "mtime": state.mtime,
+            "md5": state.md5,
+            "local_size": st.st_size,
+            "local_mtime_ns": st.st_mtime_ns,
+        }
+
+    def plan(self, remote: Dict[str, RemoteFileState]) -> List[str]:
+        """返回需要拉取的相对路径：本地缺失或内容与设备不同"""
+        changed = []
+        for rel_path, state in remote.items():
+            local_md5 = self._local_md5(rel_path)
+            if local_md5 is None or not state.md5 or local_md5 != state.md5:
+                changed.append(rel_path)
+            else:
+                self._record(rel_path, state)
+        return changed
+
+    def sync_from_device(self, progress: Optional[Callable[[int, int], None]] = None) -> SyncResult:
+        remote = self.scan_remote()
+        changed = self.plan(remote)
+        changed_set = set(changed)
+        result = SyncResult(skipped=[rel_path for rel_path in remote if rel_path not in changed_set])
+
+        def pull(rel_path: str) -> bool:
+            return self.adb_client.pull_file(self.remote_path(rel_path), self.local_path(rel_path))
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for rel_path, ok in zip(changed, executor.map(pull, changed)):
+                if ok:
+                    self._record(rel_path, remote[rel_path])
+                    result.transferred.append(rel_path)
+                else:
+                    result.failed.append(rel_path)
+                done += 1
+                if progress is not None:
+                    progress(done, len(changed))
+        # 设备上已删除的文件不再保留在清单中 (本地文件保留)
+        for rel_path in list(self._manifest):
+            if rel_path not in remote:
+                del self._manifest[rel_path]
+        self._save_manifest()
+        self._remember_on_device(remote, result.transferred)
+        return result
+
+    def scan_local(self, rel_dir: str = "") -> Dict[str, RemoteFileState]:
+        """列出本地目录 (相对 local_root) 下的文件及其 md5，键为以 / 分隔的相对路径"""
+        base = self.local_path(rel_dir) if rel_dir else self.local_root
+        states: Dict[str, RemoteFileState] = {}
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.local_root).replace(os.sep, "/")
+                st = os.stat(full_path)
+                states[rel_path] = RemoteFileState(st.st_size, int(st.st_mtime), self._local_md5(rel_path) or "")
+        return states
+
+    def _remember_on_device(self, states: Dict[str, RemoteFileState], rel_paths: List[str]) -> None:
+        """
+        把已与设备一致的文件记入 push_cache，与 push_if_changed 共用记录，运行脚本时不再重复推送。
+        整批同步结束后调用一次，缓存文件只写一次
+        """
+        serial = self.adb_client._device_serial() if rel_paths else None
+        if serial:
+            self.adb_client.push_cache.set_many(
+                serial, {self.remote_path(rel_path): states[rel_path].md5 for rel_path in rel_paths}
+            )
+
+    def push_to_device(
+        self,
+        rel_dir: str = "",
+        refresh_remote: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> SyncResult:
+        """
+        把本地目录推送到设备，只推送与设备已知状态不同的文件。
+        refresh_remote 为 True 时先扫描设备端实际状态，否则以清单为准。
+        """
+        local = self.scan_local(rel_dir)
+        if refresh_remote:
+            remote = self.scan_remote()
+            known = {rel_path: state.md5 for rel_path, state in remote.items()}
+        else:
+            known = {rel_path: entry.get("md5") for rel_path, entry in self._manifest.items()}
+        changed = [rel_path for rel_path, state in local.items() if known.get(rel_path) != state.md5]
+        changed_set = set(changed)
+        result = SyncResult(skipped=[rel_path for rel_path in local if rel_path not in changed_set])
+        if not changed:
+            return result
+
+        if len(changed) >= self.archive_threshold and self._push_archive(changed):
+            for rel_path in changed:
+                self._record(rel_path, local[rel_path])
+                result.transferred.append(rel_path)
+            if progress is not None:
+                progress(len(changed), len(changed))
+        else:
+            def push(rel_path: str) -> bool:
+                return self.adb_client.push_file(self.local_path(rel_path), self.remote_path(rel_path))
+
+            done = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for rel_path, ok in zip(changed, executor.map(push, changed)):
+                    if ok:
+                        self._record(rel_path, local[rel_path])
+                        result.transferred.append(rel_path)
+                    else:
+                        result.failed.append(rel_path)
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(changed))
+        self._save_manifest()
+        self._remember_on_device(local, result.transferred)
+        return result
+
+    def _push_archive(self, rel_paths: List[str]) -> bool:
+        """打包推送并在设备端用 toybox tar 解包；失败时返回 False，由调用方逐个推送"""
+        remote_archive = "/data/local/tmp/pyadb_push.tar"
+        fd, archive_path = tempfile.mkstemp(prefix="pyadb_push_", suffix=".tar")
+        os.close(fd)
+        try:
+            with tarfile.open(archive_path, "w", format=tarfile.GNU_FORMAT) as tar:
+                for rel_path in rel_paths:
+                    tar.add(self.local_path(rel_path), arcname=rel_path, recursive=False)
+            if not self.adb_client.push_file(archive_path, remote_archive):
+                return False
+        finally:
+            os.remove(archive_path)
+        toybox = self.adb_client.toybox_command()
+        root = shlex.quote(self.remote_root)
+        result = self.adb_client._run(
+            ["shell", f"mkdir -p {root} && cd {root} && {toybox} tar -xf {remote_archive}; "
+                      f"rc=$?; rm -f {remote_archive}; exit $rc"],
+            timeout=120,
+        )
+        if result.returncode != 0:
+            print(f"Warning: remote tar extract failed: {result.stderr.strip() or result.stdout.strip()}")
+            return False
+        return True
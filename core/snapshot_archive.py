@@ -0,0 +1,260 @@
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .screencap import BYTES_PER_PIXEL, RawFrame
+from .snapshot_store import SnapshotColumns
+from .uixml_parser import UiNode
+
+SNAPSHOT_EXTENSION = ".uisnap"
+
+# 文件布局 (小端序)：
+#   头部   magic(8) version(u16) reserved(u16) section_count(u32)
+#   目录   每段 name(8, 不足补 \0) offset(u64) length(u64)
+#   各段   按 _ALIGN 对齐，数值列可直接 np.frombuffer 映射，不需要拷贝
+_MAGIC = b"UISNAP\x00\x01"
+_VERSION = 1
+_HEADER = struct.Struct("<8sHHI")
+_ENTRY = struct.Struct("<8sQQ")
+_ALIGN = 64
+
+# 段名 -> dtype；rect 为 (n, 4) 的 x, y, w, h
+_COLUMN_SECTIONS: Tuple[Tuple[str, np.dtype], ...] = (
+    ("parent", np.dtype("<i4")),
+    ("depth", np.dtype("<i4")),
+    ("rect", np.dtype("<i4")),
+    ("flags", np.dtype("<u4")),
+    ("class", np.dtype("<i4")),
+    ("text", np.dtype("<i4")),
+    ("resid", np.dtype("<i4")),
+    ("desc", np.dtype("<i4")),
+    ("package", np.dtype("<i4")),
+    ("index", np.dtype("<i4")),
+)
+
+
+def _encode_strings(strings: List[str]) -> Tuple[bytes, bytes]:
+    """字符串表：u32 偏移数组 (n + 1 项) + 拼接后的 UTF-8 数据"""
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def write_snapshot_archive(
+    path: str,
+    root: UiNode,
+    columns: Optional[SnapshotColumns] = None,
+    frame: Optional[RawFrame] = None,
+    png: Optional[bytes] = None,
+    metadata: Optional[Dict] = None,
+) -> None:
+    """
+    把一次快照 (控件树、截图、采集信息) 写成单个二进制文件。
+    截图优先保存原始帧像素 (打开时直接映射)，没有原始帧时保存 PNG 数据。
+    先写临时文件再替换，写到一半失败不会留下损坏的存档。
+    """
+    if columns is None:
+        columns = SnapshotColumns.from_tree(root)
+    count = len(columns)
+
+    # SnapshotColumns 没有包名和 index，追加到同一张字符串表里
+    strings = list(columns.strings)
+    string_ids = {value: sid for sid, value in enumerate(strings)}
+
+    def intern(value: str) -> int:
+        sid = string_ids.get(value)
+        if sid is None:
+            sid = string_ids[value] = len(strings)
+            strings.append(value)
+        return sid
+
+    package_id = np.fromiter((intern(node.package) for node in columns.nodes), dtype="<i4", count=count)
+    node_index = np.fromiter((node.index for node in columns.nodes), dtype="<i4", count=count)
+    rects = np.stack([columns.x, columns.y, columns.w, columns.h], axis=1)
+
+    meta = dict(metadata or {})
+    meta.setdefault("saved_at", time.time())
+    meta["node_count"] = count
+    if frame is not None:
+        meta["image"] = {
+            "format": "raw",
+            "width": frame.width,
+            "height": frame.height,
+            "pixel_format": frame.pixel_format,
+        }
+        image = frame.pixels
+    elif png is not None:
+        meta["image"] = {"format": "png"}
+        image = png
+    else:
+        meta["image"] = None
+        image = b""
+
+    column_data = {
+        "parent": columns.parent,
+        "depth": columns.depth,
+        "rect": rects,
+        "flags": columns.flags,
+        "class": columns.class_id,
+        "text": columns.text_id,
+        "resid": columns.resource_id,
+        "desc": columns.desc_id,
+        "package": package_id,
+        "index": node_index,
+    }
+    str_offsets, str_data = _encode_strings(strings)
+    sections = [("meta", json.dumps(meta, ensure_ascii=False).encode("utf-8"))]
+    for name, dtype in _COLUMN_SECTIONS:
+        sections.append((name, np.ascontiguousarray(column_data[name], dtype=dtype).tobytes()))
+    sections += [("stroff", str_offsets), ("strdata", str_data), ("image", image)]
+
+    offset = _HEADER.size + _ENTRY.size * len(sections)
+    directory = []
+    for name, data in sections:
+        offset = (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+        directory.append((name, offset, len(data)))
+        offset += len(data)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, 0, len(sections)))
+        for name, section_offset, length in directory:
+            f.write(_ENTRY.pack(name.encode("ascii"), section_offset, length))
+        for (name, section_offset, _), (_, data) in zip(directory, sections):
+            f.write(b"\0" * (section_offset - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_directory(read) -> Dict[str, Tuple[int, int]]:
+    magic, version, _, section_count = _HEADER.unpack(read(_HEADER.size))
+    if magic != _MAGIC:
+        raise ValueError("不是快照存档文件")
+    if version > _VERSION:
+        raise ValueError(f"快照存档版本过新: {version}")
+    directory = {}
+    for _ in range(section_count):
+        name, offset, length = _ENTRY.unpack(read(_ENTRY.size))
+        directory[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+    return directory
+
+
+def read_snapshot_info(path: str) -> Dict:
+    """只读头部和元数据段，用于快速扫描大量存档"""
+    with open(path, "rb") as f:
+        directory = _read_directory(f.read)
+        offset, length = directory["meta"]
+        f.seek(offset)
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+class SnapshotArchive:
+    """
+    通过 mmap 打开的快照存档。数值列与截图像素都直接引用映射内存，
+    打开本身只读目录和字符串表；UiNode 树在第一次访问 root 时才生成。
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        position = 0
+
+        def read(size: int) -> bytes:
+            nonlocal position
+            data = view[position:position + size].tobytes()
+            position += size
+            return data
+
+        self._directory = _read_directory(read)
+        self.metadata: Dict = json.loads(self._section_bytes("meta").decode("utf-8"))
+        count = self.metadata["node_count"]
+        self._arrays = {}
+        for name, dtype in _COLUMN_SECTIONS:
+            offset, length = self._directory[name]
+            array = np.frombuffer(self._mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+            self._arrays[name] = array.reshape(count, 4) if name == "rect" else array
+
+        offsets = self._section_array("stroff", np.dtype("<u4"))
+        data = self._section_bytes("strdata")
+        bounds = offsets.tolist()
+        self.strings: List[str] = [data[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+        self._root: Optional[UiNode] = None
+        self._columns: Optional[SnapshotColumns] = None
+
+    def _section_bytes(self, name: str) -> bytes:
+        offset, length = self._directory[name]
+        return self._mmap[offset:offset + length]
+
+    def _section_array(self, name: str, dtype: np.dtype) -> np.ndarray:
+        offset, length = self._directory[name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def __len__(self) -> int:
+        return int(self.metadata["node_count"])
+
+    @property
+    def frame(self) -> Optional[RawFrame]:
+        """原始帧截图；像素仍在映射内存中，使用期间需保持存档对象存活"""
+        image = self.metadata.get("image")
+        if not image or image.get("format") != "raw":
+            return None
+        offset, length = self._directory["image"]
+        frame = RawFrame(image["width"], image["height"], image["pixel_format"], self._mmap, offset)
+        if length != frame.width * frame.height * BYTES_PER_PIXEL[frame.pixel_format]:
+            raise ValueError("快照存档中的截图数据长度不符")
+        return frame
+
+    @property
+    def png(self) -> Optional[bytes]:
+        image = self.metadata.get("image")
+        if not image or image.get("format") != "png":
+            return None
+        return self._section_bytes("image")
+
+    @property
+    def root(self) -> Optional[UiNode]:
+        if self._root is None and len(self):
+            self._root = self.columns.nodes[0]
+        return self._root
+
+    @property
+    def columns(self) -> SnapshotColumns:
+        """按先序一次性生成 UiNode，并直接复用映射的数值列构造 SnapshotColumns"""
+        if self._columns is None:
+            arrays = self._arrays
+            strings = self.strings
+            nodes: List[UiNode] = []
+            rows = zip(
+                arrays["parent"].tolist(), arrays["index"].tolist(), arrays["text"].tolist(),
+                arrays["resid"].tolist(), arrays["class"].tolist(), arrays["package"].tolist(),
+                arrays["desc"].tolist(), arrays["flags"].tolist(), arrays["rect"].tolist(),
+            )
+            for parent_index, index, text_id, res_id, class_id, package_id, desc_id, flags, rect in rows:
+                parent = nodes[parent_index] if parent_index >= 0 else None
+                node = UiNode(
+                    index=index,
+                    text=strings[text_id],
+                    resource_id=strings[res_id],
+                    class_name=strings[class_id],
+                    package=strings[package_id],
+                    content_desc=strings[desc_id],
+                    flags=flags,
+                    rect=tuple(rect),
+                    parent=parent,
+                )
+                if parent is not None:
+                    parent.children.append(node)
+                nodes.append(node)
+            self._columns = SnapshotColumns(
+                nodes, arrays["parent"], arrays["depth"], arrays["rect"], arrays["flags"],
+                arrays["class"], arrays["text"], arrays["resid"], arrays["desc"], strings,
+            )
+        return self._columns
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .snapshot_store import SnapshotColumns
+from .uixml_parser import UiNode
+
+# 单个 UiNode 连同 rect 元组、children 列表等的大致内存占用 (字节)，
+# 只用于估算缓存大小，不追求精确
+_NODE_BYTES = 400
+
+
+def estimate_snapshot_size(columns: SnapshotColumns) -> int:
+    arrays = (
+        columns.parent, columns.depth, columns.x, columns.flags, columns.class_id,
+        columns.text_id, columns.resource_id, columns.desc_id,
+    )
+    # x / y / w / h 是同一个 (n, 4) 数组的视图，按 4 倍计
+    array_bytes = sum(array.nbytes for array in arrays) + columns.x.nbytes * 3
+    string_bytes = sum(len(value) for value in columns.strings) + 50 * len(columns.strings)
+    return array_bytes + string_bytes + _NODE_BYTES * len(columns)
+
+
+@dataclass
+class CachedSnapshot:
+    root: UiNode
+    columns: SnapshotColumns
+    size: int
+
+
+class ParsedSnapshotCache:
+    """
+    以原始 dump 内容的摘要为键，缓存解析好的 UiNode 树和 SnapshotColumns。
+    同一界面重复刷新、或在几个界面之间来回切换时直接复用，不再解析和建索引。
+    按 LRU 淘汰，总大小 (估算) 不超过 max_bytes，条目数不超过 max_entries。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 16) -> None:
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedSnapshot]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Optional[str]) -> Optional[CachedSnapshot]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Optional[str], root: UiNode, columns: SnapshotColumns) -> Optional[CachedSnapshot]:
+        """加入缓存；单个快照超过总预算时不缓存，返回 None"""
+        if key is None:
+            return None
+        size = estimate_snapshot_size(columns)
+        if size > self.max_bytes:
+            return None
+        entry = CachedSnapshot(root, columns, size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old.size
+            self._entries[key] = entry
+            self._total += size
+            while self._entries and (self._total > self.max_bytes or len(self._entries) > self.max_entries):
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= evicted.size
+        return entry
+
+    def discard(self, key: Optional[str]) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,167 @@
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from .spatial_index import HIT_SMALLEST, SpatialGridIndex
+from .uixml_parser import FLAG_FIELDS, UiNode
+
+
+class SnapshotColumns:
+    """
+    一次快照的列式存储：节点按先序遍历编号，父节点、深度、矩形、标志位
+    以及字符串 id 各存一列 NumPy 数组，命中测试、过滤、统计都在数组上向量化完成。
+    UiNode 对象仍保留在 nodes 中，供界面按下标取用。
+    """
+
+    def __init__(self, nodes: List[UiNode], parent: np.ndarray, depth: np.ndarray, rects: np.ndarray,
+                 flags: np.ndarray, class_id: np.ndarray, text_id: np.ndarray, resource_id: np.ndarray,
+                 desc_id: np.ndarray, strings: List[str]) -> None:
+        self.nodes = nodes
+        self.parent = parent
+        self.depth = depth
+        self.x = rects[:, 0]
+        self.y = rects[:, 1]
+        self.w = rects[:, 2]
+        self.h = rects[:, 3]
+        self.flags = flags
+        self.class_id = class_id
+        self.text_id = text_id
+        self.resource_id = resource_id
+        self.desc_id = desc_id
+        # 所有字符串列共用一张表，id 0 固定为空串
+        self.strings = strings
+        self._lower_strings: Optional[np.ndarray] = None
+        self._index_by_node: Optional[Dict[int, int]] = None
+        self._spatial_index: Optional[SpatialGridIndex] = None
+
+    @classmethod
+    def from_tree(cls, root: UiNode) -> "SnapshotColumns":
+        nodes: List[UiNode] = []
+        parents: List[int] = []
+        depths: List[int] = []
+        stack = [(root, -1, 0)]
+        while stack:
+            node, parent_index, depth = stack.pop()
+            index = len(nodes)
+            nodes.append(node)
+            parents.append(parent_index)
+            depths.append(depth)
+            for child in reversed(node.children):
+                stack.append((child, index, depth + 1))
+
+        string_ids: Dict[str, int] = {"": 0}
+        strings: List[str] = [""]
+
+        def intern(value: str) -> int:
+            sid = string_ids.get(value)
+            if sid is None:
+                sid = string_ids[value] = len(strings)
+                strings.append(value)
+            return sid
+
+        count = len(nodes)
+        return cls(
+            nodes,
+            np.array(parents, dtype=np.int32),
+            np.array(depths, dtype=np.int32),
+            np.array([node.rect for node in nodes], dtype=np.int32).reshape(count, 4),
+            np.fromiter((node.flags for node in nodes), dtype=np.uint32, count=count),
+            np.fromiter((intern(node.class_name) for node in nodes), dtype=np.int32, count=count),
+            np.fromiter((intern(node.text or "") for node in nodes), dtype=np.int32, count=count),
+            np.fromiter((intern(node.resource_id) for node in nodes), dtype=np.int32, count=count),
+            np.fromiter((intern(node.content_desc or "") for node in nodes), dtype=np.int32, count=count),
+            strings,
+        )
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node(self, index: int) -> UiNode:
+        return self.nodes[index]
+
+    def index_of(self, node: UiNode) -> Optional[int]:
+        if self._index_by_node is None:
+            self._index_by_node = {id(item): index for index, item in enumerate(self.nodes)}
+        return self._index_by_node.get(id(node))
+
+    # ---- 命中测试 ----
+
+    def hit_mask(self, x: int, y: int) -> np.ndarray:
+        return (
+            (self.w > 0) & (self.h > 0)
+            & (self.x <= x) & (x <= self.x + self.w)
+            & (self.y <= y) & (y <= self.y + self.h)
+        )
+
+    def spatial_index(self) -> SpatialGridIndex:
+        """节点矩形的网格索引，首次使用时构建，之后同一快照的查询都复用"""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialGridIndex.from_columns(self)
+        return self._spatial_index
+
+    def hit_test(self, x: int, y: int, mode: str = HIT_SMALLEST) -> Optional[int]:
+        """
+        包含该点的面积最小 (mode 为 HIT_DEEPEST 时为最深) 的节点；
+        并列时取更深、再取先序遍历中靠后 (位于上层) 的
+        """
+        return self.spatial_index().hit_test(x, y, mode)
+
+    def query_rect(self, left: int, top: int, right: int, bottom: int, contained: bool = False) -> np.ndarray:
+        """与矩形相交 (或完全落在其中) 的节点下标"""
+        return self.spatial_index().query_rect(left, top, right, bottom, contained)
+
+    # ---- 过滤 ----
+
+    def _string_match(self, needle: str, lower: bool = True) -> np.ndarray:
+        """对字符串表逐项做子串匹配，结果按 id 索引"""
+        if lower:
+            if self._lower_strings is None:
+                self._lower_strings = np.array([value.lower() for value in self.strings], dtype=object)
+            table = self._lower_strings
+        else:
+            table = self.strings
+        return np.fromiter((needle in value for value in table), dtype=bool, count=len(table))
+
+    def match_mask(self, text: str = "", class_filter: str = "All") -> np.ndarray:
+        """
+        每个节点自身是否满足过滤条件：类名包含 class_filter，
+        且文本 / 资源 id / 描述 / 类名之一包含 text (不区分大小写)
+        """
+        mask = np.ones(len(self.nodes), dtype=bool)
+        if class_filter and class_filter != "All":
+            mask &= self._string_match(class_filter, lower=False)[self.class_id]
+        if text:
+            matched = self._string_match(text.lower())
+            mask &= matched[self.text_id] | matched[self.resource_id] | matched[self.desc_id] | matched[self.class_id]
+        return mask
+
+    def with_ancestors(self, mask: np.ndarray) -> np.ndarray:
+        """把命中节点的所有祖先也标记为可见 (与树视图的递归过滤一致)"""
+        visible = mask.copy()
+        if not len(visible):
+            return visible
+        for depth in range(int(self.depth.max()), 0, -1):
+            rows = np.flatnonzero(visible & (self.depth == depth))
+            visible[self.parent[rows]] = True
+        return visible
+
+    # ---- 统计 ----
+
+    def class_short_names(self) -> Set[str]:
+        used = np.unique(self.class_id)
+        return {self.strings[sid].split(".")[-1] for sid in used if self.strings[sid]}
+
+    def flag_counts(self) -> Dict[str, int]:
+        return {name: int(np.count_nonzero(self.flags & bit)) for name, _, bit in FLAG_FIELDS}
+
+    def class_counts(self) -> Dict[str, int]:
+        ids, counts = np.unique(self.class_id, return_counts=True)
+        return {self.strings[sid]: int(count) for sid, count in zip(ids, counts)}
+
+    def stats(self) -> Dict:
+        return {
+            "nodes": len(self.nodes),
+            "max_depth": int(self.depth.max()) if len(self.nodes) else 0,
+            "classes": self.class_counts(),
+            "flags": self.flag_counts(),
+        }
@@ -0,0 +1,153 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# 命中测试的选择方式
+HIT_SMALLEST = "smallest"
+HIT_DEEPEST = "deepest"
+
+
+class SpatialGridIndex:
+    """
+    节点矩形的均匀网格索引，每个快照构建一次。
+    每个节点登记到它覆盖的所有格子中 (CSR 存储：cell_start + cell_nodes)；
+    覆盖格子数超过 large_cells (默认为全部格子的 1/8) 的大节点 (根布局、全屏容器等) 不进网格，
+    单独放一个列表，查询时整体做一次向量化判断，避免它们占满每个格子。
+
+    点查询的结果是确定的：按 mode 先比面积 (smallest) 或深度 (deepest)，
+    再依次取更深的、先序编号更大的 (即绘制顺序更靠后、位于上层的) 节点。
+    宽或高为 0 的节点不可见，不参与索引。
+    """
+
+    def __init__(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        w: np.ndarray,
+        h: np.ndarray,
+        depth: np.ndarray,
+        cell_size: Optional[int] = None,
+        large_cells: Optional[int] = None,
+    ) -> None:
+        self.x = np.asarray(x, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.right = self.x + np.asarray(w, dtype=np.int64)
+        self.bottom = self.y + np.asarray(h, dtype=np.int64)
+        self.area = np.asarray(w, dtype=np.int64) * np.asarray(h, dtype=np.int64)
+        self.depth = np.asarray(depth, dtype=np.int64)
+
+        visible = np.flatnonzero((np.asarray(w) > 0) & (np.asarray(h) > 0))
+        if len(visible):
+            self.origin_x = int(self.x[visible].min())
+            self.origin_y = int(self.y[visible].min())
+            extent = max(
+                int(self.right[visible].max()) - self.origin_x,
+                int(self.bottom[visible].max()) - self.origin_y,
+                1,
+            )
+        else:
+            self.origin_x = self.origin_y = 0
+            extent = 1
+        # 默认约 64 格覆盖较长的一边
+        self.cell_size = cell_size or max(1, extent // 64 + 1)
+        self.grid_w = int((self.right[visible].max() - self.origin_x) // self.cell_size + 1) if len(visible) else 1
+        self.grid_h = int((self.bottom[visible].max() - self.origin_y) // self.cell_size + 1) if len(visible) else 1
+
+        # 包含判断两端都是闭区间，右 / 下边所在的格子也要登记
+        cx0 = (self.x[visible] - self.origin_x) // self.cell_size
+        cy0 = (self.y[visible] - self.origin_y) // self.cell_size
+        cx1 = (self.right[visible] - self.origin_x) // self.cell_size
+        cy1 = (self.bottom[visible] - self.origin_y) // self.cell_size
+        cols = cx1 - cx0 + 1
+        counts = cols * (cy1 - cy0 + 1)
+        if large_cells is None:
+            large_cells = max(16, self.grid_w * self.grid_h // 8)
+        is_large = counts > large_cells
+        self.large_nodes = visible[is_large]
+
+        small = ~is_large
+        ids = visible[small]
+        counts = counts[small]
+        cols, cx0, cy0 = cols[small], cx0[small], cy0[small]
+        total = int(counts.sum())
+        starts = np.cumsum(counts) - counts
+        local = np.arange(total, dtype=np.int64) - np.repeat(starts, counts)
+        cols_rep = np.repeat(cols, counts)
+        cells = (np.repeat(cy0, counts) + local // cols_rep) * self.grid_w + np.repeat(cx0, counts) + local % cols_rep
+        order = np.argsort(cells, kind="stable")
+        self.cell_nodes = np.repeat(ids.astype(np.int32), counts)[order]
+        self.cell_start = np.zeros(self.grid_w * self.grid_h + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.grid_w * self.grid_h), out=self.cell_start[1:])
+
+    @classmethod
+    def from_columns(cls, columns, **kwargs) -> "SpatialGridIndex":
+        """由 SnapshotColumns 构建"""
+        return cls(columns.x, columns.y, columns.w, columns.h, columns.depth, **kwargs)
+
+    def _cell(self, x: int, y: int) -> Optional[int]:
+        cx = (x - self.origin_x) // self.cell_size
+        cy = (y - self.origin_y) // self.cell_size
+        if not (0 <= cx < self.grid_w and 0 <= cy < self.grid_h):
+            return None
+        return int(cy * self.grid_w + cx)
+
+    def _cell_range(self, left: int, top: int, right: int, bottom: int) -> Tuple[int, int, int, int]:
+        cx0 = max(0, (left - self.origin_x) // self.cell_size)
+        cy0 = max(0, (top - self.origin_y) // self.cell_size)
+        cx1 = min(self.grid_w - 1, (right - self.origin_x) // self.cell_size)
+        cy1 = min(self.grid_h - 1, (bottom - self.origin_y) // self.cell_size)
+        return cx0, cy0, cx1, cy1
+
+    def nodes_at(self, x: int, y: int) -> np.ndarray:
+        """包含该点的所有节点 (先序编号升序)"""
+        cell = self._cell(x, y)
+        if cell is None:
+            candidates = self.large_nodes
+        else:
+            candidates = np.concatenate(
+                (self.cell_nodes[self.cell_start[cell]:self.cell_start[cell + 1]], self.large_nodes)
+            )
+        hit = (
+            (self.x[candidates] <= x) & (x <= self.right[candidates])
+            & (self.y[candidates] <= y) & (y <= self.bottom[candidates])
+        )
+        return np.sort(candidates[hit])
+
+    def hit_test(self, x: int, y: int, mode: str = HIT_SMALLEST) -> Optional[int]:
+        """包含该点的最小 (或最深) 节点的先序编号，没有时返回 None"""
+        candidates = self.nodes_at(x, y)
+        if not len(candidates):
+            return None
+        depth = self.depth[candidates]
+        if mode == HIT_DEEPEST:
+            # lexsort 以最后一个键为主键；取反后最小值即深度最大 / 编号最大
+            keys = (-candidates, self.area[candidates], -depth)
+        else:
+            keys = (-candidates, -depth, self.area[candidates])
+        return int(candidates[np.lexsort(keys)[0]])
+
+    def query_rect(self, left: int, top: int, right: int, bottom: int, contained: bool = False) -> np.ndarray:
+        """
+        与矩形 [left, right] x [top, bottom] 相交的节点 (contained 为 True 时要求完全落在矩形内)，
+        按先序编号升序返回
+        """
+        if right < left or bottom < top:
+            return np.empty(0, dtype=np.int64)
+        cx0, cy0, cx1, cy1 = self._cell_range(left, top, right, bottom)
+        parts = [self.large_nodes]
+        # 矩形完全在网格之外时 cx0 > cx1 或 cy0 > cy1，只需检查大节点
+        for cy in range(cy0, cy1 + 1 if cx0 <= cx1 else cy0):
+            row = cy * self.grid_w
+            parts.append(self.cell_nodes[self.cell_start[row + cx0]:self.cell_start[row + cx1 + 1]])
+        candidates = np.unique(np.concatenate(parts))
+        if contained:
+            hit = (
+                (left <= self.x[candidates]) & (self.right[candidates] <= right)
+                & (top <= self.y[candidates]) & (self.bottom[candidates] <= bottom)
+            )
+        else:
+            hit = (
+                (self.x[candidates] <= right) & (left <= self.right[candidates])
+                & (self.y[candidates] <= bottom) & (top <= self.bottom[candidates])
+            )
+        return candidates[hit]
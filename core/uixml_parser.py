@@ -1,31 +1,125 @@
+import io
+import sys
 import xml.etree.ElementTree as ET
 import re
-from dataclasses import dataclass, field
-from typing import List, Optional, Tuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+# 布尔属性打包为一个整数位掩码，顺序与 uiautomator dump 中的属性一致
+FLAG_CHECKABLE = 1 << 0
+FLAG_CHECKED = 1 << 1
+FLAG_CLICKABLE = 1 << 2
+FLAG_ENABLED = 1 << 3
+FLAG_FOCUSABLE = 1 << 4
+FLAG_FOCUSED = 1 << 5
+FLAG_SCROLLABLE = 1 << 6
+FLAG_LONG_CLICKABLE = 1 << 7
+FLAG_PASSWORD = 1 << 8
+FLAG_SELECTED = 1 << 9
+
+# (UiNode 属性名, XML 属性名, 位)
+FLAG_FIELDS: Tuple[Tuple[str, str, int], ...] = (
+    ("checkable", "checkable", FLAG_CHECKABLE),
+    ("checked", "checked", FLAG_CHECKED),
+    ("clickable", "clickable", FLAG_CLICKABLE),
+    ("enabled", "enabled", FLAG_ENABLED),
+    ("focusable", "focusable", FLAG_FOCUSABLE),
+    ("focused", "focused", FLAG_FOCUSED),
+    ("scrollable", "scrollable", FLAG_SCROLLABLE),
+    ("long_clickable", "long-clickable", FLAG_LONG_CLICKABLE),
+    ("password", "password", FLAG_PASSWORD),
+    ("selected", "selected", FLAG_SELECTED),
+)
+_FLAG_BITS = {name: bit for name, _, bit in FLAG_FIELDS}
+
+
+def is_true(value) -> bool:
+    """兼容 "true"/"True"/True 等写法"""
+    return value is True or (isinstance(value, str) and value.lower() == "true")
+
+
+def format_bounds(rect: Tuple[int, int, int, int]) -> str:
+    x, y, w, h = rect
+    return f"[{x},{y}][{x + w},{y + h}]"
+
+
+def _flag_property(bit: int) -> property:
+    # 对外仍是 "true"/"false" 字符串，与原先的字段保持兼容
+    def getter(self: "UiNode") -> str:
+        return "true" if self.flags & bit else "false"
+
+    def setter(self: "UiNode", value) -> None:
+        if is_true(value):
+            self.flags |= bit
+        else:
+            self.flags &= ~bit
+
+    return property(getter, setter)
+
 
-@dataclass
 class UiNode:
     """表示界面上的一个控件节点"""
-    index: int
-    text: str
-    resource_id: str
-    class_name: str
-    package: str
-    content_desc: str
-    checkable: str
-    checked: str
-    clickable: str
-    enabled: str
-    focusable: str
-    focused: str
-    scrollable: str
-    long_clickable: str
-    password: str
-    selected: str
-    bounds_str: str
-    rect: Tuple[int, int, int, int] = (0, 0, 0, 0) # x, y, w, h
-    children: List['UiNode'] = field(default_factory=list)
-    parent: Optional['UiNode'] = None
+
+    __slots__ = (
+        "index", "text", "resource_id", "class_name", "package", "content_desc",
+        "flags", "rect", "children", "parent", "__weakref__",
+    )
+
+    def __init__(
+        self,
+        index: int = 0,
+        text: str = "",
+        resource_id: str = "",
+        class_name: str = "",
+        package: str = "",
+        content_desc: str = "",
+        flags: int = 0,
+        rect: Tuple[int, int, int, int] = (0, 0, 0, 0),  # x, y, w, h
+        children: Optional[List["UiNode"]] = None,
+        parent: Optional["UiNode"] = None,
+        **legacy,
+    ) -> None:
+        self.index = index
+        self.text = text
+        # 类名、包名、id 在一棵树里大量重复，驻留后只保存一份
+        self.resource_id = sys.intern(resource_id or "")
+        self.class_name = sys.intern(class_name or "")
+        self.package = sys.intern(package or "")
+        self.content_desc = content_desc
+        self.flags = flags
+        self.rect = rect
+        self.children: List[UiNode] = children if children is not None else []
+        self.parent = parent
+        # 兼容旧的关键字参数: checkable="true" ... bounds_str="[0,0][1,1]"
+        for name, value in legacy.items():
+            if name in _FLAG_BITS:
+                setattr(self, name, value)
+            elif name == "bounds_str":
+                if rect == (0, 0, 0, 0):
+                    self.rect = parse_bounds(value)
+            else:
+                raise TypeError(f"UiNode() got an unexpected keyword argument '{name}'")
+
+    checkable = _flag_property(FLAG_CHECKABLE)
+    checked = _flag_property(FLAG_CHECKED)
+    clickable = _flag_property(FLAG_CLICKABLE)
+    enabled = _flag_property(FLAG_ENABLED)
+    focusable = _flag_property(FLAG_FOCUSABLE)
+    focused = _flag_property(FLAG_FOCUSED)
+    scrollable = _flag_property(FLAG_SCROLLABLE)
+    long_clickable = _flag_property(FLAG_LONG_CLICKABLE)
+    password = _flag_property(FLAG_PASSWORD)
+    selected = _flag_property(FLAG_SELECTED)
+
+    def has_flag(self, bit: int) -> bool:
+        return bool(self.flags & bit)
+
+    def flag_dict(self) -> Dict[str, bool]:
+        """{属性名: bool}，用于导出 JSON"""
+        return {name: bool(self.flags & bit) for name, _, bit in FLAG_FIELDS}
+
+    @property
+    def bounds_str(self) -> str:
+        return format_bounds(self.rect)
 
     @property
     def display_text(self) -> str:
@@ -42,14 +136,52 @@ class UiNode:
         
         return f"({self.index}) " + " ".join(parts)
 
+    def __repr__(self) -> str:
+        return f"UiNode({self.display_text!r}, rect={self.rect}, children={len(self.children)})"
+
+# "[x1,y1][x2,y2]"
+_BOUNDS_RE = re.compile(r'\[(-?\d+),(-?\d+)\]')
+
+
+def parse_bounds(bounds_str: str) -> Tuple[int, int, int, int]:
+    """解析 [x1,y1][x2,y2] 为 (x, y, w, h)"""
+    # 快速路径：标准格式直接切分，避免每个节点都跑一次正则
+    if bounds_str and bounds_str[0] == "[" and bounds_str[-1] == "]":
+        first, sep, second = bounds_str[1:-1].partition("][")
+        if sep:
+            try:
+                x1, y1 = first.split(",")
+                x2, y2 = second.split(",")
+                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                return (x1, y1, x2 - x1, y2 - y1)
+            except ValueError:
+                pass
+    matches = _BOUNDS_RE.findall(bounds_str or "")
+    if len(matches) == 2:
+        x1, y1 = map(int, matches[0])
+        x2, y2 = map(int, matches[1])
+        return (x1, y1, x2 - x1, y2 - y1)
+    return (0, 0, 0, 0)
+
+
+XmlSource = Union[str, bytes, BinaryIO]
+
+
 class UiXmlParser:
-    def parse_xml(self, xml_path: str) -> Optional[UiNode]:
-        """解析 XML 文件返回根节点"""
+    def parse_xml(self, source: XmlSource) -> Optional[UiNode]:
+        """
+        解析 uiautomator dump，source 可以是文件路径、XML 字节或二进制流。
+        基于 iterparse 逐个事件构建 UiNode，元素处理完即释放，
+        不会同时保留完整的 ElementTree，也不受递归深度限制。
+        """
         try:
-            print(f"Parsing XML file: {xml_path}")
-            tree = ET.parse(xml_path)
-            root_elem = tree.getroot()
-            node = self._parse_element(root_elem)
+            if isinstance(source, str):
+                print(f"Parsing XML file: {source}")
+            elif isinstance(source, (bytes, bytearray, memoryview)):
+                source = io.BytesIO(source)
+            node = self._parse_events(ET.iterparse(source, events=("start", "end")))
+            if node is None:
+                raise ValueError("XML 中没有元素")
             print(f"XML Parsed successfully. Root bounds: {node.rect}")
             return node
         except Exception as e:
@@ -58,50 +190,51 @@ class UiXmlParser:
             traceback.print_exc()
             return None
 
-    def _parse_element(self, element: ET.Element, parent: Optional[UiNode] = None) -> UiNode:
-        attributes = element.attrib
-        
-        # 解析 bounds "[0,0][1080,1920]"
-        bounds_str = attributes.get('bounds', '[0,0][0,0]')
-        rect = self._parse_bounds(bounds_str)
+    def parse_xml_data(self, data: bytes) -> Optional[UiNode]:
+        """解析内存中的 XML 字节 (exec-out 流式 dump 的结果)"""
+        return self.parse_xml(data)
+
+    def _parse_events(self, events: Iterator[Tuple[str, ET.Element]]) -> Optional[UiNode]:
+        root: Optional[UiNode] = None
+        node_stack: List[UiNode] = []
+        elem_stack: List[ET.Element] = []
+        for event, element in events:
+            if event == "start":
+                parent = node_stack[-1] if node_stack else None
+                node = self._create_node(element.attrib, parent)
+                if parent is not None:
+                    parent.children.append(node)
+                else:
+                    root = node
+                node_stack.append(node)
+                elem_stack.append(element)
+            else:
+                node_stack.pop()
+                elem_stack.pop()
+                element.clear()
+                # 结束事件时该元素必定是父元素当前的最后一个子元素，O(1) 摘除
+                if elem_stack:
+                    del elem_stack[-1][-1]
+        return root
 
-        node = UiNode(
+    def _create_node(self, attributes: Dict[str, str], parent: Optional[UiNode] = None) -> UiNode:
+        flags = 0
+        for _, attr_name, bit in FLAG_FIELDS:
+            if attributes.get(attr_name) == "true":
+                flags |= bit
+
+        return UiNode(
             index=int(attributes.get('index', '0')),
             text=attributes.get('text', ''),
             resource_id=attributes.get('resource-id', ''),
             class_name=attributes.get('class', ''),
             package=attributes.get('package', ''),
             content_desc=attributes.get('content-desc', ''),
-            checkable=attributes.get('checkable', 'false'),
-            checked=attributes.get('checked', 'false'),
-            clickable=attributes.get('clickable', 'false'),
-            enabled=attributes.get('enabled', 'false'),
-            focusable=attributes.get('focusable', 'false'),
-            focused=attributes.get('focused', 'false'),
-            scrollable=attributes.get('scrollable', 'false'),
-            long_clickable=attributes.get('long-clickable', 'false'),
-            password=attributes.get('password', 'false'),
-            selected=attributes.get('selected', 'false'),
-            bounds_str=bounds_str,
-            rect=rect,
+            flags=flags,
+            # 解析 bounds "[0,0][1080,1920]"
+            rect=parse_bounds(attributes.get('bounds', '')),
             parent=parent
         )
 
-        # 递归处理子节点
-        for child_elem in element:
-            child_node = self._parse_element(child_elem, parent=node)
-            node.children.append(child_node)
-            
-        return node
-
     def _parse_bounds(self, bounds_str: str) -> Tuple[int, int, int, int]:
-        """解析 [x1,y1][x2,y2] 为 (x, y, w, h)"""
-        try:
-            matches = re.findall(r'\[(\d+),(\d+)\]', bounds_str)
-            if len(matches) == 2:
-                x1, y1 = map(int, matches[0])
-                x2, y2 = map(int, matches[1])
-                return (x1, y1, x2 - x1, y2 - y1)
-        except:
-            pass
-        return (0, 0, 0, 0)
+        return parse_bounds(bounds_str)
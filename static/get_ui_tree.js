@@ -1,32 +1,37 @@
 // get_ui_tree.js
+var dump = require("./ui_tree_dump.js");
+
 auto.waitFor();
 sleep(1000);
 
-function nodeToJson(node, index) {
-    if (!node) return null;
-    var r = node.bounds();
-    return {
-        index: index || 0,
-        text: node.text() || "",
-        resource_id: node.id() || "",
-        class_name: node.className() || "",
-        package: node.packageName() || "",
-        content_desc: node.desc() || "",
-        checkable: String(node.checkable()),
-        checked: String(node.checked()),
-        clickable: String(node.clickable()),
-        enabled: String(node.enabled()),
-        focusable: String(node.focusable()),
-        focused: String(node.focused()),
-        scrollable: String(node.scrollable()),
-        long_clickable: String(node.longClickable()),
-        password: String(node.password()),
-        selected: String(node.selected()),
-        bounds: "[" + r.left + "," + r.top + "][" + r.right + "," + r.bottom + "]",
-        children: node.children().map((child, i) => nodeToJson(child, i))
-    };
+// true 输出紧凑格式 (见 ui_tree_dump.js)，false 输出旧的嵌套 JSON
+var COMPACT = true;
+
+// 局部 dump 请求：主机端在启动脚本前写入 REQUEST_PATH，内容为
+// { path: [子节点下标...], rect: [left, top, right, bottom], max_depth: N }，各项均可省略
+var REQUEST_PATH = "/sdcard/autojs_ui_tree_request.json";
+
+function readRequest() {
+    if (!files.exists(REQUEST_PATH)) return null;
+    try {
+        return JSON.parse(files.read(REQUEST_PATH));
+    } finally {
+        // 请求只生效一次，之后的完整刷新不受影响
+        files.remove(REQUEST_PATH);
+    }
 }
 
-var root = auto.rootInActiveWindow || auto.root;
-var treeJson = nodeToJson(root, 0);
-files.write("/sdcard/autojs_ui_tree.json", JSON.stringify(treeJson));
\ No newline at end of file
+// 主机端通过 logcat 等待以下事件，而不是轮询 JSON 文件是否生成
+var EVENT_TAG = "PyUiViewer";
+
+try {
+    var root = auto.rootInActiveWindow || auto.root;
+    var request = readRequest();
+    // 局部 dump 只支持紧凑格式
+    var treeJson = COMPACT || request ? dump.dumpCompact(root, request) : dump.nodeToJson(root, 0);
+    files.write("/sdcard/autojs_ui_tree.json", JSON.stringify(treeJson));
+    android.util.Log.i(EVENT_TAG, "ui_tree_done " + Date.now());
+} catch (e) {
+    android.util.Log.e(EVENT_TAG, "ui_tree_error " + Date.now() + " " + e);
+    throw e;
+}
\ No newline at end of file
@@ -0,0 +1,72 @@
+// ui_tree_agent.js
+// 常驻的控件树服务：在设备本机 127.0.0.1:PORT 上监听，主机通过 adb 的 tcp 转发连接。
+// 每个请求是一行 JSON：
+//   {"cmd": "ping"}                     -> 回复 "pong"
+//   {"cmd": "dump", "scope": {...}}     -> 回复紧凑格式的控件树 (scope 同 get_ui_tree.js 的请求文件)
+//   {"cmd": "quit"}                     -> 回复 "bye" 后退出
+// 回复为 "OK <字节数>\n" 或 "ERR <字节数>\n"，后面紧跟 UTF-8 数据。一条连接可连续发多个请求。
+var dump = require("./ui_tree_dump.js");
+
+var PORT = 47329;
+var EVENT_TAG = "PyUiViewer";
+
+auto.waitFor();
+
+var server = new java.net.ServerSocket();
+server.setReuseAddress(true);
+server.bind(new java.net.InetSocketAddress("127.0.0.1", PORT));
+events.on("exit", function () {
+    server.close();
+});
+
+function reply(out, status, text) {
+    var data = new java.lang.String(text).getBytes("UTF-8");
+    out.write(new java.lang.String(status + " " + data.length + "\n").getBytes("UTF-8"));
+    out.write(data);
+    out.flush();
+}
+
+function handle(request) {
+    if (request.cmd === "ping") return "pong";
+    if (request.cmd === "dump") {
+        var root = auto.rootInActiveWindow || auto.root;
+        if (!root) throw new Error("无法获取当前窗口的根节点");
+        return JSON.stringify(dump.dumpCompact(root, request.scope || null));
+    }
+    throw new Error("未知命令: " + request.cmd);
+}
+
+function serve(socket) {
+    var reader = new java.io.BufferedReader(new java.io.InputStreamReader(socket.getInputStream(), "UTF-8"));
+    var out = new java.io.BufferedOutputStream(socket.getOutputStream());
+    var line;
+    while ((line = reader.readLine()) !== null) {
+        var request;
+        try {
+            request = JSON.parse(String(line));
+            if (request.cmd === "quit") {
+                reply(out, "OK", "bye");
+                return false;
+            }
+            reply(out, "OK", handle(request));
+        } catch (e) {
+            reply(out, "ERR", String(e));
+        }
+    }
+    return true;
+}
+
+// 主机端通过 logcat 等待就绪事件，而不是反复尝试连接
+android.util.Log.i(EVENT_TAG, "agent_ready " + Date.now() + " " + PORT);
+var running = true;
+while (running) {
+    var socket = server.accept();
+    try {
+        running = serve(socket);
+    } catch (e) {
+        android.util.Log.w(EVENT_TAG, "agent_client_error " + Date.now() + " " + e);
+    } finally {
+        socket.close();
+    }
+}
+server.close();
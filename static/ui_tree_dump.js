@@ -0,0 +1,113 @@
+// ui_tree_dump.js
+// 控件树序列化，供 get_ui_tree.js (单次 dump) 与 ui_tree_agent.js (常驻服务) 共用。
+// 需与它们放在同一目录，通过 require("./ui_tree_dump.js") 引用
+
+function nodeToJson(node, index) {
+    if (!node) return null;
+    var r = node.bounds();
+    return {
+        index: index || 0,
+        text: node.text() || "",
+        resource_id: node.id() || "",
+        class_name: node.className() || "",
+        package: node.packageName() || "",
+        content_desc: node.desc() || "",
+        checkable: String(node.checkable()),
+        checked: String(node.checked()),
+        clickable: String(node.clickable()),
+        enabled: String(node.enabled()),
+        focusable: String(node.focusable()),
+        focused: String(node.focused()),
+        scrollable: String(node.scrollable()),
+        long_clickable: String(node.longClickable()),
+        password: String(node.password()),
+        selected: String(node.selected()),
+        bounds: "[" + r.left + "," + r.top + "][" + r.right + "," + r.bottom + "]",
+        children: node.children().map((child, i) => nodeToJson(child, i))
+    };
+}
+
+// 紧凑格式：节点按先序排成一个扁平整数数组，每个节点 COMPACT_FIELDS.length 个值；
+// 字符串放进共享字符串表只存下标，布尔属性打包成位掩码，bounds 直接存数字，
+// 父节点用先序下标表示。主机端 core/autojs_parser.py 会自动识别，也兼容上面的旧格式
+var COMPACT_FORMAT = "uitree-compact";
+var COMPACT_FIELDS = [
+    "parent", "index", "text", "resource_id", "class_name", "package", "content_desc",
+    "flags", "left", "top", "right", "bottom"
+];
+// 位顺序与 core/uixml_parser.py 中的 FLAG_* 一致
+var FLAG_GETTERS = [
+    "checkable", "checked", "clickable", "enabled", "focusable",
+    "focused", "scrollable", "longClickable", "password", "selected"
+];
+
+function intersects(r, rect) {
+    return r.left < rect[2] && rect[0] < r.right && r.top < rect[3] && rect[1] < r.bottom;
+}
+
+function dumpCompact(root, request) {
+    request = request || {};
+    var path = request.path || [];
+    var rect = request.rect || null;
+    var maxDepth = request.max_depth === undefined ? -1 : request.max_depth;
+    for (var p = 0; p < path.length && root; p++) {
+        root = root.child(path[p]);
+    }
+
+    var strings = [""];
+    // 键加前缀，避免 "__proto__" 之类的文本与对象自带属性冲突
+    var stringIds = { "$": 0 };
+    function intern(value) {
+        value = value ? String(value) : "";
+        var key = "$" + value;
+        var id = stringIds[key];
+        if (id === undefined) {
+            id = strings.length;
+            strings.push(value);
+            stringIds[key] = id;
+        }
+        return id;
+    }
+
+    var nodes = [];
+    var count = 0;
+    // 显式栈代替递归，很深的 WebView 层级也不会栈溢出
+    var stack = [[root, -1, path.length ? path[path.length - 1] : 0, 0]];
+    while (stack.length) {
+        var item = stack.pop();
+        var node = item[0];
+        if (!node) continue;
+        var r = node.bounds();
+        // 与范围矩形不相交的节点连同子树一起跳过
+        if (rect && !intersects(r, rect)) continue;
+        var flags = 0;
+        for (var b = 0; b < FLAG_GETTERS.length; b++) {
+            if (node[FLAG_GETTERS[b]]()) flags |= (1 << b);
+        }
+        nodes.push(
+            item[1], item[2],
+            intern(node.text()), intern(node.id()), intern(node.className()),
+            intern(node.packageName()), intern(node.desc()),
+            flags, r.left, r.top, r.right, r.bottom
+        );
+        var offset = count++;
+        if (maxDepth >= 0 && item[3] >= maxDepth) continue;
+        for (var i = node.childCount() - 1; i >= 0; i--) {
+            stack.push([node.child(i), offset, i, item[3] + 1]);
+        }
+    }
+    return {
+        format: COMPACT_FORMAT,
+        version: 1,
+        fields: COMPACT_FIELDS,
+        scope: request,
+        strings: strings,
+        nodes: nodes
+    };
+}
+
+module.exports = {
+    COMPACT_FORMAT: COMPACT_FORMAT,
+    nodeToJson: nodeToJson,
+    dumpCompact: dumpCompact
+};
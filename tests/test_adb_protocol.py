@@ -0,0 +1,169 @@
+import os
+import socket
+import struct
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.adb_client import AdbClient
+from core.adb_protocol import AdbProtocolError, AdbServerClient, encode_request
+
+
+class FakeAdbServer:
+    """
+    本地假的 adb server：支持 host:transport-any、sync: 的 STAT，以及 shell:。
+    drop_idle() 关闭所有已建立的连接，模拟 server 重启或设备断开后池中的失效连接；
+    reset_shell 为 True 时 shell 连接直接以 RST 断开，sync 的 RECV 请求总是以 RST 断开。
+    """
+
+    def __init__(self) -> None:
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        self.connections = []
+        self.opened = 0
+        self.reset_shell = False
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def close(self) -> None:
+        self.listener.close()
+        self.drop_idle()
+
+    def drop_idle(self, reset: bool = False) -> None:
+        with self._lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            if reset:
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections.append(conn)
+                self.opened += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _read_exact(conn: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def _read_request(self, conn: socket.socket) -> str:
+        length = int(self._read_exact(conn, 4), 16)
+        return self._read_exact(conn, length).decode("utf-8")
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            request = self._read_request(conn)
+            if request.endswith(":features"):
+                conn.sendall(b"OKAY" + encode_request("cmd"))
+                return
+            if request != "host:transport-any":
+                conn.sendall(b"FAIL" + encode_request("unknown host service"))
+                return
+            conn.sendall(b"OKAY")
+            service = self._read_request(conn)
+            if service == "sync:":
+                conn.sendall(b"OKAY")
+                self._serve_sync(conn)
+            elif service.startswith("shell:"):
+                if self.reset_shell:
+                    conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                    return
+                conn.sendall(b"OKAY" + b"hello\n__PYADB_RC__0\n")
+            else:
+                conn.sendall(b"FAIL" + encode_request("unknown service"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _serve_sync(self, conn: socket.socket) -> None:
+        while True:
+            header = self._read_exact(conn, 8)
+            command, length = header[:4], struct.unpack("<I", header[4:])[0]
+            path = self._read_exact(conn, length)
+            if command == b"RECV":
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                return
+            if command != b"STAT":
+                return
+            mode = 0o100644 if path == b"/sdcard/a.txt" else 0
+            conn.sendall(b"STAT" + struct.pack("<III", mode, 5 if mode else 0, 0))
+
+
+class AdbServerClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FakeAdbServer()
+        self.client = AdbServerClient(port=self.server.port, timeout=5)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.close()
+
+    def test_sync_connection_is_reused(self) -> None:
+        self.assertEqual(self.client.stat("/sdcard/a.txt")[1], 5)
+        self.assertEqual(self.client.stat("/sdcard/missing")[0], 0)
+        self.assertEqual(self.server.opened, 1)
+
+    def test_stale_pooled_connection_closed_is_retried(self) -> None:
+        self.client.stat("/sdcard/a.txt")
+        self.server.drop_idle()
+        self.assertEqual(self.client.stat("/sdcard/a.txt")[1], 5)
+        self.assertEqual(self.server.opened, 2)
+
+    def test_stale_pooled_connection_reset_is_retried(self) -> None:
+        self.client.stat("/sdcard/a.txt")
+        self.server.drop_idle(reset=True)
+        self.assertEqual(self.client.stat("/sdcard/a.txt")[1], 5)
+        self.assertEqual(self.server.opened, 2)
+
+    def test_reset_on_fresh_connection_is_protocol_error(self) -> None:
+        # 新连接上的 RST 不重试，以 AdbProtocolError 报告而不是原始的 OSError
+        with self.assertRaises(AdbProtocolError):
+            self.client.pull_bytes("/sdcard/a.txt")
+        self.assertEqual(self.server.opened, 1)
+
+
+class AdbClientServerErrorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FakeAdbServer()
+        self.client = AdbClient(server_port=self.server.port)
+        self.client.shell_session = None
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.close()
+
+    def test_shell_via_server(self) -> None:
+        result = self.client._run(["shell", "echo", "hello"])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "hello\n")
+
+    def test_connection_reset_becomes_failed_result(self) -> None:
+        self.server.reset_shell = True
+        result = self.client._run(["shell", "echo", "hello"])
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("adb: error", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import contextlib
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.autojs_agent import AutoJsAgent, AutoJsAgentError
+from core.capture_pipeline import CancelToken, CaptureCancelled
+
+
+class StubEvents:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+    def wait_for(self, predicate, timeout, cancel_token=None):
+        raise self.error
+
+
+class StubAdbClient:
+    """代理端口无人监听 (连接被拒绝)，推送 / 启动 / 事件流按需抛出指定异常"""
+
+    server = None
+
+    def __init__(self, push_error=None, run_error=None, event_error=None) -> None:
+        self.push_error = push_error
+        self.run_error = run_error
+        self.event_error = event_error or RuntimeError("设备事件流已断开 (logcat 退出或设备断开)")
+
+    def _run(self, args, **kwargs):
+        # adb forward tcp:0 分配到本机一个没有监听的端口
+        return subprocess.CompletedProcess(args, 0, "1\n", "")
+
+    def push_autojs_script(self, script_name, remote_script_path, cancel_token=None):
+        if self.push_error is not None:
+            raise self.push_error
+
+    def run_autojs_script(self, remote_script_path, cancel_token=None):
+        if self.run_error is not None:
+            raise self.run_error
+
+    @contextlib.contextmanager
+    def listen_device_events(self):
+        yield StubEvents(self.event_error)
+
+
+class AutoJsAgentStartTest(unittest.TestCase):
+    def test_start_errors_become_agent_error(self) -> None:
+        clients = [
+            StubAdbClient(push_error=RuntimeError("推送 AutoJs 脚本到设备失败")),
+            StubAdbClient(run_error=RuntimeError("启动 AutoJs 脚本失败")),
+            StubAdbClient(),
+        ]
+        for client in clients:
+            with self.assertRaises(AutoJsAgentError):
+                AutoJsAgent(client).dump()
+
+    def test_cancel_is_not_wrapped(self) -> None:
+        client = StubAdbClient(event_error=CaptureCancelled("采集已取消"))
+        with self.assertRaises(CaptureCancelled) as ctx:
+            AutoJsAgent(client).dump(cancel_token=CancelToken())
+        self.assertNotIsInstance(ctx.exception, AutoJsAgentError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.adb_client import AdbClient
+from core.capture_scheduler import CaptureScheduler
+
+
+class CaptureSchedulerTest(unittest.TestCase):
+    def test_client_factory_failure_is_reported(self) -> None:
+        def factory(serial):
+            raise RuntimeError(f"设备 {serial} 未连接或未授权")
+
+        results = CaptureScheduler(["a", "b"], client_factory=factory).run()
+        self.assertEqual(sorted(result.serial for result in results), ["a", "b"])
+        self.assertTrue(all(not result.ok for result in results))
+
+    def test_failure_before_pipeline_has_no_stale_timings(self) -> None:
+        client = AdbClient(serial="emulator-5554")
+        # 上一轮采集留下的耗时
+        client.pipeline.last_timings = {"screenshot": 0.2, "ui_xml": 0.3, "total": 0.3}
+
+        def ensure_device():
+            raise RuntimeError("设备 emulator-5554 未连接或未授权")
+
+        client._ensure_device = ensure_device
+        results = CaptureScheduler(["emulator-5554"], client_factory=lambda serial: client).run()
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0].ok)
+        self.assertEqual(results[0].timings, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.json_stream import END_ARRAY, END_MAP, MAP_KEY, START_ARRAY, START_MAP, VALUE, JsonStreamTokenizer
+
+MALFORMED = [
+    "[1,]", '{"a" 1}', "{,}", "[,1]", "[1 2]", '{"a":1,}', '{"a":}', '{"a"}', "[1,,2]",
+    '{"a":1 "b":2}', "{1:2}", "[}", "{]", "[]]", '"x" 1', "[1:2]", '{"a"::1}', '["a" "b"]', "[{}{}]", "[1",
+]
+
+
+def tokenize(text: str, chunk_size: int = 256 * 1024):
+    return list(JsonStreamTokenizer(io.BytesIO(text.encode("utf-8")), chunk_size=chunk_size))
+
+
+class JsonStreamTokenizerTest(unittest.TestCase):
+    def test_events(self) -> None:
+        self.assertEqual(
+            tokenize('{"a": [1, 2.5, "中文"], "b": {"c": null}}', chunk_size=3),
+            [
+                (START_MAP, None), (MAP_KEY, "a"), (START_ARRAY, None), (VALUE, 1), (VALUE, 2.5),
+                (VALUE, "中文"), (END_ARRAY, None), (MAP_KEY, "b"), (START_MAP, None), (MAP_KEY, "c"),
+                (VALUE, None), (END_MAP, None), (END_MAP, None),
+            ],
+        )
+
+    def test_rejects_malformed_like_json(self) -> None:
+        # 与 json.load 的判断一致，否则同一份损坏的导出会因文件大小不同而解析出不同结果
+        for text in MALFORMED:
+            with self.assertRaises(ValueError, msg=text):
+                json.loads(text)
+            for chunk_size in (1, 4, 1024):
+                with self.assertRaises(ValueError, msg=f"{text!r} chunk_size={chunk_size}"):
+                    tokenize(text, chunk_size)
+
+    def test_deep_nesting(self) -> None:
+        depth = 50000
+        self.assertEqual(len(tokenize("[" * depth + "]" * depth)), depth * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.partial_dump import DumpScope, apply_scope, merge_partial
+from core.uixml_parser import UiNode
+
+
+def build_tree() -> UiNode:
+    # <hierarchy> 根没有 bounds；1 号子节点面积为 0、位于原点
+    root = UiNode(index=0)
+    for index, rect in enumerate([(0, 0, 1080, 1200), (0, 0, 0, 0), (0, 1200, 1080, 1200)]):
+        root.children.append(UiNode(index=index, class_name=f"View{index}", rect=rect, parent=root))
+    return root
+
+
+class PartialDumpTest(unittest.TestCase):
+    def test_rect_scope_matches_device_filter(self) -> None:
+        # 与 ui_tree_dump.js 一致：没有 bounds 的根保留，面积为 0 的节点不与任何矩形相交
+        partial = apply_scope(build_tree(), DumpScope.for_rect((0, 0, 540, 600)))
+        self.assertIsNotNone(partial)
+        self.assertEqual([child.index for child in partial.children], [0])
+
+    def test_merge_keeps_nodes_outside_rect(self) -> None:
+        root = build_tree()
+        scope = DumpScope.for_rect((0, 0, 540, 600))
+        fresh = UiNode(index=0)
+        fresh.children.append(UiNode(index=0, class_name="Changed", rect=(0, 0, 1080, 1200), parent=fresh))
+        merge_partial(root, fresh, scope)
+        self.assertEqual([child.class_name for child in root.children], ["Changed", "View1", "View2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.push_cache import PushCache
+
+
+class PushCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "push_cache.json")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_set_many_saves_once(self) -> None:
+        cache = PushCache(self.path)
+        saves = []
+        original_save = cache._save
+        cache._save = lambda: (saves.append(1), original_save())
+        cache.set_many("dev", {f"/sdcard/{i}.js": f"md5-{i}" for i in range(50)})
+        cache.set_many("dev", {"/sdcard/0.js": "md5-0"})
+        self.assertEqual(len(saves), 1)
+        self.assertEqual(PushCache(self.path).get("dev", "/sdcard/49.js"), "md5-49")
+
+    def test_concurrent_set_keeps_every_entry(self) -> None:
+        cache = PushCache(self.path)
+
+        def worker(offset: int) -> None:
+            for i in range(20):
+                cache.set("dev", f"/sdcard/{offset}_{i}.js", "md5")
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reloaded = PushCache(self.path)
+        for n in range(4):
+            for i in range(20):
+                self.assertEqual(reloaded.get("dev", f"/sdcard/{n}_{i}.js"), "md5")
+
+    def test_shared_returns_one_instance_per_path(self) -> None:
+        self.assertIs(PushCache.shared(self.path), PushCache.shared(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
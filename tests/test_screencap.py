@@ -0,0 +1,59 @@
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.adb_client import AdbClient
+from core.screencap import TruncatedFrameError, parse_raw_frame
+
+FRAME = struct.pack("<IIII", 2, 2, 1, 0) + bytes(range(16))
+
+
+class ReadRawFrameTest(unittest.TestCase):
+    def test_header_sizes(self) -> None:
+        self.assertEqual(parse_raw_frame(FRAME).offset, 16)
+        frame = parse_raw_frame(FRAME[:12] + FRAME[16:])
+        self.assertEqual(frame.offset, 12)
+        self.assertEqual(bytes(frame.pixels), bytes(range(16)))
+
+    def test_short_read_is_truncated(self) -> None:
+        for data in (FRAME[:5], FRAME[:20], FRAME[:-1]):
+            with self.assertRaises(TruncatedFrameError):
+                parse_raw_frame(data)
+
+    def test_unknown_format_is_not_truncated(self) -> None:
+        for data in (struct.pack("<III", 2, 2, 99) + bytes(16), FRAME + b"xx"):
+            with self.assertRaises(ValueError) as ctx:
+                parse_raw_frame(data)
+            self.assertNotIsInstance(ctx.exception, TruncatedFrameError)
+
+
+class RawScreencapFallbackTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = AdbClient(serial="emulator-5554")
+        self.client._capture_screenshot = lambda local_path, cancel_token=None: None
+
+    def tearDown(self) -> None:
+        self.client.close()
+
+    def capture(self, error: ValueError) -> dict:
+        def raw(cancel_token=None):
+            raise error
+        self.client._capture_screenshot_raw = raw
+        result = {}
+        self.client._capture_screenshot_into("screen.png", result, raw=True)
+        return result
+
+    def test_truncated_frame_falls_back_once(self) -> None:
+        self.assertIn("screenshot", self.capture(TruncatedFrameError("screencap 输出不完整")))
+        self.assertIsNot(self.client._raw_screencap_supported, False)
+
+    def test_unknown_format_disables_raw(self) -> None:
+        self.assertIn("screenshot", self.capture(ValueError("不支持的 screencap 像素格式")))
+        self.assertIs(self.client._raw_screencap_supported, False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,24 +1,56 @@
 import os
 import json
-from typing import Optional, Set
+import threading
+import time
+from typing import Optional, Tuple
 
-from PyQt5.QtCore import Qt, QModelIndex, QSortFilterProxyModel, QUrl
-from PyQt5.QtGui import QPixmap, QStandardItemModel, QStandardItem, QPen, QColor, QBrush, QDesktopServices
+from PyQt5.QtCore import Qt, QBuffer, QPointF, QIODevice, QModelIndex, QSortFilterProxyModel, QTimer, QUrl, pyqtSignal
+from PyQt5 import sip
+from PyQt5.QtGui import QImage, QPixmap, QStandardItemModel, QStandardItem, QPen, QColor, QBrush, QDesktopServices
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QToolBar, 
     QSplitter, QTreeView, QTableWidget, QTableWidgetItem, 
-    QGraphicsView, QGraphicsScene, QGraphicsRectItem, QMessageBox, 
+    QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsSimpleTextItem, QGraphicsItem, QMessageBox, 
     QAbstractItemView, QLineEdit, QComboBox, QMenu, QDialog,
     QDialogButtonBox, QCheckBox, QGroupBox, QPlainTextEdit,
-    QPushButton, QApplication
+    QPushButton, QApplication, QSpinBox, QLabel, QFileDialog
 )
 
 from core.adb_client import AdbClient
 from core.uixml_parser import UiXmlParser, UiNode
 from core.autojs_parser import AutoJsTreeParser
+from core.change_detect import ChangeDetector
+from core.snapshot_store import SnapshotColumns
+from core.snapshot_cache import ParsedSnapshotCache
+from core.partial_dump import DumpScope, apply_scope, merge_partial, node_path
+from core.snapshot_archive import SNAPSHOT_EXTENSION, SnapshotArchive, write_snapshot_archive
+from core.screencap import (
+    RawFrame, PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888, PIXEL_FORMAT_RGB_888,
+    PIXEL_FORMAT_RGB_565, PIXEL_FORMAT_BGRA_8888,
+)
 from ui.script_editor import ScriptEditorWindow
 
 
+_QIMAGE_FORMATS = {
+    PIXEL_FORMAT_RGBA_8888: QImage.Format_RGBA8888,
+    PIXEL_FORMAT_RGBX_8888: QImage.Format_RGBX8888,
+    PIXEL_FORMAT_RGB_888: QImage.Format_RGB888,
+    PIXEL_FORMAT_RGB_565: QImage.Format_RGB16,
+    # 小端序下 BGRA 字节序即 ARGB32
+    PIXEL_FORMAT_BGRA_8888: QImage.Format_ARGB32,
+}
+
+
+def raw_frame_to_qimage(frame: RawFrame) -> QImage:
+    """直接引用 RawFrame 的 buffer 构造 QImage，不复制像素；调用方需保证 frame 存活"""
+    address = int(sip.voidptr(frame.buffer)) + frame.offset
+    return QImage(sip.voidptr(address), frame.width, frame.height, frame.stride, _QIMAGE_FORMATS[frame.pixel_format])
+
+
+# 树节点 item 上保存该节点在 SnapshotColumns 中的先序下标
+NODE_INDEX_ROLE = Qt.UserRole + 1
+
+
 class NodeFilterProxyModel(QSortFilterProxyModel):
     """
     自定义过滤器模型，支持关键字和类型的多重过滤
@@ -27,48 +59,50 @@ class NodeFilterProxyModel(QSortFilterProxyModel):
         super().__init__(parent)
         self.filter_text = ""
         self.filter_class = "All"
+        self.columns: Optional[SnapshotColumns] = None
+        # 每个节点自身是否匹配，按先序下标索引；过滤条件或快照变化时整体重算
+        self.match_mask = None
         # 关键：启用递归过滤，这样如果子节点匹配，父节点也会显示
         self.setRecursiveFilteringEnabled(True)
 
+    def set_columns(self, columns: Optional[SnapshotColumns]):
+        self.columns = columns
+        self._update_match_mask()
+        self.invalidateFilter()
+
     def set_filter_text(self, text: str):
         self.filter_text = text.lower()
+        self._update_match_mask()
         self.invalidateFilter()
 
     def set_filter_class(self, class_name: str):
         self.filter_class = class_name
+        self._update_match_mask()
         self.invalidateFilter()
 
+    def _update_match_mask(self):
+        if self.columns is None or (not self.filter_text and self.filter_class == "All"):
+            self.match_mask = None
+            return
+        # 类型筛选 + 关键字搜索 (文本、资源ID、描述、类名)，在列式快照上一次算完
+        self.match_mask = self.columns.match_mask(self.filter_text, self.filter_class)
+
     def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
-        # 获取当前行的数据
-        model = self.sourceModel()
-        index = model.index(source_row, 0, source_parent)
-        item = model.itemFromIndex(index)
-        
-        if not item:
+        if self.match_mask is None:
+            return True
+        index = self.sourceModel().index(source_row, 0, source_parent)
+        row = index.data(NODE_INDEX_ROLE)
+        if row is None:
             return False
-            
-        node: UiNode = item.data(Qt.UserRole)
-        if not node:
-            return False
-
-        # 1. 类型筛选 (Class Filter)
-        if self.filter_class != "All":
-            # 简单判断：如果节点类名不包含筛选词
-            if self.filter_class not in node.class_name:
-                return False
-
-        # 2. 关键字搜索 (Keyword Search)
-        if self.filter_text:
-            # 搜索范围：文本、资源ID、描述、类名
-            content = f"{node.text} {node.resource_id} {node.content_desc} {node.class_name}".lower()
-            if self.filter_text not in content:
-                return False
-        
-        return True
+        return bool(self.match_mask[row])
 
 
 class ScreenCanvas(QGraphicsView):
     """自定义的画布，用于显示截图和处理点击"""
+
+    # 悬停查找的最小间隔 (ms)；间隔内的移动只保留最后一个位置
+    HOVER_INTERVAL_MS = 30
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.scene = QGraphicsScene(self)
@@ -79,11 +113,52 @@ class ScreenCanvas(QGraphicsView):
         self.pixmap_item = None
         self.rect_item = None
         self.current_pixmap = None
+        self.current_frame: Optional[RawFrame] = None
+
+        # 悬停模式：高亮框和提示各只有一个图元，移动时只改位置和内容
+        self.hover_enabled = False
+        self.hover_rect_item = None
+        self.hover_label_item = None
+        self.hover_text_item = None
+        # 当前悬停高亮的节点下标 (SnapshotColumns 中的先序编号)
+        self.hover_index: Optional[int] = None
+        self._hover_pending: Optional[Tuple[int, int]] = None
+        self._hover_last: Optional[Tuple[int, int]] = None
+        self._hover_timer = QTimer(self)
+        self._hover_timer.setSingleShot(True)
+        self._hover_timer.setInterval(self.HOVER_INTERVAL_MS)
+        self._hover_timer.timeout.connect(self._flush_hover)
+        self.setMouseTracking(True)
+        self.viewport().setMouseTracking(True)
 
     def set_image(self, image_path: str):
+        self.current_frame = None
+        self._set_pixmap(QPixmap(image_path))
+
+    def set_image_data(self, data: bytes):
+        """显示内存中的 PNG 等编码图片"""
+        self.current_frame = None
+        pixmap = QPixmap()
+        pixmap.loadFromData(data)
+        self._set_pixmap(pixmap)
+
+    def set_frame(self, frame: RawFrame):
+        """显示原始帧：像素由 QImage 直接引用，只在转换为 QPixmap 时上传一次"""
+        self.current_frame = frame
+        self._set_pixmap(QPixmap.fromImage(raw_frame_to_qimage(frame)))
+
+    def _set_pixmap(self, pixmap: QPixmap):
         self.scene.clear()
-        self.current_pixmap = QPixmap(image_path)
+        self.current_pixmap = pixmap
+        # scene.clear() 已删除旧的悬停图元
+        self.hover_rect_item = None
+        self.hover_label_item = None
+        self.hover_text_item = None
+        self.hover_index = None
+        self._hover_last = None
         if self.current_pixmap.isNull():
+            self.pixmap_item = None
+            self.rect_item = None
             return
         
         self.pixmap_item = self.scene.addPixmap(self.current_pixmap)
@@ -95,9 +170,32 @@ class ScreenCanvas(QGraphicsView):
         self.rect_item.setZValue(10)
         self.scene.addItem(self.rect_item)
         self.rect_item.hide()
+
+        self._create_hover_items()
         
         self.fit_image()
 
+    def _create_hover_items(self):
+        self.hover_rect_item = QGraphicsRectItem(0, 0, 0, 0)
+        pen = QPen(QColor(30, 144, 255), 2)
+        pen.setCosmetic(True)
+        self.hover_rect_item.setPen(pen)
+        self.hover_rect_item.setBrush(QBrush(QColor(30, 144, 255, 40)))
+        self.hover_rect_item.setZValue(9)
+        self.scene.addItem(self.hover_rect_item)
+        self.hover_rect_item.hide()
+
+        # 提示不随截图缩放，始终按屏幕像素大小绘制
+        self.hover_label_item = QGraphicsRectItem(0, 0, 0, 0)
+        self.hover_label_item.setPen(QPen(Qt.NoPen))
+        self.hover_label_item.setBrush(QBrush(QColor(0, 0, 0, 180)))
+        self.hover_label_item.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        self.hover_label_item.setZValue(11)
+        self.hover_text_item = QGraphicsSimpleTextItem(self.hover_label_item)
+        self.hover_text_item.setBrush(QBrush(Qt.white))
+        self.scene.addItem(self.hover_label_item)
+        self.hover_label_item.hide()
+
     def fit_image(self):
         if self.pixmap_item:
             self.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
@@ -111,31 +209,104 @@ class ScreenCanvas(QGraphicsView):
             self.rect_item.setRect(x, y, w, h)
             self.rect_item.show()
 
+    def _image_pos(self, view_pos) -> Tuple[int, int]:
+        """视图坐标 -> 截图像素坐标"""
+        item_pos = self.pixmap_item.mapFromScene(self.mapToScene(view_pos))
+        return int(item_pos.x()), int(item_pos.y())
+
+    def _in_image(self, x: int, y: int) -> bool:
+        return 0 <= x < self.pixmap_item.pixmap().width() and 0 <= y < self.pixmap_item.pixmap().height()
+
     def mousePressEvent(self, event):
         if not self.pixmap_item:
             return
             
         scene_pos = self.mapToScene(event.pos())
-        item_pos = self.pixmap_item.mapFromScene(scene_pos)
-        
-        x = int(item_pos.x())
-        y = int(item_pos.y())
-        
-        img_w = self.pixmap_item.pixmap().width()
-        img_h = self.pixmap_item.pixmap().height()
+        x, y = self._image_pos(event.pos())
         
         print(f"DEBUG: Clicked View({event.pos().x()}, {event.pos().y()}) -> Scene({scene_pos.x():.1f}, {scene_pos.y():.1f}) -> Image({x}, {y})")
 
-        if 0 <= x < img_w and 0 <= y < img_h:
+        if self._in_image(x, y):
             if self.main_window:
                 self.main_window.on_screenshot_clicked(x, y)
         else:
+            img_w = self.pixmap_item.pixmap().width()
+            img_h = self.pixmap_item.pixmap().height()
             print(f"DEBUG: Click out of image bounds (0,0 - {img_w},{img_h})")
                 
         super().mousePressEvent(event)
 
+    # ---- 悬停 ----
+
+    def set_hover_enabled(self, enabled: bool):
+        self.hover_enabled = enabled
+        if not enabled:
+            self._reset_hover()
+
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        if not self.hover_enabled or not self.pixmap_item:
+            return
+        self._hover_pending = self._image_pos(event.pos())
+        # 节流：空闲时立即查找，之后每个间隔最多查找一次，只处理最新位置
+        if not self._hover_timer.isActive():
+            self._flush_hover()
+
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self._reset_hover()
+
+    def _reset_hover(self):
+        self._hover_timer.stop()
+        self._hover_pending = None
+        self._hover_last = None
+        self.clear_hover()
+
+    def _flush_hover(self):
+        pos, self._hover_pending = self._hover_pending, None
+        if pos is None or not self.hover_enabled or not self.pixmap_item:
+            # 间隔内没有新的移动，节流结束
+            return
+        self._hover_timer.start()
+        if pos == self._hover_last:
+            return
+        self._hover_last = pos
+        if not self._in_image(*pos):
+            self.clear_hover()
+        elif self.main_window:
+            self.main_window.on_screenshot_hovered(*pos)
+
+    def show_hover(self, index: int, rect: Tuple[int, int, int, int], label: str):
+        """高亮悬停的节点；复用已有图元，只更新位置与文字"""
+        if self.hover_rect_item is None:
+            return
+        x, y, w, h = rect
+        self.hover_index = index
+        self.hover_rect_item.setRect(x, y, w, h)
+        self.hover_rect_item.show()
+
+        self.hover_text_item.setText(label)
+        text_rect = self.hover_text_item.boundingRect()
+        label_w, label_h = text_rect.width() + 6, text_rect.height() + 4
+        # 节点上方放得下时贴在框外上沿，否则放在框内左上角 (提示按屏幕像素计算)
+        offset = -label_h if self.mapFromScene(QPointF(x, y)).y() >= label_h else 0
+        self.hover_label_item.setRect(0, offset, label_w, label_h)
+        self.hover_text_item.setPos(3, offset + 2)
+        self.hover_label_item.setPos(QPointF(x, y))
+        self.hover_label_item.show()
+
+    def clear_hover(self):
+        self.hover_index = None
+        if self.hover_rect_item is not None:
+            self.hover_rect_item.hide()
+            self.hover_label_item.hide()
+
 
 class MainWindow(QMainWindow):
+    live_snapshot_ready = pyqtSignal(str, object)
+    live_capture_failed = pyqtSignal(str)
+    device_status_changed = pyqtSignal()
+
     def __init__(self, parent=None) -> None:
         super().__init__(parent)
         self.adb_client = AdbClient()
@@ -143,9 +314,29 @@ class MainWindow(QMainWindow):
         self.autojs_parser = AutoJsTreeParser()
         self.root_node: Optional[UiNode] = None
         self.current_node: Optional[UiNode] = None
+        self.columns: Optional[SnapshotColumns] = None
+        self.tree_items = []
+        # 当前快照的采集信息 (保存存档时写入)；从存档打开时保留存档对象，截图像素仍引用其映射内存
+        self.snapshot_meta: dict = {}
+        self.snapshot_archive: Optional[SnapshotArchive] = None
         self.script_editor = None
+        self.change_detector = ChangeDetector()
+        self.snapshot_cache = ParsedSnapshotCache()
+        # 当前显示的树在解析缓存中的键；局部刷新会原地修改树，需要把它移出缓存
+        self._tree_cache_key: Optional[str] = None
+        self._live_busy = False
+        # 实时采集进行中时用户要求立即刷新：当前这次结束后马上再采集一次
+        self._live_refresh_pending = False
+        # 所有采集 (手动、局部、实时后台线程) 都经过这把锁，同一个 AdbClient 上不会有两次采集交错
+        self._capture_lock = threading.Lock()
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.timeout.connect(self._start_live_capture)
+        self.live_snapshot_ready.connect(self._on_live_snapshot)
+        self.live_capture_failed.connect(self._on_live_capture_failed)
         
         self._init_ui()
+        self._init_device_tracking()
 
     def _init_ui(self) -> None:
         self.setWindowTitle("Python UIAutomatorViewer")
@@ -162,7 +353,30 @@ class MainWindow(QMainWindow):
 
         refresh_action = toolbar.addAction("刷新")
         refresh_action.triggered.connect(self.refresh_snapshot)
+
+        self.live_action = toolbar.addAction("实时")
+        self.live_action.setCheckable(True)
+        self.live_action.toggled.connect(self.toggle_live_mode)
+
+        self.live_interval_spin = QSpinBox()
+        self.live_interval_spin.setRange(200, 10000)
+        self.live_interval_spin.setSingleStep(100)
+        self.live_interval_spin.setValue(1000)
+        self.live_interval_spin.setSuffix(" ms")
+        self.live_interval_spin.setToolTip("实时模式两次采集之间的间隔")
+        toolbar.addWidget(self.live_interval_spin)
+
+        self.hover_action = toolbar.addAction("悬停")
+        self.hover_action.setCheckable(True)
+        self.hover_action.setToolTip("鼠标在截图上移动时高亮指针下的控件")
+        self.hover_action.toggled.connect(self.toggle_hover_mode)
         
+        open_snapshot_action = toolbar.addAction("打开快照")
+        open_snapshot_action.triggered.connect(self.open_snapshot_archive)
+
+        save_snapshot_action = toolbar.addAction("保存快照")
+        save_snapshot_action.triggered.connect(self.save_snapshot_archive)
+
         script_editor_action = toolbar.addAction("脚本编辑")
         script_editor_action.triggered.connect(self.open_script_editor)
 
@@ -206,6 +420,8 @@ class MainWindow(QMainWindow):
         self.tree_view = QTreeView()
         self.tree_view.setHeaderHidden(True)
         self.tree_view.clicked.connect(self.on_tree_node_clicked)
+        self.tree_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tree_view.customContextMenuRequested.connect(self.on_tree_context_menu)
         
         # 模型设置：StandardModel -> ProxyModel -> View
         self.tree_model = QStandardItemModel()
@@ -237,6 +453,30 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(main_splitter)
 
+    def _init_device_tracking(self) -> None:
+        self.device_status_label = QLabel("设备: 检测中...")
+        self.statusBar().addPermanentWidget(self.device_status_label)
+        tracker = self.adb_client.device_tracker()
+        if tracker is None:
+            self.device_status_label.setText("")
+            return
+        # 跟踪器回调运行在后台线程，经信号转到 UI 线程刷新
+        tracker.on_connected(lambda info: self.device_status_changed.emit())
+        tracker.on_disconnected(lambda info: self.device_status_changed.emit())
+        self.device_status_changed.connect(self._update_device_status)
+        self._update_device_status()
+
+    def _update_device_status(self) -> None:
+        tracker = self.adb_client.device_tracker()
+        online = [info for info in tracker.devices().values() if info.online]
+        if self.adb_client.serial:
+            online = [info for info in online if info.serial == self.adb_client.serial]
+        if not online:
+            self.device_status_label.setText("设备: 未连接")
+            return
+        labels = [f"{info.model} ({info.serial})" if info.model else info.serial for info in online]
+        self.device_status_label.setText("设备: " + ", ".join(labels))
+
     def open_autojs6_doc(self) -> None:
         """打开 AutoJs6 本地 HTML 文档"""
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -268,63 +508,319 @@ class MainWindow(QMainWindow):
         self.proxy_model.set_filter_class(text)
         self.tree_view.expandAll()
 
+    def _capture(self, source: str, scope: Optional[DumpScope] = None) -> dict:
+        """采集一次快照；本次的各阶段耗时放在结果的 "timings" 中，不受之后的采集影响"""
+        with self._capture_lock:
+            if source == "AutoJs":
+                snapshot = self.adb_client.capture_snapshot_via_autojs(raw_screenshot=True, scope=scope)
+            else:
+                snapshot = self.adb_client.capture_snapshot(stream_xml=True, raw_screenshot=True)
+            snapshot["timings"] = self.adb_client.last_capture_timings
+        return snapshot
+
     def refresh_snapshot(self) -> None:
+        if self.live_action.isChecked():
+            # 实时模式下由后台线程负责采集：清掉比较基准并立即采集一次，下一份结果完整重建
+            self.change_detector.reset()
+            self._schedule_live_capture(0)
+            self.statusBar().showMessage("实时模式：正在重新采集")
+            return
         try:
             source = self.source_combo.currentText() if hasattr(self, "source_combo") else "uiautomator"
-            if source == "AutoJs":
-                snapshot = self.adb_client.capture_snapshot_via_autojs()
-                screenshot_path = snapshot.get("screenshot")
-                json_path = snapshot.get("autojs_json")
-
-                if screenshot_path and os.path.exists(screenshot_path):
-                    self.screen_canvas.set_image(screenshot_path)
-
-                if json_path and os.path.exists(json_path):
-                    self.root_node = self.autojs_parser.parse_json(json_path)
-                    if self.root_node:
-                        self.build_tree(self.root_node)
-                        print("DEBUG: Tree built successfully from AutoJs JSON")
-                    else:
-                        QMessageBox.warning(self, "解析警告", "AutoJs JSON 解析失败，无法显示控件树")
+            snapshot = self._capture(source)
+            # 手动刷新总是完整重建；显示成功后才记为实时模式的比较基准
+            self._apply_snapshot(source, snapshot)
+            self.change_detector.commit(snapshot)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+            import traceback
+            traceback.print_exc()
+
+    def _apply_snapshot(
+        self, source: str, snapshot: dict, screen_changed: bool = True, tree_changed: bool = True, live: bool = False
+    ) -> None:
+        self._show_capture_timings(snapshot)
+        self.snapshot_archive = None
+        self.snapshot_meta = {
+            "source": source,
+            "serial": self.adb_client.serial,
+            "captured_at": time.time(),
+            "timings": snapshot.get("timings", {}),
+        }
+        if screen_changed:
+            self._show_snapshot_image(snapshot)
+        if not tree_changed:
+            return
+
+        # 同一份 dump 已解析过：直接复用树和索引；仍是当前显示的树时连树视图也不重建
+        tree_digest = ChangeDetector.ensure_digests(snapshot)[1]
+        cache_key = f"{source}:{tree_digest}" if tree_digest else None
+        cached = self.snapshot_cache.get(cache_key)
+        self._tree_cache_key = cache_key
+        if cached is not None:
+            if cached.root is not self.root_node:
+                self.root_node = cached.root
+                self.build_tree(cached.root, cached.columns)
+            print("DEBUG: Tree reused from parse cache")
+            return
+
+        if source == "AutoJs":
+            json_path = snapshot.get("autojs_json")
+            if json_path and os.path.exists(json_path):
+                self.root_node = self.autojs_parser.parse_json(json_path, progress=self._show_parse_progress)
+                if self.root_node:
+                    self.build_tree(self.root_node)
+                    self.snapshot_cache.put(cache_key, self.root_node, self.columns)
+                    print("DEBUG: Tree built successfully from AutoJs JSON")
+                elif not live:
+                    QMessageBox.warning(self, "解析警告", "AutoJs JSON 解析失败，无法显示控件树")
+            elif not live:
+                QMessageBox.warning(self, "数据缺失", "未能获取到 AutoJs UI 树 JSON 文件")
+        else:
+            xml_data = snapshot.get("xml_data")
+            xml_path = snapshot.get("xml")
+            if xml_data or (xml_path and os.path.exists(xml_path)):
+                if xml_data:
+                    self.root_node = self.xml_parser.parse_xml_data(xml_data)
                 else:
-                    QMessageBox.warning(self, "数据缺失", "未能获取到 AutoJs UI 树 JSON 文件")
-            else:
-                snapshot = self.adb_client.capture_snapshot()
-                screenshot_path = snapshot.get("screenshot")
-                xml_path = snapshot.get("xml")
-                
-                if screenshot_path and os.path.exists(screenshot_path):
-                    self.screen_canvas.set_image(screenshot_path)
-                
-                if xml_path and os.path.exists(xml_path):
                     self.root_node = self.xml_parser.parse_xml(xml_path)
-                    if self.root_node:
-                        self.build_tree(self.root_node)
-                        print("DEBUG: Tree built successfully")
-                    else:
-                        QMessageBox.warning(self, "解析警告", "XML 解析失败，无法显示控件树")
-                else:
-                    QMessageBox.warning(self, "数据缺失", "未能获取到 XML 文件")
-                
+                if self.root_node:
+                    self.build_tree(self.root_node)
+                    self.snapshot_cache.put(cache_key, self.root_node, self.columns)
+                    print("DEBUG: Tree built successfully")
+                elif not live:
+                    QMessageBox.warning(self, "解析警告", "XML 解析失败，无法显示控件树")
+            elif not live:
+                QMessageBox.warning(self, "数据缺失", "未能获取到 XML 文件")
+
+    # --- 局部刷新 ---
+    _PARTIAL_DEPTH = 3
+
+    def on_tree_context_menu(self, pos):
+        index = self.tree_view.indexAt(pos)
+        if not index.isValid():
+            return
+        item = self.tree_model.itemFromIndex(self.proxy_model.mapToSource(index))
+        node: Optional[UiNode] = item.data(Qt.UserRole) if item else None
+        if node is None:
+            return
+        menu = QMenu(self)
+        action_subtree = menu.addAction("局部刷新此子树")
+        action_shallow = menu.addAction(f"局部刷新此子树 ({self._PARTIAL_DEPTH} 层)")
+        action_region = menu.addAction("局部刷新此区域")
+        if self.live_action.isChecked():
+            for entry in (action_subtree, action_shallow, action_region):
+                entry.setEnabled(False)
+        action = menu.exec_(self.tree_view.viewport().mapToGlobal(pos))
+        x, y, w, h = node.rect
+        if action == action_subtree:
+            self.refresh_partial(DumpScope.for_node(node))
+        elif action == action_shallow:
+            self.refresh_partial(DumpScope.for_node(node, max_depth=self._PARTIAL_DEPTH))
+        elif action == action_region:
+            self.refresh_partial(DumpScope.for_rect((x, y, x + w, y + h)))
+
+    def refresh_partial(self, scope: DumpScope) -> None:
+        """
+        只刷新范围内的节点并合并进当前树。AutoJs 在设备端只遍历该范围；
+        uiautomator 无法局部 dump，完整 dump 后在主机端按范围裁剪再合并
+        """
+        if self.live_action.isChecked():
+            # 合并会原地修改当前树，与实时模式的整树替换冲突
+            self.statusBar().showMessage("实时模式下不支持局部刷新，请先关闭实时模式")
+            return
+        if not self.root_node:
+            self.refresh_snapshot()
+            return
+        source = self.source_combo.currentText()
+        try:
+            if source == "AutoJs":
+                snapshot = self._capture(source, scope)
+                partial = self.autojs_parser.parse_json(snapshot["autojs_json"])
+            else:
+                snapshot = self._capture(source)
+                xml_data = snapshot.get("xml_data")
+                full = self.xml_parser.parse_xml_data(xml_data) if xml_data else self.xml_parser.parse_xml(snapshot["xml"])
+                partial = apply_scope(full, scope) if full else None
+            self._show_capture_timings(snapshot)
+            self._show_snapshot_image(snapshot)
+            if partial is None:
+                self.statusBar().showMessage("局部刷新：范围内没有控件")
+                return
+            # 树被原地修改，不再对应缓存中的那份 dump；实时模式下一次也要完整比较
+            self.snapshot_cache.discard(self._tree_cache_key)
+            self._tree_cache_key = None
+            self.change_detector.reset()
+            target = merge_partial(self.root_node, partial, scope)
+            self.build_tree(self.root_node)
+            self._select_node_in_tree(target)
+            self.statusBar().showMessage(f"局部刷新完成: {'/'.join(map(str, node_path(target))) or '根节点'}")
         except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+            QMessageBox.critical(self, "局部刷新失败", str(e))
             import traceback
             traceback.print_exc()
 
-    def build_tree(self, root_node: UiNode):
-        """构建树并提取所有控件类型"""
+    # --- 快照存档 ---
+    def save_snapshot_archive(self) -> None:
+        if not self.root_node:
+            QMessageBox.information(self, "提示", "当前没有可保存的快照")
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "保存快照", f"snapshot_{time.strftime('%Y%m%d_%H%M%S')}{SNAPSHOT_EXTENSION}",
+            f"UI 快照 (*{SNAPSHOT_EXTENSION})",
+        )
+        if not path:
+            return
+        if not path.endswith(SNAPSHOT_EXTENSION):
+            path += SNAPSHOT_EXTENSION
+        frame = self.screen_canvas.current_frame
+        png = None
+        if frame is None and self.screen_canvas.current_pixmap is not None and not self.screen_canvas.current_pixmap.isNull():
+            buffer = QBuffer()
+            buffer.open(QIODevice.WriteOnly)
+            self.screen_canvas.current_pixmap.save(buffer, "PNG")
+            png = bytes(buffer.data())
+        try:
+            write_snapshot_archive(path, self.root_node, self.columns, frame=frame, png=png, metadata=self.snapshot_meta)
+        except Exception as e:
+            QMessageBox.critical(self, "保存失败", str(e))
+            return
+        self.statusBar().showMessage(f"快照已保存: {path}")
+
+    def open_snapshot_archive(self) -> None:
+        path, _ = QFileDialog.getOpenFileName(self, "打开快照", "", f"UI 快照 (*{SNAPSHOT_EXTENSION})")
+        if path:
+            self.load_snapshot_archive(path)
+
+    def load_snapshot_archive(self, path: str) -> None:
+        try:
+            archive = SnapshotArchive(path)
+            columns = archive.columns
+        except Exception as e:
+            QMessageBox.critical(self, "打开失败", f"无法读取快照存档: {e}")
+            return
+        # 查看存档时停止实时刷新，否则会被新的采集覆盖
+        self.live_action.setChecked(False)
+        self.change_detector.reset()
+        self.snapshot_archive = archive
+        self.snapshot_meta = dict(archive.metadata)
+        frame = archive.frame
+        if frame is not None:
+            self.screen_canvas.set_frame(frame)
+        else:
+            self.screen_canvas.set_image_data(archive.png or b"")
+        self.root_node = archive.root
+        self.build_tree(self.root_node, columns)
+        self.statusBar().showMessage(f"已打开快照: {os.path.basename(path)} ({len(archive)} 个节点)")
+
+    def _show_parse_progress(self, count: int, bytes_read: int, total_bytes: int) -> None:
+        """解析大棵 AutoJs 树时在状态栏显示进度 (在主线程同步调用)"""
+        if total_bytes:
+            percent = min(100, bytes_read * 100 // total_bytes)
+            self.statusBar().showMessage(f"正在解析控件树: {count} 个节点 ({percent}%)")
+        else:
+            self.statusBar().showMessage(f"正在解析控件树: {count} 个节点")
+        self.statusBar().repaint()
+
+    # --- 实时模式 ---
+    def toggle_live_mode(self, enabled: bool) -> None:
+        if enabled:
+            self.change_detector.reset()
+            self._schedule_live_capture(0)
+        else:
+            self.live_timer.stop()
+            self.statusBar().showMessage("实时模式已关闭")
+
+    def _schedule_live_capture(self, delay_ms: Optional[int] = None) -> None:
+        if not self.live_action.isChecked():
+            return
+        if self._live_busy:
+            if delay_ms == 0:
+                self._live_refresh_pending = True
+            return
+        if self._live_refresh_pending:
+            self._live_refresh_pending = False
+            delay_ms = 0
+        self.live_timer.start(self.live_interval_spin.value() if delay_ms is None else delay_ms)
+
+    def _start_live_capture(self) -> None:
+        if not self.live_action.isChecked() or self._live_busy:
+            return
+        self._live_busy = True
+        source = self.source_combo.currentText()
+        threading.Thread(target=self._live_capture_worker, args=(source,), daemon=True).start()
+
+    def _live_capture_worker(self, source: str) -> None:
+        """在后台线程采集并计算摘要，结果通过信号交回 UI 线程"""
+        try:
+            snapshot = self._capture(source)
+            ChangeDetector.ensure_digests(snapshot)
+        except Exception as e:
+            self.live_capture_failed.emit(str(e))
+            return
+        self.live_snapshot_ready.emit(source, snapshot)
+
+    def _on_live_snapshot(self, source: str, snapshot: dict) -> None:
+        self._live_busy = False
+        if not self.live_action.isChecked():
+            return
+        try:
+            # 在 UI 线程比较并只在显示成功后 commit：比较基准始终是当前显示的快照
+            screen_changed, tree_changed = self.change_detector.compare(snapshot)
+            if screen_changed or tree_changed:
+                self._apply_snapshot(source, snapshot, screen_changed, tree_changed, live=True)
+            else:
+                self.statusBar().showMessage("实时模式：界面无变化")
+            self.change_detector.commit(snapshot)
+        except Exception as e:
+            self.statusBar().showMessage(f"实时刷新失败: {e}")
+        self._schedule_live_capture()
+
+    def _on_live_capture_failed(self, message: str) -> None:
+        # 实时模式下不弹窗，避免错误对话框连续出现
+        self._live_busy = False
+        self.statusBar().showMessage(f"实时采集失败: {message}")
+        self._schedule_live_capture()
+
+    def _show_snapshot_image(self, snapshot: dict) -> None:
+        frame = snapshot.get("screenshot_frame")
+        if frame is not None:
+            self.screen_canvas.set_frame(frame)
+            return
+        screenshot_path = snapshot.get("screenshot")
+        if screenshot_path and os.path.exists(screenshot_path):
+            self.screen_canvas.set_image(screenshot_path)
+
+    def _show_capture_timings(self, snapshot: dict) -> None:
+        """在状态栏显示该次采集的各阶段耗时"""
+        timings = snapshot.get("timings")
+        if not timings:
+            return
+        parts = [f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items() if name != "total"]
+        total = timings.get("total", 0.0) * 1000
+        self.statusBar().showMessage(f"采集耗时 {total:.0f}ms (" + ", ".join(parts) + ")")
+
+    def build_tree(self, root_node: UiNode, columns: Optional[SnapshotColumns] = None):
+        """构建树并提取所有控件类型；columns 为该树已有的列式快照 (如从存档加载)"""
         self.tree_model.clear()
+        self.tree_items = []
+        self.screen_canvas.clear_hover()
         if not root_node:
+            self.columns = None
+            self.proxy_model.set_columns(None)
             return
 
-        # 1. 构建树
-        root_item = self._create_tree_item(root_node)
+        # 1. 构建列式快照与树
+        self.columns = columns if columns is not None else SnapshotColumns.from_tree(root_node)
+        self.proxy_model.set_columns(self.columns)
+        # 每个快照构建一次空间索引，之后的点击 / 悬停查询直接复用
+        self.columns.spatial_index()
+        root_item = self._create_tree_items(self.columns)
         self.tree_model.appendRow(root_item)
         self.tree_view.expandToDepth(0)
 
         # 2. 提取所有出现的类名，填充下拉框
-        all_classes = set()
-        self._collect_classes(root_node, all_classes)
+        all_classes = self.columns.class_short_names()
         
         self.type_combo.blockSignals(True) # 避免清空时触发信号
         self.type_combo.clear()
@@ -333,25 +829,22 @@ class MainWindow(QMainWindow):
         for cls in sorted(list(all_classes)):
             self.type_combo.addItem(cls)
         self.type_combo.blockSignals(False)
-
-    def _collect_classes(self, node: UiNode, classes: Set[str]):
-        """递归收集类名"""
-        if node.class_name:
-            # 提取短类名 (e.g. android.widget.TextView -> TextView)
-            short_name = node.class_name.split('.')[-1]
-            classes.add(short_name)
-        for child in node.children:
-            self._collect_classes(child, classes)
-
-    def _create_tree_item(self, node: UiNode) -> QStandardItem:
-        item = QStandardItem(node.display_text)
-        item.setData(node, Qt.UserRole)
-        
-        for child in node.children:
-            child_item = self._create_tree_item(child)
-            item.appendRow(child_item)
-            
-        return item
+        # 下拉框被重置为 All，过滤条件同步回去
+        self.proxy_model.set_filter_class("All")
+
+    def _create_tree_items(self, columns: SnapshotColumns) -> QStandardItem:
+        """按先序顺序创建 item，父 item 总是先于子 item 创建，无需递归"""
+        items = []
+        for index, node in enumerate(columns.nodes):
+            item = QStandardItem(node.display_text)
+            item.setData(node, Qt.UserRole)
+            item.setData(index, NODE_INDEX_ROLE)
+            parent_index = columns.parent[index]
+            if parent_index >= 0:
+                items[parent_index].appendRow(item)
+            items.append(item)
+        self.tree_items = items
+        return items[0]
 
     def on_tree_node_clicked(self, index: QModelIndex):
         """
@@ -389,23 +882,37 @@ class MainWindow(QMainWindow):
         else:
             print(f"DEBUG: No node found at ({x}, {y})")
 
+    def toggle_hover_mode(self, enabled: bool) -> None:
+        self.screen_canvas.set_hover_enabled(enabled)
+
+    def on_screenshot_hovered(self, x: int, y: int):
+        """悬停查找：只走空间索引，不选中树节点，保证连续移动时界面不卡"""
+        if self.columns is None:
+            self.screen_canvas.clear_hover()
+            return
+        index = self.columns.hit_test(x, y)
+        if index is None:
+            self.screen_canvas.clear_hover()
+        elif index != self.screen_canvas.hover_index:
+            node = self.columns.node(index)
+            self.screen_canvas.show_hover(index, node.rect, self._hover_label(node))
+
+    def _hover_label(self, node: UiNode) -> str:
+        """悬停提示：简写类名、短 id 以及 text / desc (过长时截断)"""
+        parts = [node.class_name.split('.')[-1] or "?"]
+        if node.resource_id:
+            parts.append("id=" + node.resource_id.split(":id/")[-1])
+        text = node.text or node.content_desc
+        if text:
+            text = text.replace("\n", " ")
+            parts.append(f'"{text[:40]}…"' if len(text) > 40 else f'"{text}"')
+        return "  ".join(parts)
+
     def _find_node_optimized(self, root: UiNode, x: int, y: int) -> Optional[UiNode]:
-        candidates = []
-        
-        def traverse(node: UiNode):
-            nx, ny, nw, nh = node.rect
-            if nw > 0 and nh > 0:
-                if nx <= x <= nx + nw and ny <= y <= ny + nh:
-                    candidates.append(node)
-            for child in node.children:
-                traverse(child)
-
-        traverse(root)
-        if not candidates:
-            return None
-        
-        candidates.sort(key=lambda n: n.rect[2] * n.rect[3])
-        return candidates[0]
+        if self.columns is None or self.columns.node(0) is not root:
+            self.columns = SnapshotColumns.from_tree(root)
+        index = self.columns.hit_test(x, y)
+        return self.columns.node(index) if index is not None else None
 
     def _select_node_in_tree(self, target_node: UiNode):
         """在 TreeView 中选中指定节点 (需要处理 ProxyModel 映射)"""
@@ -436,14 +943,12 @@ class MainWindow(QMainWindow):
                 self.on_tree_node_clicked(proxy_index)
 
     def _find_item_by_node(self, parent_item: QStandardItem, target_node: UiNode) -> Optional[QStandardItem]:
-        if parent_item.data(Qt.UserRole) == target_node:
-            return parent_item
-        for i in range(parent_item.rowCount()):
-            child = parent_item.child(i)
-            res = self._find_item_by_node(child, target_node)
-            if res:
-                return res
-        return None
+        if self.columns is None:
+            return None
+        index = self.columns.index_of(target_node)
+        if index is None or index >= len(self.tree_items):
+            return None
+        return self.tree_items[index]
 
     def update_properties(self, node: UiNode):
         self.prop_table.setRowCount(0)
@@ -845,16 +1350,7 @@ class MainWindow(QMainWindow):
             "class": node.class_name,
             "package": node.package,
             "desc": node.content_desc,
-            "checkable": str(node.checkable).lower() == "true",
-            "checked": str(node.checked).lower() == "true",
-            "clickable": str(node.clickable).lower() == "true",
-            "enabled": str(node.enabled).lower() == "true",
-            "focusable": str(node.focusable).lower() == "true",
-            "focused": str(node.focused).lower() == "true",
-            "scrollable": str(node.scrollable).lower() == "true",
-            "long_clickable": str(node.long_clickable).lower() == "true",
-            "password": str(node.password).lower() == "true",
-            "selected": str(node.selected).lower() == "true",
+            **node.flag_dict(),
             "bounds": node.bounds_str,
             "rect": {"x": x, "y": y, "w": w, "h": h},
             "center": {"x": x + w // 2, "y": y + h // 2},
@@ -9,6 +9,7 @@ from PyQt5.QtCore import Qt, QEvent, QStringListModel, QRect, QSize
 from PyQt5.QtGui import QFont, QTextCursor, QStandardItemModel, QStandardItem, QPainter, QColor, QTextFormat
 
 from core.doc_parser import DocParser
+from core.script_sync import ScriptSync
 from ui.syntax_highlighter import JSHighlighter
 
 
@@ -374,6 +375,8 @@ class ScriptEditorWindow(QMainWindow):
         self.editor.set_completer(completer)
 
     def _detect_device_id(self) -> str:
+        if self.adb_client.serial:
+            return self.adb_client.serial
         try:
             result = self.adb_client._run(["devices"])
             if result.returncode != 0:
@@ -407,6 +410,9 @@ class ScriptEditorWindow(QMainWindow):
         
         push_action = toolbar.addAction("推送到设备")
         push_action.triggered.connect(self.push_current_to_android)
+
+        push_all_action = toolbar.addAction("批量推送")
+        push_all_action.triggered.connect(lambda: self.push_tree_to_android())
         
         save_action = toolbar.addAction("保存")
         save_action.triggered.connect(self.save_current_file)
@@ -545,6 +551,9 @@ class ScriptEditorWindow(QMainWindow):
                 delete_action = menu.addAction("删除文件")
                 delete_action.triggered.connect(lambda: self.delete_file(rel_path))
             else:  # 是文件夹
+                push_folder_action = menu.addAction("推送文件夹到设备")
+                push_folder_action.triggered.connect(lambda: self.push_tree_to_android(self._get_item_path(item)))
+
                 delete_action = menu.addAction("删除文件夹")
                 delete_action.triggered.connect(lambda: self.delete_folder(item))
         
@@ -602,27 +611,16 @@ class ScriptEditorWindow(QMainWindow):
 
     def sync_from_android(self):
         try:
-            remote_files = self.adb_client.list_files(self.remote_script_root)
-            if not remote_files:
+            sync = ScriptSync(self.adb_client, self.remote_script_root, self.local_script_root)
+            result = sync.sync_from_device()
+            if not result.total:
                 QMessageBox.information(self, "提示", "未找到文件或列表失败")
                 return
 
-            count = 0
-            for remote_file in remote_files:
-                if remote_file.startswith(self.remote_script_root):
-                    rel_path = remote_file[len(self.remote_script_root):]
-                elif remote_file.startswith("/sdcard/脚本/"):
-                     rel_path = remote_file[len("/sdcard/脚本/"):]
-                else:
-                    continue
-                
-                rel_path = rel_path.lstrip("/")
-                local_path = os.path.join(self.local_script_root, rel_path)
-                
-                if self.adb_client.pull_file(remote_file, local_path):
-                    count += 1
-            
-            QMessageBox.information(self, "成功", f"已从设备同步 {count} 个文件")
+            message = f"已从设备同步 {len(result.transferred)} 个文件，{len(result.skipped)} 个未变化"
+            if result.failed:
+                message += f"，{len(result.failed)} 个失败"
+            QMessageBox.information(self, "成功", message)
             self.refresh_local_file_tree()
             
         except Exception as e:
@@ -647,18 +645,43 @@ class ScriptEditorWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"推送失败: {str(e)}")
 
+    def push_tree_to_android(self, rel_dir: str = ""):
+        """推送整个本地脚本目录 (或其中一个文件夹)，只传输有改动的文件"""
+        self.save_current_file()
+        try:
+            sync = ScriptSync(self.adb_client, self.remote_script_root, self.local_script_root)
+            result = sync.push_to_device(rel_dir.replace("\\", "/"))
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"批量推送失败: {str(e)}")
+            return
+
+        message = f"已推送 {len(result.transferred)} 个文件，{len(result.skipped)} 个未变化"
+        if result.failed:
+            message += f"，{len(result.failed)} 个失败:\n" + "\n".join(result.failed)
+            QMessageBox.warning(self, "部分失败", message)
+        else:
+            QMessageBox.information(self, "成功", message)
+
     def run_script(self):
         if not self.current_relative_path:
             QMessageBox.warning(self, "警告", "未选择文件")
             return
             
-        # 1. Push the file first
-        self.push_current_to_android()
-        
-        # 2. Execute
-        # Construct the remote path
+        # 1. Push the file first (skipped when the device already has the same content)
+        self.save_current_file()
         remote_rel_path = self.current_relative_path.replace("\\", "/")
         remote_path = self.remote_script_root.rstrip("/") + "/" + remote_rel_path
+        local_path = os.path.join(self.local_script_root, self.current_relative_path)
+        try:
+            push_result = self.adb_client.push_if_changed(local_path, remote_path)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"推送失败: {str(e)}")
+            return
+        if push_result is not None and push_result.returncode != 0:
+            QMessageBox.warning(self, "失败", "推送文件失败")
+            return
+        
+        # 2. Execute
         
         # AutoJs6 Intent execution
         # am start -n org.autojs.autojs6/org.autojs.autojs.external.open.RunIntentActivity -d file:///... -t text/javascript